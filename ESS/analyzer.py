@@ -1,5 +1,8 @@
 import re
 import operator
+from ESS import entity
+from ESS import container
+from ESS import operation
 from ESS.parsing import parser
 
 class BindError(Exception):
@@ -21,111 +24,249 @@ OPERATOR = { '+': operator.add,
              '-': operator.sub,
              '/': operator.truediv,
              '*': operator.mul }
+WRITE_ACTIONS = (operation.actn_add, operation.actn_update, operation.actn_remove)
+VARIABLE_REX = re.compile(r'\?[\w_]+')
 
 
 def bind_rules(rules, facts):
-    rules = rules.copy()
-    while rules.unbinded:
-        rule = rules.unbinded.pop()
-        flag = True
-        if rule.antecedent.is_binded():
-            for conclusion in rule.consequent.conclusions:
-                if not flag:
-                    break
-                if not conclusion.is_binded():
-                    flag = False
-                    for fact in facts:
-                        new_rule = rule.copy()
-                        var_name = conclusion.fact_name
-                        _replace_same_varname(var_name, fact.name, new_rule)
-                        rules.add(new_rule)
+    static_attrs = static_attributes(rules, facts)
+    bound_rules = container.RuleContainer()
+    for rule in rules:
+        if rule.is_binded():
+            bound_rules.add(rule)
+            continue
+        for substitution in _bindings(rule, facts, static_attrs):
+            bound_rules.add(_substitute(rule, substitution))
+    return bound_rules
+
+
+def static_attributes(rules, facts):
+    if retracts_facts(rules):
+        return set()
+    written = written_attributes(rules)
+    attrs = set()
+    for fact in facts:
+        attrs.update(attr for attr, _ in fact.items() if attr not in written)
+    return attrs
+
+
+def written_attributes(rules):
+    written = set()
+    for rule in rules:
+        for conclusion in rule.consequent.conclusions:
+            if conclusion.action in WRITE_ACTIONS:
+                written.add(conclusion.arg_list[0])
+    return written
+
+
+def retracts_facts(rules):
+    return any(conclusion.action == operation.actn_retract
+               for rule in rules for conclusion in rule.consequent.conclusions)
+
+
+def static_signature(facts, written):
+    return frozenset((fact.name, attr, value) for fact in facts for attr, value in fact.items() if attr not in written)
+
+
+def _bindings(rule, facts, static_attrs, substitution=None, remaining=None):
+    if substitution is None:
+        substitution = {}
+        remaining = _variables(rule)
+    if not remaining:
+        yield dict(substitution)
+        return
+    var_name, fact_names = _most_selective(rule, facts, static_attrs, substitution, remaining)
+    for fact_name in sorted(fact_names):
+        substitution[var_name] = fact_name
+        if _consistent(rule, facts, static_attrs, substitution):
+            for binding in _bindings(rule, facts, static_attrs, substitution, remaining - {var_name}):
+                yield binding
+    substitution.pop(var_name, None)
+
+
+def _variables(rule):
+    variables = set()
+    for disjunction in rule.antecedent.disjunctions:
+        for condition in disjunction.conditions:
+            if condition.fact_name.startswith('?'):
+                variables.add(condition.fact_name)
+            if isinstance(condition.value, str):
+                variables.update(VARIABLE_REX.findall(condition.value))
+    for conclusion in rule.consequent.conclusions:
+        if conclusion.fact_name.startswith('?'):
+            variables.add(conclusion.fact_name)
+        if len(conclusion.arg_list) == 2 and isinstance(conclusion.arg_list[1], str):
+            variables.update(VARIABLE_REX.findall(conclusion.arg_list[1]))
+    return variables
+
+
+def _most_selective(rule, facts, static_attrs, substitution, remaining):
+    best = None
+    for var_name in sorted(remaining):
+        fact_names = _candidate_facts(var_name, rule, facts, static_attrs, substitution)
+        if best is None or len(fact_names) < len(best[1]):
+            best = (var_name, fact_names)
+    return best
+
+
+def _candidate_facts(var_name, rule, facts, static_attrs, substitution):
+    candidates = None
+    for disjunction in rule.antecedent.disjunctions:
+        if len(disjunction.conditions) != 1:
+            continue
+        condition = disjunction.conditions[0]
+        if condition.predicate != operation.pred_equal:
+            continue
+        fact_name = substitution.get(condition.fact_name, condition.fact_name)
+        value = _substitute_value(condition.value, substitution)
+        if condition.fact_name == var_name and fact_name == var_name and condition.test_attr in static_attrs:
+            evaluable, value = _static_value(value, facts, static_attrs)
+            if not evaluable:
+                continue
+            matching = facts.lookup(condition.test_attr, value)
+        elif isinstance(value, str) and value.startswith(var_name+'->') and not fact_name.startswith('?'):
+            attr = value[len(var_name)+2:]
+            if attr not in static_attrs or condition.test_attr not in static_attrs:
+                continue
+            try:
+                value = facts[fact_name][condition.test_attr]
+            except container.ContainerError:
+                continue
+            if value is None:
+                continue
+            matching = facts.lookup(attr, value)
+        else:
+            continue
+        if candidates is None:
+            candidates = set(matching)
         else:
-            for disjunction in rule.antecedent.disjunctions:
-                if not flag:
-                    break
-                for condition in disjunction.conditions:
-                    if not flag:
-                        break
-                    if not condition.is_binded():
-                        flag = False
-                        for fact in facts:
-                            new_rule = rule.copy()
-
-                            if '?' in condition.fact_name:
-                                var_name = condition.fact_name
-                            else:
-                                var_name = re.findall(r'\?[\w_]+', condition.value)[0]
-
-                            _replace_same_varname(var_name, fact.name, new_rule)
-                            rules.add(new_rule)
-    return rules
-
-
-def _replace_same_varname(var_name, fact_name, rule):
-    if not var_name.startswith('?'):
-        raise ValueError('var_name: %s' % var_name)
+            candidates.intersection_update(matching)
+    if candidates is None:
+        return facts.get_facts_names()
+    return candidates
+
+
+def _consistent(rule, facts, static_attrs, substitution):
+    for disjunction in rule.antecedent.disjunctions:
+        satisfiable = False
+        for condition in disjunction.conditions:
+            fact_name = substitution.get(condition.fact_name, condition.fact_name)
+            if fact_name.startswith('?') or condition.test_attr not in static_attrs:
+                satisfiable = True
+                break
+            evaluable, value = _static_value(_substitute_value(condition.value, substitution), facts, static_attrs)
+            if not evaluable or condition.predicate(facts, fact_name, condition.test_attr, value):
+                satisfiable = True
+                break
+        if not satisfiable:
+            return False
+    return True
+
+
+def _static_value(value, facts, static_attrs):
+    if not isinstance(value, str):
+        return True, value
+    if '?' in value:
+        return False, None
+    if '->' not in value:
+        return True, value
+    op_result = ARITHMETIC_OP_REX.findall(value)
+    if len(op_result) > 1:
+        return False, None
+    operands = ARITHMETIC_OP_REX.split(value)
+    for operand in operands:
+        if '->' in operand and operand.split('->', 1)[1] not in static_attrs:
+            return False, None
+    try:
+        operands = [_get_attribute(operand, facts) for operand in operands]
+    except (container.ContainerError, BindError):
+        return False, None
+    if None in operands:
+        return False, None
+    if not op_result:
+        return True, operands[0]
+    if not _is_number(operands[0]) or not _is_number(operands[1]):
+        return False, None
+    return True, OPERATOR[op_result[0]](operands[0], operands[1])
+
+
+def _substitute(rule, substitution):
+    disjunctions = []
     for disjunction in rule.antecedent.disjunctions:
+        conditions = []
         for condition in disjunction.conditions:
-            if not condition.is_binded():
-                if condition.fact_name == var_name:
-                    condition.fact_name = fact_name
-                if isinstance(condition.value, str) and '?' in condition.value:
-                    condition.value = re.sub('\\'+var_name, fact_name, condition.value)
+            conditions.append(entity.Condition(condition.predicate,
+                                               substitution.get(condition.fact_name, condition.fact_name),
+                                               condition.test_attr,
+                                               _substitute_value(condition.value, substitution)))
+        disjunctions.append(entity.Disjunction(conditions))
+    conclusions = []
     for conclusion in rule.consequent.conclusions:
-        if not conclusion.is_binded():
-            if conclusion.fact_name == var_name:
-                conclusion.fact_name = fact_name
-            if len(conclusion.arg_list)==2:
-                conclusion.arg_list[1] = re.sub('\\'+var_name, fact_name, conclusion.arg_list[1])
+        arg_list = list(conclusion.arg_list)
+        if len(arg_list) == 2:
+            arg_list[1] = _substitute_value(arg_list[1], substitution)
+        conclusions.append(entity.Conclusion(conclusion.action,
+                                             substitution.get(conclusion.fact_name, conclusion.fact_name),
+                                             *arg_list))
+    return entity.Rule(rule.name, entity.Antecedent(disjunctions), entity.Consequent(conclusions), rule.salience)
 
 
-def evaluate_values(rule, facts):
-    new_rule = rule.copy()
+def _substitute_value(value, substitution):
+    if not isinstance(value, str) or '?' not in value:
+        return value
+    return VARIABLE_REX.sub(lambda matched: substitution.get(matched.group(), matched.group()), value)
 
-    for disjunction in new_rule.antecedent.disjunctions:
+
+def evaluate_values(rule, facts):
+    disjunctions = []
+    for disjunction in rule.antecedent.disjunctions:
+        conditions = []
         for condition in disjunction.conditions:
             if not condition.is_evaluated():
-                unevaluated = condition.value
-                op_result = ARITHMETIC_OP_REX.findall(unevaluated)
-                if op_result:
-                    if len(op_result) > 1:
-                        raise ValueEvaluatingError(str(condition))
-                    op = OPERATOR[op_result[0]]
-                    operands = ARITHMETIC_OP_REX.split(unevaluated)
-                    a = _get_attribute(operands[0], facts)
-                    b = _get_attribute(operands[1], facts)
-                    if a is None or b is None:
-                        value = "NIL"
-                    else:
-                        if not _is_number(a) or not _is_number(b):
-                            raise NotNumericOperandError("%s%s%s" % (str(a), op_result[0], str(b)))
-                        value = op(a, b)
-                else:
-                    value = _get_attribute(unevaluated, facts)
-                condition.value = value
-
-    for conclusion in new_rule.consequent.conclusions:
+                condition = entity.Condition(condition.predicate, condition.fact_name, condition.test_attr,
+                                             _evaluate(condition.value, condition, facts))
+            conditions.append(condition)
+        if _replaced(conditions, disjunction.conditions):
+            disjunction = entity.Disjunction(conditions)
+        disjunctions.append(disjunction)
+    antecedent = rule.antecedent
+    if _replaced(disjunctions, antecedent.disjunctions):
+        antecedent = entity.Antecedent(disjunctions)
+
+    conclusions = []
+    for conclusion in rule.consequent.conclusions:
         if not conclusion.is_evaluated():
-            unevaluated = conclusion.arg_list[1]
-            op_result = ARITHMETIC_OP_REX.findall(unevaluated)
-            if op_result:
-                if len(op_result) > 1:
-                    raise ValueEvaluatingError(str(conclusion))
-                op = OPERATOR[op_result[0]]
-                operands = ARITHMETIC_OP_REX.split(unevaluated)
-                a = _get_attribute(operands[0], facts)
-                b = _get_attribute(operands[1], facts)
-                if a is None or b is None:
-                    value = "NIL"
-                else:
-                    if not _is_number(a) or not _is_number(b):
-                        raise NotNumericOperandError("%s%s%s" % (str(a), op_result[0], str(b)))
-                    value = op(a, b)
-            else:
-                value = _get_attribute(unevaluated, facts)
-            conclusion.arg_list[1] = value
-
-    return new_rule
+            conclusion = entity.Conclusion(conclusion.action, conclusion.fact_name, conclusion.arg_list[0],
+                                           _evaluate(conclusion.arg_list[1], conclusion, facts))
+        conclusions.append(conclusion)
+    consequent = rule.consequent
+    if _replaced(conclusions, consequent.conclusions):
+        consequent = entity.Consequent(conclusions)
+
+    if antecedent is rule.antecedent and consequent is rule.consequent:
+        return rule
+    return entity.Rule(rule.name, antecedent, consequent, rule.salience)
+
+
+def _replaced(new_items, old_items):
+    return any(new is not old for new, old in zip(new_items, old_items))
+
+
+def _evaluate(unevaluated, source, facts):
+    op_result = ARITHMETIC_OP_REX.findall(unevaluated)
+    if not op_result:
+        return _get_attribute(unevaluated, facts)
+    if len(op_result) > 1:
+        raise ValueEvaluatingError(str(source))
+    op = OPERATOR[op_result[0]]
+    operands = ARITHMETIC_OP_REX.split(unevaluated)
+    a = _get_attribute(operands[0], facts)
+    b = _get_attribute(operands[1], facts)
+    if a is None or b is None:
+        return "NIL"
+    if not _is_number(a) or not _is_number(b):
+        raise NotNumericOperandError("%s%s%s" % (str(a), op_result[0], str(b)))
+    return op(a, b)
 
 
 def _is_number(v):
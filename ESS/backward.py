@@ -0,0 +1,162 @@
+from ESS import entity
+from ESS import analyzer
+from ESS import compiler
+from ESS import container
+from ESS import operation
+
+WRITE_ACTIONS = (operation.actn_update, operation.actn_add, operation.actn_remove)
+STRUCTURAL_ACTIONS = (operation.actn_assert, operation.actn_retract)
+
+
+def backward_chaining_search(engine, w_memory, max_depth, budget=None):
+    prover = Prover(w_memory, engine.compiled, budget)
+    for limit in xrange(max_depth + 1):
+        prover.cut_off = False
+        result = prover.prove(w_memory.initial_state, limit)
+        if result is not None:
+            state, rules = result
+            return state, rules, prover.visited_cnt
+        if not prover.cut_off or (budget is not None and budget.exhausted):
+            break
+    return w_memory.initial_state, None, prover.visited_cnt
+
+
+def goal_conditions(goal):
+    conditions = []
+    for goal_fact in goal:
+        for attr, value in sorted(goal_fact.items()):
+            conditions.append(entity.Condition(operation.pred_equal, goal_fact.name, attr, value))
+    return conditions
+
+
+def relevant_rules(rules, conditions):
+    keys = set((condition.fact_name, condition.test_attr) for condition in conditions)
+    fact_names = set(fact_name for fact_name, _ in keys)
+    relevant = set()
+    changed = True
+    while changed:
+        changed = False
+        for i, rule in enumerate(rules):
+            if i in relevant or not _affects(rule, keys, fact_names):
+                continue
+            relevant.add(i)
+            changed = True
+            for fact_name, attr in _reads(rule):
+                keys.add((fact_name, attr))
+                fact_names.add(fact_name)
+    return sorted(relevant)
+
+
+class Prover(object):
+
+    def __init__(self, w_memory, compiled=True, budget=None):
+        self.budget = budget
+        self.visited_cnt = 0
+        self.cut_off = False
+        self.failed = {}
+        self.subgoals = goal_conditions(w_memory.goal)
+
+        self.rules = list(w_memory.grounded_rules(_assertable_facts(w_memory)))
+        if compiled:
+            self._executables = [compiler.CompiledRule(rule) for rule in self.rules]
+        else:
+            self._executables = [compiler.InterpretedRule(rule) for rule in self.rules]
+        self._relevant = relevant_rules(self.rules, self.subgoals)
+        self._writes = []
+        for rule in self.rules:
+            self._writes.append(set((conclusion.fact_name, conclusion.arg_list[0])
+                                    for conclusion in rule.consequent.conclusions
+                                    if conclusion.action in WRITE_ACTIONS))
+
+    def holds(self, state, condition):
+        try:
+            return bool(condition(state))
+        except container.ContainerError:
+            return False
+
+    def unsatisfied(self, state):
+        return [condition for condition in self.subgoals if not self.holds(state, condition)]
+
+    def prove(self, state, limit):
+        unsatisfied = self.unsatisfied(state)
+        if not unsatisfied:
+            return state, []
+        if limit <= 0:
+            self.cut_off = True
+            return None
+        if self.failed.get(state, -1) >= limit:
+            return None
+        if self.budget is not None and self.budget.expired(self.visited_cnt):
+            return None
+
+        self.visited_cnt += 1
+        if self.visited_cnt % 100 == 0:
+            print "Search in progress, visited subgoals counter: %s" % self.visited_cnt
+        for activation in self.activations(state, unsatisfied):
+            try:
+                new_state = activation.consequent(state)
+            except operation.OperationError:
+                continue
+            result = self.prove(new_state, limit - 1)
+            if result is not None:
+                final_state, rules = result
+                return final_state, [activation] + rules
+        if self.budget is None or not self.budget.exhausted:
+            self.failed[state] = limit
+        return None
+
+    def activations(self, state, unsatisfied):
+        keys = set((condition.fact_name, condition.test_attr) for condition in unsatisfied)
+        achieving = []
+        others = []
+        for i in self._relevant:
+            executable = self._executables[i]
+            try:
+                if not executable.match(state):
+                    continue
+                activation = executable.instantiate(state)
+            except (container.ContainerError, analyzer.BindError):
+                continue
+            if self._writes[i] & keys:
+                achieving.append(activation)
+            else:
+                others.append(activation)
+        return achieving + others
+
+
+def _affects(rule, keys, fact_names):
+    for conclusion in rule.consequent.conclusions:
+        if conclusion.action in STRUCTURAL_ACTIONS:
+            if conclusion.fact_name in fact_names:
+                return True
+        elif (conclusion.fact_name, conclusion.arg_list[0]) in keys:
+            return True
+    return False
+
+
+def _reads(rule):
+    values = []
+    for disjunction in rule.antecedent.disjunctions:
+        for condition in disjunction.conditions:
+            yield condition.fact_name, condition.test_attr
+            values.append(condition.value)
+    for conclusion in rule.consequent.conclusions:
+        if len(conclusion.arg_list) == 2:
+            values.append(conclusion.arg_list[1])
+    for value in values:
+        if isinstance(value, str):
+            for operand in analyzer.ARITHMETIC_OP_REX.split(value):
+                if '->' in operand:
+                    yield tuple(operand.split('->', 1))
+
+
+def _assertable_facts(w_memory):
+    facts = w_memory.initial_state.copy()
+    facts_names = facts.get_facts_names()
+    for rule in w_memory.rules:
+        for conclusion in rule.consequent.conclusions:
+            if conclusion.action == operation.actn_assert and conclusion.is_binded() and \
+                    conclusion.fact_name not in facts_names:
+                facts.add(entity.Fact(conclusion.fact_name))
+                facts_names = facts.get_facts_names()
+    return facts
@@ -0,0 +1,214 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from ESS.parsing.parser import Parser, ParserSyntaxError
+from ESS.engine import WorkingMemory, Engine
+from ESS.shell import Shell, CommandError
+from ESS import budget
+from ESS import patterndb
+
+STATE_SEPARATOR = '---'
+
+_worker = None
+
+
+class BatchError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class BatchWorker(object):
+
+    def __init__(self, strategy, compiled=True, deadline=None, pattern_db_dir=None):
+        self.strategy = strategy
+        self.engine = Engine(compiled, pattern_db_dir=pattern_db_dir)
+        self.deadline = deadline
+        self.search_fun, self.max_depth, self.h_fun, self.h_attrs = Shell().parse_strategy(strategy)
+        self._kbs = {}
+        self._rule_sets = {}
+
+    def solve(self, task):
+        instance, filepath, state_lines = task
+        start_time = time.time()
+        result = {'instance': instance, 'strategy': self.strategy}
+        try:
+            w_memory = self._working_memory(filepath, state_lines)
+            h_attrs = self.h_attrs
+            if self.h_fun == Engine.h_pattern_database:
+                h_attrs = patterndb.load(w_memory, h_attrs,
+                                         self.engine.pattern_db_dir or patterndb.cache_directory(filepath),
+                                         self.engine.compiled)
+            search_budget = budget.Budget(self.deadline)
+            if self.h_fun:
+                arrival_state, rules, visited_cnt = self.search_fun(self.engine, w_memory, self.max_depth,
+                                                                    self.h_fun, h_attrs, budget=search_budget)
+            else:
+                arrival_state, rules, visited_cnt = self.search_fun(self.engine, w_memory, self.max_depth,
+                                                                    budget=search_budget)
+        except (IOError, ParserSyntaxError, patterndb.PatternDatabaseError) as error:
+            result.update(status='error', error=str(error))
+        except Exception as error:
+            result.update(status='error', error="%s: %s" % (type(error).__name__, error))
+        else:
+            if rules is not None:
+                status = 'solved'
+            elif search_budget.exhausted:
+                status = search_budget.exhausted
+            else:
+                status = 'failed'
+            result.update(status=status, path_length=len(rules) if rules is not None else None,
+                          visited_nodes=visited_cnt)
+        result['wall_time'] = round(time.time() - start_time, 6)
+        return result
+
+    def _working_memory(self, filepath, state_lines):
+        try:
+            facts, rules_key, goal = self._kbs[filepath]
+        except KeyError:
+            parser = Parser()
+            with open(filepath) as f:
+                lines = parser.purify(f.read().splitlines())
+            facts = parser.parse_facts(lines)
+            goal = parser.parse_goal(lines)
+            rules_key = tuple(rule_lines(lines))
+            if rules_key not in self._rule_sets:
+                self._rule_sets[rules_key] = parser.parse_rules(lines)
+            if state_lines is not None:
+                self._kbs[filepath] = facts, rules_key, goal
+        if state_lines is not None:
+            parser = Parser()
+            facts = parser.parse_facts(parser.purify(state_lines))
+        return WorkingMemory(facts, self._rule_sets[rules_key], goal)
+
+
+def rule_lines(lines):
+    inside = False
+    for line in lines:
+        if line.startswith('beginRule:'):
+            inside = True
+        if inside:
+            yield line
+        if line == 'endRule':
+            inside = False
+
+
+def kb_files(paths):
+    for filepath in paths:
+        if os.path.isdir(filepath):
+            for name in sorted(os.listdir(filepath)):
+                if not name.startswith('.') and os.path.isfile(os.path.join(filepath, name)):
+                    yield os.path.join(filepath, name)
+        else:
+            yield filepath
+
+
+def read_states(stream):
+    lines = []
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if line.strip() == STATE_SEPARATOR:
+            if any(line.strip() for line in lines):
+                yield lines
+            lines = []
+        else:
+            lines.append(line)
+    if any(line.strip() for line in lines):
+        yield lines
+
+
+def tasks(paths, states=None):
+    if states is None:
+        for filepath in kb_files(paths):
+            yield filepath, filepath, None
+        return
+    if len(paths) != 1 or not os.path.isfile(paths[0]):
+        raise BatchError("Initial states need exactly one knowledge base file")
+    for i, state_lines in enumerate(read_states(states)):
+        yield "%s#%s" % (paths[0], i), paths[0], state_lines
+
+
+def solve_all(strategy, paths, states=None, workers=1, compiled=True, deadline=None, out=None, pattern_db_dir=None):
+    try:
+        Shell().parse_strategy(strategy)
+    except CommandError as error:
+        raise BatchError("Wrong strategy %s: %s" % (strategy, error))
+    stdout = sys.stdout
+    out = out or stdout
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _init_worker, (strategy, compiled, deadline, pattern_db_dir))
+        results = pool.imap_unordered(_solve, tasks(paths, states))
+    else:
+        pool = None
+        _init_worker(strategy, compiled, deadline, pattern_db_dir)
+        results = itertools.imap(_solve, tasks(paths, states))
+    solved = 0
+    try:
+        for result in results:
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+            out.flush()
+            solved += result['status'] == 'solved'
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return solved
+
+
+def _init_worker(strategy, compiled, deadline, pattern_db_dir):
+    global _worker
+    sys.stdout = open(os.devnull, 'w')
+    _worker = BatchWorker(strategy, compiled, deadline, pattern_db_dir)
+
+
+def _solve(task):
+    return _worker.solve(task)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+            prog='batch.py', fromfile_prefix_chars='@',
+            description="Solve many knowledge bases non-interactively, one JSON result line per instance. "
+                        "@FILE reads further arguments (e.g. a manifest of KB paths) from FILE, one per line.")
+    arg_parser.add_argument('strategy', metavar='STRATEGY',
+                            help="SEARCH[:HEURISTIC[:ATTRS[:PATTERN]]][:MAX_DEPTH], as in run_Portfolio")
+    arg_parser.add_argument('paths', metavar='KB', nargs='+', help="knowledge base file or directory of them")
+    arg_parser.add_argument('--states', metavar='FILE',
+                            help="solve the only KB from each initial state in FILE ('-' for stdin), "
+                                 "facts of each state ended by a '%s' line" % STATE_SEPARATOR)
+    arg_parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    arg_parser.add_argument('--deadline', type=float, metavar='SECONDS', help="time limit of each instance")
+    arg_parser.add_argument('--interpreted', action='store_true', help="do not compile the rules")
+    arg_parser.add_argument('--pattern-db', metavar='DIR',
+                            help="directory of the PATTERNDB tables (default: .patterndb beside each KB file)")
+    args = arg_parser.parse_args(argv)
+    if args.workers < 1:
+        arg_parser.error("workers must be a positive integer")
+    if args.deadline is not None and args.deadline <= 0:
+        arg_parser.error("deadline must be positive")
+
+    states = None
+    try:
+        if args.states == '-':
+            states = sys.stdin
+        elif args.states is not None:
+            states = open(args.states)
+        solve_all(args.strategy, args.paths, states, args.workers, not args.interpreted, args.deadline,
+                  pattern_db_dir=args.pattern_db)
+    except (BatchError, IOError) as error:
+        print >> sys.stderr, error
+        return -1
+    finally:
+        if states is not None and states is not sys.stdin:
+            states.close()
+    return 0
@@ -0,0 +1,85 @@
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MEMORY_CHECK_INTERVAL = 64
+STATM_PATH = '/proc/self/statm'
+
+
+class BudgetError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class Budget(object):
+
+    def __init__(self, deadline=None, memory_limit=None):
+        if memory_limit is not None and resource is None:
+            raise BudgetError("Memory limits are not supported on this platform")
+        self.deadline = time.time() + deadline if deadline is not None else None
+        self.memory_limit = memory_limit
+        self.base_memory = current_memory() if memory_limit is not None else None
+        self.exhausted = None
+        self.cost = None
+        self.lower_bound = None
+        self._checks = 0
+
+    def __str__(self):
+        l = []
+        if self.exhausted:
+            l.append("Budget exhausted: %s" % self.exhausted)
+        if self.cost is not None:
+            l.append("Solution cost: %s" % self.cost)
+        if self.lower_bound is not None:
+            l.append("Optimal cost lower bound: %s" % self.lower_bound)
+        if self.cost is not None and self.lower_bound:
+            l.append("Suboptimality bound: %.3f" % (self.cost / float(self.lower_bound)))
+        if self.cost is not None:
+            l.append("Optimality proven: %s" % ('yes' if self.proven() else 'no'))
+        return '\n'.join(l)
+
+    def __nonzero__(self):
+        return bool(self.exhausted) or self.cost is not None or self.lower_bound is not None
+
+    def expired(self, visited_cnt=None):
+        if self.exhausted:
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.exhausted = 'time limit'
+        elif self.memory_limit is not None:
+            self._checks += 1
+            if self._checks % MEMORY_CHECK_INTERVAL == 0 and self.used_memory() >= self.memory_limit:
+                self.exhausted = 'memory limit'
+        return bool(self.exhausted)
+
+    def used_memory(self):
+        return current_memory() - self.base_memory
+
+    def record(self, cost, lower_bound):
+        self.cost = cost
+        self.lower_bound = lower_bound
+
+    def proven(self):
+        return self.cost is not None and self.lower_bound is not None and self.lower_bound >= self.cost
+
+
+def current_memory():
+    try:
+        with open(STATM_PATH) as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, IndexError, ValueError):
+        return peak_memory()
+
+
+def peak_memory():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return usage
+    return usage * 1024
@@ -0,0 +1,86 @@
+import cPickle
+import hashlib
+import os
+import time
+import zlib
+
+CHECKPOINT_INTERVAL = 300
+MAX_OVERHEAD = 0.1
+COMPRESSION_LEVEL = 1
+FORMAT = 'ESS-CHECKPOINT-1'
+
+
+class CheckpointError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class Checkpointer(object):
+
+    def __init__(self, filepath, header, interval=None):
+        self.filepath = filepath
+        self.header = header
+        self.interval = interval or CHECKPOINT_INTERVAL
+        self.written = 0
+        self._source = None
+        self._next = time.time() + self.interval
+
+    def track(self, source):
+        self._source = source
+
+    def tracking(self):
+        return self._source is not None
+
+    def due(self):
+        return self.tracking() and time.time() >= self._next
+
+    def save(self):
+        start_time = time.time()
+        snapshot = dict(self.header)
+        snapshot['search_state'] = self._source()
+        save(self.filepath, snapshot)
+        elapsed = time.time() - start_time
+        self.written += 1
+        self._next = time.time() + max(self.interval, elapsed / MAX_OVERHEAD)
+        print "Checkpoint written to %s in %.2f seconds" % (self.filepath, elapsed)
+
+
+def save(filepath, snapshot):
+    data = zlib.compress(cPickle.dumps(snapshot, cPickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+    tmp_filepath = filepath + '.tmp'
+    try:
+        with open(tmp_filepath, 'wb') as f:
+            f.write(FORMAT + '\n')
+            f.write(data)
+        os.rename(tmp_filepath, filepath)
+    except (IOError, OSError) as error:
+        raise CheckpointError("Cannot write checkpoint %s: %s" % (filepath, error))
+
+
+def load(filepath):
+    try:
+        with open(filepath, 'rb') as f:
+            if f.readline().rstrip('\n') != FORMAT:
+                raise CheckpointError("%s is not a checkpoint file" % filepath)
+            data = f.read()
+    except (IOError, OSError) as error:
+        raise CheckpointError("Cannot read checkpoint %s: %s" % (filepath, error))
+    try:
+        return cPickle.loads(zlib.decompress(data))
+    except Exception:
+        raise CheckpointError("Checkpoint %s is corrupted" % filepath)
+
+
+def kb_digest(w_memory):
+    digest = hashlib.sha1()
+    for fact in sorted(str(fact) for fact in w_memory.initial_state):
+        digest.update(fact)
+    for rule in sorted(str(rule) for rule in w_memory.rules):
+        digest.update(rule)
+    for fact in sorted(str(fact) for fact in w_memory.goal):
+        digest.update(fact)
+    return digest.hexdigest()
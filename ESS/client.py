@@ -0,0 +1,112 @@
+import itertools
+import json
+import socket
+import sys
+
+DEFAULT_ADDRESS = 'localhost:7070'
+
+
+class ClientError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class Client(object):
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        family, target = parse_address(address)
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(target)
+        except socket.error as error:
+            self._socket.close()
+            raise ClientError("Cannot connect to %s: %s" % (address, error))
+        self._file = self._socket.makefile('rb')
+        self._ids = itertools.count(1)
+        self._responses = {}
+
+    def request(self, op, **fields):
+        return self.receive(self.send(op, **fields))
+
+    def send(self, op, **fields):
+        fields['op'] = op
+        fields['id'] = next(self._ids)
+        try:
+            self._socket.sendall(json.dumps(fields) + '\n')
+        except socket.error as error:
+            raise ClientError("Cannot send request: %s" % error)
+        return fields['id']
+
+    def receive(self, request_id):
+        while request_id not in self._responses:
+            try:
+                line = self._file.readline()
+            except socket.error as error:
+                raise ClientError("Cannot receive response: %s" % error)
+            if not line:
+                raise ClientError("Connection closed by the server")
+            response = json.loads(line)
+            self._responses[response.get('id')] = response
+        return self._responses.pop(request_id)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def parse_address(address):
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        try:
+            return socket.AF_INET, (host, int(port))
+        except ValueError:
+            raise ClientError("Wrong port in address %s" % address)
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ClientError("Unix sockets are not supported on this platform")
+    return socket.AF_UNIX, address
+
+
+def parse_field(value):
+    if value.startswith('@'):
+        with open(value[1:]) as f:
+            return f.read()
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print "Usage: client.py ADDRESS OP [KEY=VALUE ...]"
+        print "ADDRESS is HOST:PORT or the path of a Unix socket, VALUE is JSON, a string or @FILE to send its content"
+        print "Example: client.py localhost:7070 run kb=gioco_otto_3 strategy=AStar:MANHATTANDISTANCE:contenuto,riga,colonna"
+        print "Example: client.py localhost:7070 assert kb=gioco_otto_3 text=@facts.txt"
+        return -1
+    fields = {}
+    for param in argv[2:]:
+        key, sep, value = param.partition('=')
+        if not sep or not key:
+            print "Bad argument %s, expected KEY=VALUE" % param
+            return -1
+        try:
+            fields[key] = parse_field(value)
+        except IOError as error:
+            print error
+            return -1
+    try:
+        client = Client(argv[0])
+        try:
+            response = client.request(argv[1], **fields)
+        finally:
+            client.close()
+    except ClientError as error:
+        print error
+        return -1
+    print json.dumps(response, indent=2, sort_keys=True)
+    return 0 if response.get('ok') else 1
@@ -0,0 +1,171 @@
+from __future__ import division
+import array
+import math
+from ESS import entity
+
+MODES = ('EXACT', 'FINGERPRINT64', 'FINGERPRINT128', 'BITSTATE')
+BITSTATE_BITS = 26
+BITSTATE_HASHES = 3
+INITIAL_CAPACITY = 1 << 10
+MAX_LOAD = 0.5
+WORD_BITS = array.array('L').itemsize * 8
+WORD_MASK = (1 << WORD_BITS) - 1
+SECONDARY_SALT = 0x9e3779b97f4a7c15
+
+
+class ClosedSetError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class ExactClosedSet(set):
+
+    def __str__(self):
+        return "Closed set: exact, %s states" % len(self)
+
+    def collision_probability(self):
+        return 0.0
+
+
+class FingerprintTable(object):
+
+    def __init__(self, bits=64, capacity=INITIAL_CAPACITY):
+        if bits % WORD_BITS or bits not in (64, 128):
+            raise ClosedSetError("Unsupported fingerprint size %s" % bits)
+        self.bits = bits
+        self._words = bits // WORD_BITS
+        self._capacity = capacity
+        self._slots = array.array('L', [0]) * (capacity * self._words)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, state):
+        return self._probe(self._fingerprint(state))[1]
+
+    def __str__(self):
+        return "Closed set: %s-bit fingerprints, %s states, %s bytes, estimated collision probability: %.3g" % \
+                (self.bits, self._len, self.memory(), self.collision_probability())
+
+    def add(self, state):
+        if self._len + 1 > self._capacity * MAX_LOAD:
+            self._grow()
+        words = self._fingerprint(state)
+        i, found = self._probe(words)
+        if not found:
+            self._store(i, words)
+            self._len += 1
+
+    def memory(self):
+        return len(self._slots) * self._slots.itemsize
+
+    def collision_probability(self):
+        return -math.expm1(-self._len * (self._len - 1) / 2 ** (self.bits + 1))
+
+    def _fingerprint(self, state):
+        fp = hash(state) & entity.ZOBRIST_MASK
+        if self.bits > 64:
+            fp |= secondary_fingerprint(state) << 64
+        words = [(fp >> (WORD_BITS * k)) & WORD_MASK for k in xrange(self._words)]
+        words[0] = words[0] or 1
+        return words
+
+    def _probe(self, words):
+        slots = self._slots
+        n = self._words
+        mask = self._capacity - 1
+        i = words[0] & mask
+        while True:
+            base = i * n
+            first = slots[base]
+            if not first:
+                return i, False
+            if first == words[0] and all(slots[base+k] == words[k] for k in xrange(1, n)):
+                return i, True
+            i = (i + 1) & mask
+
+    def _store(self, i, words):
+        base = i * self._words
+        for k, word in enumerate(words):
+            self._slots[base+k] = word
+
+    def _grow(self):
+        old_slots, n = self._slots, self._words
+        self._capacity *= 2
+        self._slots = array.array('L', [0]) * (self._capacity * n)
+        for base in xrange(0, len(old_slots), n):
+            if old_slots[base]:
+                words = old_slots[base:base+n].tolist()
+                self._store(self._probe(words)[0], words)
+
+
+class BitstateTable(object):
+
+    def __init__(self, bits=BITSTATE_BITS, hashes=BITSTATE_HASHES):
+        if bits < 3:
+            raise ClosedSetError("Bitstate table needs at least 2**3 bits")
+        self.bits = bits
+        self.hashes = hashes
+        self._mask = (1 << bits) - 1
+        self._table = bytearray(1 << (bits - 3))
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, state):
+        table = self._table
+        for position in self._positions(state):
+            if not table[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __str__(self):
+        return "Closed set: bitstate, %s states, %s bytes, %s hashes, estimated collision probability: %.3g" % \
+                (self._len, self.memory(), self.hashes, self.collision_probability())
+
+    def add(self, state):
+        table = self._table
+        new = False
+        for position in self._positions(state):
+            bit = 1 << (position & 7)
+            if not table[position >> 3] & bit:
+                table[position >> 3] |= bit
+                new = True
+        if new:
+            self._len += 1
+
+    def memory(self):
+        return len(self._table)
+
+    def collision_probability(self):
+        return (-math.expm1(-self.hashes * self._len / (self._mask + 1))) ** self.hashes
+
+    def _positions(self, state):
+        h1 = hash(state) & entity.ZOBRIST_MASK
+        h2 = entity.mix64(h1 ^ SECONDARY_SALT) | 1
+        return [(h1 + i*h2) & self._mask for i in xrange(self.hashes)]
+
+
+def new_closed_set(mode='EXACT', bits=None):
+    if mode == 'EXACT':
+        return ExactClosedSet()
+    if mode == 'FINGERPRINT64':
+        return FingerprintTable(64)
+    if mode == 'FINGERPRINT128':
+        return FingerprintTable(128)
+    if mode == 'BITSTATE':
+        return BitstateTable(bits or BITSTATE_BITS)
+    raise ClosedSetError("Unknown closed set mode %s" % mode)
+
+
+def secondary_fingerprint(state):
+    h = 0
+    for fact in state:
+        h ^= entity.mix64(hash(fact) ^ SECONDARY_SALT)
+    return h
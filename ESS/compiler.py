@@ -0,0 +1,147 @@
+import operator
+from ESS import entity
+from ESS import operation
+from ESS import analyzer
+from ESS.parsing import parser
+
+PREDICATE = { operation.pred_equal: operator.eq,
+              operation.pred_not_equal: operator.ne,
+              operation.pred_greater_than: operator.gt,
+              operation.pred_less_than: operator.lt,
+              operation.pred_greater_equal_than: operator.ge,
+              operation.pred_less_equal_than: operator.le }
+
+
+class CompiledRule(object):
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.name = rule.name
+        self._disjunctions = []
+        for disjunction in rule.antecedent.disjunctions:
+            conditions = []
+            for condition in disjunction.conditions:
+                get_value = _compile_value(condition.value, condition)
+                conditions.append((condition, get_value, _compile_condition(condition, get_value)))
+            self._disjunctions.append(conditions)
+        self._conclusions = []
+        for conclusion in rule.consequent.conclusions:
+            if len(conclusion.arg_list) == 2:
+                get_value = _compile_value(conclusion.arg_list[1], conclusion)
+            else:
+                get_value = None
+            self._conclusions.append((conclusion, get_value))
+        self.match = _compile_antecedent([[test for _, _, test in conditions] for conditions in self._disjunctions])
+
+    def __str__(self):
+        return str(self.rule)
+
+    def instantiate(self, facts):
+        disjunctions = []
+        for conditions in self._disjunctions:
+            new_conditions = []
+            for condition, get_value, _ in conditions:
+                new_conditions.append(entity.Condition(condition.predicate, condition.fact_name,
+                                                       condition.test_attr, get_value(facts)))
+            disjunctions.append(entity.Disjunction(new_conditions))
+        conclusions = []
+        for conclusion, get_value in self._conclusions:
+            if get_value is None:
+                conclusions.append(entity.Conclusion(conclusion.action, conclusion.fact_name, *conclusion.arg_list))
+            else:
+                conclusions.append(entity.Conclusion(conclusion.action, conclusion.fact_name,
+                                                     conclusion.arg_list[0], get_value(facts)))
+        return entity.Rule(self.name, entity.Antecedent(disjunctions), entity.Consequent(conclusions),
+                           self.rule.salience)
+
+
+class InterpretedRule(object):
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.name = rule.name
+
+    def __str__(self):
+        return str(self.rule)
+
+    def match(self, facts):
+        return analyzer.evaluate_values(self.rule, facts).antecedent(facts)
+
+    def instantiate(self, facts):
+        return analyzer.evaluate_values(self.rule, facts)
+
+
+def _compile_antecedent(disjunctions):
+    if all(len(tests) == 1 for tests in disjunctions):
+        tests = tuple(tests[0] for tests in disjunctions)
+        def match(facts):
+            for test in tests:
+                if not test(facts):
+                    return False
+            return True
+        return match
+
+    disjunctions = tuple(tuple(tests) for tests in disjunctions)
+    def match(facts):
+        for tests in disjunctions:
+            for test in tests:
+                if test(facts):
+                    break
+            else:
+                return False
+        return True
+    return match
+
+
+def _compile_condition(condition, get_value):
+    fact_name, attr = condition.fact_name, condition.test_attr
+    op = PREDICATE.get(condition.predicate, None)
+    if op is None:
+        predicate = condition.predicate
+        return lambda facts: predicate(facts, fact_name, attr, get_value(facts))
+    return lambda facts: op(facts[fact_name][attr], get_value(facts))
+
+
+def _compile_value(value, source):
+    if not isinstance(value, str):
+        return lambda facts: value
+    if '->' not in value and not entity.ARITHMETIC_OP_REX.findall(value):
+        return lambda facts: value
+
+    op_result = analyzer.ARITHMETIC_OP_REX.findall(value)
+    if not op_result:
+        return _compile_operand(value)
+    if len(op_result) > 1:
+        raise analyzer.ValueEvaluatingError(str(source))
+    op_symbol = op_result[0]
+    op = analyzer.OPERATOR[op_symbol]
+    operands = analyzer.ARITHMETIC_OP_REX.split(value)
+    get_a = _compile_operand(operands[0])
+    get_b = _compile_operand(operands[1])
+
+    def get_value(facts):
+        a = get_a(facts)
+        b = get_b(facts)
+        if a is None or b is None:
+            return "NIL"
+        if not analyzer._is_number(a) or not analyzer._is_number(b):
+            raise analyzer.NotNumericOperandError("%s%s%s" % (str(a), op_symbol, str(b)))
+        return op(a, b)
+    return get_value
+
+
+def _compile_operand(slice):
+    if '->' not in slice:
+        constant = parser.cast_trial(slice)
+        return lambda facts: constant
+    try:
+        fact_name, attr = slice.split('->')
+    except ValueError:
+        raise analyzer.ValueEvaluatingError(str(slice))
+
+    def get_attribute(facts):
+        v = facts[fact_name][attr]
+        if isinstance(v, str):
+            v = parser.cast_trial(v)
+        return v
+    return get_attribute
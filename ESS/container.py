@@ -1,5 +1,5 @@
 import itertools
-import copy
+from collections import OrderedDict
 from ESS import entity
 
 class ContainerError(Exception):
@@ -19,67 +19,209 @@ class EmptyContainerError(ContainerError):
         return "Container is empty"
 
 
+_NOTHING_OWNED = frozenset()
+_NO_FACTS = frozenset()
+
+
 class FactContainer(object):
 
+    __slots__ = ('_schema', '_facts', '_owned', '_hash', '_index')
+
     def __init__(self):
-        self._facts = {}
+        self._schema = entity.SYMBOLS.schema(())
+        self._facts = []
+        self._owned = None
+        self._hash = None
+        self._index = None
 
     def __iter__(self):
-        return iter(self._facts.values())
+        return iter(self._facts)
 
     def __getitem__(self, fact_name):
         try:
-            return self._facts[fact_name]
+            return self._facts[self._schema.index[fact_name]]
         except KeyError:
             raise NotExistentItemError(fact_name)
 
     def __str__(self):
         l = ['Facts:']
-        for fact in self._facts.values():
+        for fact in self._facts:
             l.append('\n%s' % fact)
         l.append("\n\nFacts count: %d" % len(self._facts))
         return ''.join(l)
 
     def __hash__(self):
-        return hash(frozenset(self._facts.items()))
+        if self._hash is None:
+            h = 0
+            for fact in self._facts:
+                h ^= hash(fact)
+            self._hash = h
+        return self._hash
 
     def __eq__(self, other):
-        return self._facts == other._facts
+        if self._schema is other._schema:
+            return tuple(self._facts) == tuple(other._facts)
+        if self._schema.frozen != other._schema.frozen:
+            return False
+        for fact in self._facts:
+            if fact != other[fact.name]:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __nonzero__(self):
         return bool(self._facts)
 
+    def __getstate__(self):
+        return self._schema.names, tuple(self._facts), self._hash
+
+    def __setstate__(self, state):
+        names, self._facts, self._hash = state
+        self._schema = entity.SYMBOLS.schema(names)
+        self._owned = _NOTHING_OWNED
+        self._index = None
+
     def get_facts_names(self):
-        return frozenset(self._facts.keys())
+        return self._schema.frozen
 
     def add(self, fact):
         if not isinstance(fact, entity.Fact):
             raise ValueError(fact)
-        if fact.name in self._facts:
+        if fact.name in self._schema.index:
             raise DuplicateItemError(str(fact))
-        self._facts[fact.name] = fact
+        self._own_facts()
+        self._schema = self._schema.extend(fact.name)
+        self._facts.append(fact)
+        if self._owned is not None:
+            self._own(fact.name)
+        if self._hash is not None:
+            self._hash ^= hash(fact)
+        if self._index is not None:
+            for attr, value in fact.items():
+                self._index_attribute(fact.name, attr, value)
 
     def remove(self, fact_name):
         try:
-            del self._facts[fact_name]
+            i = self._schema.index[fact_name]
         except KeyError:
             raise NotExistentItemError(fact_name)
+        self._own_facts()
+        self._schema = self._schema.reduce(fact_name)
+        fact = self._facts.pop(i)
+        if self._hash is not None:
+            self._hash ^= hash(fact)
+        if self._index is not None:
+            for attr, value in fact.items():
+                self._unindex_attribute(fact_name, attr, value)
 
     def update(self, other):
-        self._facts.update(other._facts)
+        self._own_facts()
+        for fact in other._facts:
+            try:
+                self._facts[self._schema.index[fact.name]] = fact
+            except KeyError:
+                self._schema = self._schema.extend(fact.name)
+                self._facts.append(fact)
+        self._owned = other._owned = _NOTHING_OWNED
+        self._hash = None
+        self._index = None
 
     def clear(self):
-        self._facts.clear()
+        self._schema = entity.SYMBOLS.schema(())
+        self._facts = []
+        self._hash = None
+        self._index = None
 
     def copy(self):
-        return copy.deepcopy(self)
+        new_container = self.__class__()
+        self._facts = tuple(self._facts)
+        new_container._schema = self._schema
+        new_container._facts = self._facts
+        new_container._owned = self._owned = _NOTHING_OWNED
+        new_container._hash = self._hash
+        return new_container
+
+    def set_attribute(self, fact_name, attr, value):
+        fact = self.get_mutable(fact_name)
+        old_hash = hash(fact)
+        if self._index is not None:
+            if attr in fact:
+                self._unindex_attribute(fact_name, attr, fact[attr])
+            self._index_attribute(fact_name, attr, value)
+        fact[attr] = value
+        if self._hash is not None:
+            self._hash ^= old_hash ^ hash(fact)
+
+    def del_attribute(self, fact_name, attr):
+        fact = self.get_mutable(fact_name)
+        old_hash = hash(fact)
+        if self._index is not None and attr in fact:
+            self._unindex_attribute(fact_name, attr, fact[attr])
+        del fact[attr]
+        if self._hash is not None:
+            self._hash ^= old_hash ^ hash(fact)
+
+    def lookup(self, attr, value):
+        return self._get_index()[0].get((attr, value), _NO_FACTS)
+
+    def with_attribute(self, attr):
+        return self._get_index()[1].get(attr, _NO_FACTS)
+
+    def get_mutable(self, fact_name):
+        fact = self[fact_name]
+        if self._owned is None or fact_name in self._owned:
+            return fact
+        fact = fact.copy()
+        self._own_facts()
+        self._facts[self._schema.index[fact_name]] = fact
+        self._own(fact_name)
+        return fact
+
+    def freeze(self):
+        self._facts = tuple(self._facts)
+        self._owned = _NOTHING_OWNED
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = ({}, {})
+            for fact in self._facts:
+                for attr, value in fact.items():
+                    self._index_attribute(fact.name, attr, value)
+        return self._index
+
+    def _index_attribute(self, fact_name, attr, value):
+        by_value, by_attribute = self._index
+        by_value.setdefault((attr, value), set()).add(fact_name)
+        by_attribute.setdefault(attr, set()).add(fact_name)
+
+    def _unindex_attribute(self, fact_name, attr, value):
+        by_value, by_attribute = self._index
+        by_value[(attr, value)].discard(fact_name)
+        if not by_value[(attr, value)]:
+            del by_value[(attr, value)]
+        by_attribute[attr].discard(fact_name)
+        if not by_attribute[attr]:
+            del by_attribute[attr]
+
+    def _own_facts(self):
+        if isinstance(self._facts, tuple):
+            self._facts = list(self._facts)
+
+    def _own(self, fact_name):
+        if self._owned is _NOTHING_OWNED:
+            self._owned = set()
+        self._owned.add(fact_name)
 
 
 class GoalContainer(FactContainer):
 
+    __slots__ = ()
+
     def __str__(self):
         l = ['Goal:']
-        for fact in self._facts.values():
+        for fact in self._facts:
             l.append('\n%s' % fact)
         return ''.join(l)
 
@@ -87,9 +229,11 @@ class GoalContainer(FactContainer):
 class RuleContainer(object):
 
     def __init__(self):
-        self._rules = set()
+        self._rules = OrderedDict()
         self._placeholder = {}
         self.unbinded = _UnbindedRuleContainer()
+        self.version = 0
+        self._shared = False
 
     def __iter__(self):
         return itertools.chain(iter(self._rules), iter(self.unbinded))
@@ -113,10 +257,12 @@ class RuleContainer(object):
     def add(self, rule):
         if not isinstance(rule, entity.Rule):
             raise ValueError(rule)
+        self.version += 1
         if rule.is_binded():
             if rule.name in self._rules:
                 raise DuplicateItemError(rule.name)
-            self._rules.add(rule)
+            self._own()
+            self._rules[rule] = None
             self._placeholder[rule.name] = rule
         else:
             self.unbinded.add(rule)
@@ -124,35 +270,59 @@ class RuleContainer(object):
     def pop(self):
         if not self._rules:
             raise EmptyContainerError()
-        return self._rules.pop()
+        self._own()
+        return self._rules.popitem()[0]
 
     def remove(self, rule_name):
         rule = self._placeholder.get(rule_name, None) or self.unbinded._placeholder.get(rule_name, None)
         if not rule:
-            raise NotExistentItemError(rule.name)
+            raise NotExistentItemError(rule_name)
+        self.version += 1
         if rule.is_binded():
-            self._rules.remove(rule)
+            self._own()
+            del self._rules[rule]
             del self._placeholder[rule.name]
         else:
             self.unbinded.remove(rule)
 
     def update(self, other):
+        self._own()
         self._rules.update(other._rules)
+        self._placeholder.update(other._placeholder)
+        self.unbinded._own()
         self.unbinded._rules.update(other.unbinded._rules)
+        self.unbinded._placeholder.update(other.unbinded._placeholder)
+        self.version += 1
 
     def clear(self):
-        self._rules.clear()
+        self._rules = OrderedDict()
+        self._placeholder = {}
+        self._shared = False
         self.unbinded.clear()
+        self.version += 1
 
     def copy(self):
-        return copy.deepcopy(self)
+        new_container = RuleContainer()
+        new_container._rules = self._rules
+        new_container._placeholder = self._placeholder
+        new_container._shared = self._shared = True
+        new_container.unbinded = self.unbinded.copy()
+        new_container.version = self.version
+        return new_container
+
+    def _own(self):
+        if self._shared:
+            self._rules = OrderedDict(self._rules)
+            self._placeholder = self._placeholder.copy()
+            self._shared = False
 
 
 class _UnbindedRuleContainer(RuleContainer):
 
     def __init__(self):
-        self._rules = set()
+        self._rules = OrderedDict()
         self._placeholder = {}
+        self._shared = False
 
     def __iter__(self):
         return iter(self._rules)
@@ -166,13 +336,24 @@ class _UnbindedRuleContainer(RuleContainer):
     def add(self, rule):
         if rule.name in self._rules:
             raise DuplicateItemError(rule.name)
-        self._rules.add(rule)
+        self._own()
+        self._rules[rule] = None
         self._placeholder[rule.name] = rule
 
     def clear(self):
-        self._rules.clear()
+        self._rules = OrderedDict()
+        self._placeholder = {}
+        self._shared = False
+
+    def copy(self):
+        new_container = _UnbindedRuleContainer()
+        new_container._rules = self._rules
+        new_container._placeholder = self._placeholder
+        new_container._shared = self._shared = True
+        return new_container
 
     def remove(self, rule):
-        self._rules.remove(rule)
+        self._own()
+        del self._rules[rule]
         del self._placeholder[rule.name]
 
@@ -1,11 +1,23 @@
 from __future__ import division
 import heapq
+import itertools
 from collections import deque
 import time
-import sys
-from twitter.api import _DEFAULT
 from ESS import entity
-from ESS import analyzer
+from ESS import rete
+from ESS import openlist
+from ESS import closedset
+from ESS import external
+from ESS import checkpoint
+from ESS import budget
+from ESS import parallel
+from ESS import portfolio
+from ESS import patterndb
+from ESS import heuristic
+from ESS import backward
+
+DEFAULT_WEIGHT = 2
+BEAM_WIDTH = 100
 
 
 class EngineError(Exception):
@@ -23,296 +35,818 @@ class EmptyAgendaError(EngineError):
 
 class WorkingMemory(object):
 
-    def __init__(self, facts, rules, goal):
+    def __init__(self, facts, rules, goal, grounding_cache_size=rete.GROUNDING_CACHE_SIZE):
         self.initial_state = facts
         self.rules = rules
         self.goal = goal
+        self.groundings = rete.GroundingCache(grounding_cache_size)
 
     def __str__(self):
         return "%s\n%s\n%s" % (self.initial_state, self.rules, self.goal)
 
+    def grounded_rules(self, facts):
+        return self.groundings.rules(self, facts)
+
+    def network(self, facts, compiled=True):
+        return self.groundings.network(self, facts, compiled)
+
 
 class Agenda(object):
 
     def __init__(self):
         self._queue = []
-        self._consequents = set()
-        self._priority = {}
-        if sys.platform == "win32":
-            self._timer = time.clock
-        else:
-            self._timer = time.time
+        self._entries = {}
+        self._counter = itertools.count()
 
     def __len__(self):
-        return len(self._queue)
+        return len(self._entries)
 
     def __iter__(self):
-        return (el[1] for el in iter(self._queue))
+        return (entry[-1] for entry in sorted(self._entries.itervalues()))
 
     def __str__(self):
         l = ['Agenda:']
-        for item in self._queue:
-            l.append(str(item[1])+'\n')
+        for rule in self:
+            l.append(str(rule)+'\n')
         return '\n'.join(l)
 
-    def __contains__(self, rule):
-        return rule in self._consequents
+    def __contains__(self, key):
+        return key in self._entries
 
     def is_empty(self):
-        return not bool(self._queue)
+        return not self._entries
 
-    def push(self, rule):
+    def push(self, rule, priority=None, key=None):
         if not isinstance(rule, entity.Rule):
             raise ValueError(rule)
-        if rule.consequent not in self._consequents:
-            self._priority[rule.name] = -(self._timer())
-            self._consequents.add(rule.consequent)
-            heapq.heappush(self._queue, (self._priority[rule.name], rule))
+        if key is None:
+            key = rule.consequent
+        if key in self._entries:
+            return False
+        if priority is None:
+            priority = (-rule.salience,)
+        entry = (priority, -next(self._counter), key, rule)
+        self._entries[key] = entry
+        heapq.heappush(self._queue, entry)
+        return True
 
     def pop(self):
-        if not self._queue:
-            raise EmptyAgendaError()
-        rule = heapq.heappop(self._queue)[-1]
-        self._consequents.remove(rule.consequent)
-        return rule
+        return self.pop_item()[1]
+
+    def pop_item(self):
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            if self._entries.get(entry[2]) is entry:
+                del self._entries[entry[2]]
+                return entry[2], entry[3]
+        raise EmptyAgendaError()
+
+    def discard(self, key):
+        self._entries.pop(key, None)
 
     def clear(self):
-        self._consequents.clear()
-        self._priority.clear()
+        self._entries.clear()
         del self._queue[:]
 
 
+def lex_strategy(rule, recency, specificity):
+    return (-rule.salience, tuple(sorted(-tag for tag in recency)) + (1,), -specificity)
+
+
+def mea_strategy(rule, recency, specificity):
+    return (-rule.salience, -(recency[0] if recency else 0)) + lex_strategy(rule, recency, specificity)[1:]
+
+
+CONFLICT_STRATEGIES = { 'LEX': lex_strategy,
+                        'MEA': mea_strategy }
+
+
+class SearchNode(object):
+
+    __slots__ = ('state', 'parent', 'rule', 'g', 'h', 'depth', 'conflict_set')
+
+    def __init__(self, state, parent=None, rule=None, h=0):
+        self.state = state
+        self.parent = parent
+        self.rule = rule
+        if parent is None:
+            self.depth = 0
+        else:
+            self.depth = parent.depth + 1
+        self.g = self.depth
+        self.h = h
+        self.conflict_set = None
+
+    def path(self):
+        rules = []
+        node = self
+        while node.parent is not None:
+            rules.append(node.rule)
+            node = node.parent
+        rules.reverse()
+        return rules
+
+
 class Engine(object):
 
-    def run(self, w_memory, search_fun, max_depth, h_fun=None, h_attrs=None, ):
+    def __init__(self, compiled=True, open_list=None, pattern_db_dir=None):
+        self.compiled = compiled
+        self.open_list = open_list
+        self.pattern_db_dir = pattern_db_dir
+
+    def run(self, w_memory, search_fun, max_depth, h_fun=None, h_attrs=None, workers=1,
+            closed=None, closed_bits=None, memory_budget=None, scratch_dir=None,
+            checkpoint_file=None, checkpoint_interval=None, restore=None,
+            deadline=None, memory_limit=None, weight=None, width=None):
+        if workers > 1 and search_fun not in (Engine.a_star_search, Engine.breadth_first_search):
+            raise EngineError("Parallel search is available only for A* and BFS")
+        try:
+            search_budget = budget.Budget(deadline, memory_limit)
+        except budget.BudgetError as error:
+            raise EngineError(str(error))
+        search_options = {'budget': search_budget}
+        if weight is not None:
+            if search_fun not in WEIGHTED_SEARCHES:
+                raise EngineError("Weight is available only for weighted searches")
+            search_options['weight'] = weight
+        if width is not None:
+            if search_fun != Engine.beam_search:
+                raise EngineError("Width is available only for beam search")
+            search_options['width'] = width
+        if closed is not None:
+            if workers > 1 or search_fun not in (Engine.a_star_search, Engine.weighted_a_star_search,
+                                                 Engine.best_first_search, Engine.breadth_first_search,
+                                                 Engine.depth_first_search):
+                raise EngineError("Closed set modes are available only for A*, weighted A*, Best First, BFS and DFS")
+            try:
+                search_options['closed'] = closedset.new_closed_set(closed, closed_bits)
+            except closedset.ClosedSetError as error:
+                raise EngineError(str(error))
+        if memory_budget is not None or scratch_dir is not None:
+            if search_fun != Engine.external_breadth_first_search:
+                raise EngineError("Memory budget and scratch directory are available only for external BFS")
+            search_options['memory_budget'] = memory_budget
+            search_options['scratch_dir'] = scratch_dir
+        if checkpoint_file is not None or restore is not None:
+            if workers > 1 or search_fun not in (Engine.a_star_search, Engine.weighted_a_star_search,
+                                                 Engine.best_first_search, Engine.breadth_first_search):
+                raise EngineError("Checkpoints are available only for A*, weighted A*, Best First and BFS")
+        if restore is not None:
+            search_options['restore'] = restore
+            if closed is not None:
+                search_options['closed'] = restore['closed']
+        if checkpoint_file is not None:
+            header = {'search': search_fun.__name__,
+                      'max_depth': max_depth,
+                      'h_fun': h_fun.__name__ if h_fun else None,
+                      'h_attrs': h_attrs,
+                      'closed': closed,
+                      'closed_bits': closed_bits,
+                      'weight': weight,
+                      'kb': checkpoint.kb_digest(w_memory)}
+            search_options['checkpoint'] = checkpoint.Checkpointer(checkpoint_file, header, checkpoint_interval)
         start_time = time.time()
         try:
-            if h_fun:
-                arrival_state, rules_applied, visited_cnt = search_fun(self, w_memory, max_depth, h_fun, h_attrs)
-            else:
-                arrival_state, rules_applied, visited_cnt = search_fun(self, w_memory, max_depth)
+            if h_fun == Engine.h_pattern_database and not isinstance(h_attrs, patterndb.PatternDatabase):
+                h_attrs = patterndb.load(w_memory, h_attrs, self.pattern_db_dir, self.compiled)
+            try:
+                if workers > 1:
+                    arrival_state, rules_applied, visited_cnt = \
+                            parallel.hda_star_search(self, w_memory, max_depth, workers, h_fun, h_attrs, search_budget)
+                elif h_fun:
+                    arrival_state, rules_applied, visited_cnt = \
+                            search_fun(self, w_memory, max_depth, h_fun, h_attrs, **search_options)
+                else:
+                    arrival_state, rules_applied, visited_cnt = \
+                            search_fun(self, w_memory, max_depth, **search_options)
+            except BaseException:
+                _final_checkpoint(search_options.get('checkpoint'))
+                raise
+            if rules_applied is None and search_budget.exhausted:
+                _final_checkpoint(search_options.get('checkpoint'))
+        except parallel.ParallelSearchError as error:
+            raise EngineError("Error in parallel search:\n%s" % error)
+        except patterndb.PatternDatabaseError as error:
+            raise EngineError("Error with pattern database: %s" % error)
+        except external.ExternalSearchError as error:
+            raise EngineError("Error in external search: %s" % error)
+        except checkpoint.CheckpointError as error:
+            raise EngineError(str(error))
         except Exception:
             raise EngineError("Error with inference engine, maybe wrong heuristic attribute?")
 
-        sec_elapsed = int(time.time()-start_time)
-        if sec_elapsed > 60:
-            min_elapsed = sec_elapsed//60
-            sec_elapsed %= 60
-            time_elapsed_str = "%s minutes, %s seconds" % (min_elapsed, sec_elapsed)
+        _print_outcome(w_memory, arrival_state, rules_applied, visited_cnt, _elapsed_str(start_time))
+        print w_memory.groundings
+        if 'closed' in search_options:
+            print search_options['closed']
+        if search_budget:
+            print search_budget
+
+    def run_portfolio(self, w_memory, strategies, deadline=None, memory_limit=None, best=False):
+        try:
+            budget.Budget(deadline, memory_limit)
+        except budget.BudgetError as error:
+            raise EngineError(str(error))
+        racers = []
+        for search_fun, max_depth, h_fun, h_attrs in strategies:
+            if search_fun in (Engine.external_breadth_first_search, Engine.run_forward):
+                raise EngineError("%s cannot run in a portfolio" % search_fun.__name__)
+            if h_fun == Engine.h_pattern_database and not isinstance(h_attrs, patterndb.PatternDatabase):
+                try:
+                    h_attrs = patterndb.load(w_memory, h_attrs, self.pattern_db_dir, self.compiled)
+                except patterndb.PatternDatabaseError as error:
+                    raise EngineError("Error with pattern database: %s" % error)
+            racers.append((search_fun, max_depth, h_fun, h_attrs))
+        start_time = time.time()
+        try:
+            winner, outcomes = portfolio.race(self, w_memory, racers, deadline, memory_limit, best)
+        except portfolio.PortfolioError as error:
+            raise EngineError(str(error))
+
+        time_elapsed_str = _elapsed_str(start_time)
+        if winner is not None:
+            print "Winner: %s\n" % _strategy_name(racers[winner])
+            outcome = outcomes[winner]
+            _print_outcome(w_memory, outcome.arrival_state, outcome.rules, outcome.visited_cnt, time_elapsed_str)
         else:
-            time_elapsed_str = "%s seconds" % sec_elapsed
-
-        if rules_applied:
-            penetrance = len(rules_applied)/visited_cnt
-            print "Initial state:\n%s\n" % w_memory.initial_state
-            print "Rule applied:\n\n%s\n" % '\n\n'.join(map(str, rules_applied))
-            print "Arrival state:\n%s" % arrival_state
-            print "\nSUCCESS\nPath length: %s\nPenetrance: %s\nVisited nodes count: %s\nTime elapsed: %s" % \
-                    (len(rules_applied), str(penetrance), str(visited_cnt), time_elapsed_str)
+            _print_outcome(w_memory, w_memory.initial_state, None,
+                           sum(outcome.visited_cnt for outcome in outcomes), time_elapsed_str)
+        print
+        for racer, outcome in zip(racers, outcomes):
+            path_length = " path length %s," % len(outcome.rules) if outcome.rules is not None else ''
+            print "%s: %s,%s visited nodes count: %s, time elapsed: %.2f seconds" % \
+                    (_strategy_name(racer), outcome.status, path_length, outcome.visited_cnt, outcome.elapsed)
+
+    def resume(self, w_memory, filepath, checkpoint_file=None, checkpoint_interval=None,
+               deadline=None, memory_limit=None):
+        try:
+            snapshot = checkpoint.load(filepath)
+        except checkpoint.CheckpointError as error:
+            raise EngineError(str(error))
+        if snapshot['kb'] != checkpoint.kb_digest(w_memory):
+            raise EngineError("Checkpoint %s was taken on a different knowledge base" % filepath)
+        search_fun = getattr(Engine, snapshot['search'])
+        h_fun = getattr(Engine, snapshot['h_fun']) if snapshot['h_fun'] else None
+        print "Resuming %s from %s, visited nodes counter: %s" % \
+                (snapshot['search'], filepath, snapshot['search_state']['visited_cnt'])
+        self.run(w_memory, search_fun, snapshot['max_depth'], h_fun, snapshot['h_attrs'],
+                 closed=snapshot['closed'], closed_bits=snapshot['closed_bits'], weight=snapshot.get('weight'),
+                 checkpoint_file=checkpoint_file or filepath, checkpoint_interval=checkpoint_interval,
+                 restore=snapshot['search_state'], deadline=deadline, memory_limit=memory_limit)
+
+    def run_forward(self, w_memory, max_cycles=None, strategy='LEX', deadline=None, memory_limit=None):
+        try:
+            search_budget = budget.Budget(deadline, memory_limit)
+        except budget.BudgetError as error:
+            raise EngineError(str(error))
+        start_time = time.time()
+        try:
+            final_state, rules_fired = self.forward_chain(w_memory, max_cycles, strategy, search_budget)
+        except EngineError:
+            raise
+        except Exception:
+            raise EngineError("Error with inference engine while forward chaining")
+
+        time_elapsed_str = _elapsed_str(start_time)
+        print "Initial state:\n%s\n" % w_memory.initial_state
+        if rules_fired:
+            print "Rule fired:\n\n%s\n" % '\n\n'.join(map(str, rules_fired))
+        print "Final state:\n%s" % final_state
+        if w_memory.goal and final_state == w_memory.goal:
+            outcome = "GOAL REACHED"
+        elif max_cycles is not None and len(rules_fired) >= max_cycles:
+            outcome = "CYCLE LIMIT REACHED"
+        elif search_budget.exhausted:
+            outcome = "%s REACHED" % search_budget.exhausted.upper()
         else:
-            print "Initial state:\n%s\n" % w_memory.initial_state
-            print "Arrival state:\n%s" % arrival_state
-            print "\nFAILURE\nVisited nodes count: %s\nTime elapsed: %s" % (visited_cnt, time_elapsed_str)
+            outcome = "QUIESCENCE"
+        print "\n%s\nCycles: %s\nTime elapsed: %s" % (outcome, len(rules_fired), time_elapsed_str)
+        if search_budget:
+            print search_budget
 
-    def breadth_first_search(self, w_memory, max_depth):
+    def forward_chain(self, w_memory, max_cycles=None, strategy='LEX', budget=None):
+        try:
+            conflict_resolution = CONFLICT_STRATEGIES[strategy]
+        except KeyError:
+            raise EngineError("Unknown conflict resolution strategy %s" % strategy)
+        state = w_memory.initial_state
+        tags = dict((fact.name, 0) for fact in state)
         agenda = Agenda()
-        open = deque([(w_memory.initial_state, [])])
+        networks = {}
+        network = None
+        conflict_set = frozenset()
+        activations = {}
+        fired = set()
+        rules_fired = []
+        rule = None
+
+        while max_cycles is None or len(rules_fired) < max_cycles:
+            if w_memory.goal and state == w_memory.goal:
+                break
+            if budget is not None and budget.expired(len(rules_fired)):
+                break
+            facts_names = state.get_facts_names()
+            try:
+                new_network = networks[facts_names]
+            except KeyError:
+                new_network = w_memory.network(state, self.compiled)
+                networks[facts_names] = new_network
+
+            if new_network is not network:
+                network = new_network
+                agenda.clear()
+                activations.clear()
+                conflict_set = network.match(state)
+                entering = conflict_set
+            else:
+                modified = network.readers(conclusion.fact_name for conclusion in rule.consequent.conclusions)
+                new_conflict_set = network.rematch(state, conflict_set, rule)
+                for i in (conflict_set - new_conflict_set) | (conflict_set & modified):
+                    if i in activations:
+                        agenda.discard(activations.pop(i))
+                entering = (new_conflict_set - conflict_set) | (new_conflict_set & modified)
+                conflict_set = new_conflict_set
+
+            for i in entering:
+                activation = network.activation(i, state)
+                recency = [tags.get(fact_name, 0) for fact_name in rete.antecedent_facts(activation)]
+                key = (activation.name, tuple(recency), activation.consequent)
+                if key in fired:
+                    continue
+                specificity = sum(len(disjunction.conditions) for disjunction in activation.antecedent.disjunctions)
+                if agenda.push(activation, conflict_resolution(activation, recency, specificity), key):
+                    activations[i] = key
+
+            if agenda.is_empty():
+                break
+            key, rule = agenda.pop_item()
+            fired.add(key)
+            rules_fired.append(rule)
+            state = rule.consequent(state)
+            facts_names = state.get_facts_names()
+            for conclusion in rule.consequent.conclusions:
+                if conclusion.fact_name in facts_names:
+                    tags[conclusion.fact_name] = len(rules_fired)
+                else:
+                    tags.pop(conclusion.fact_name, None)
+
+        return state, rules_fired
+
+    def breadth_first_search(self, w_memory, max_depth, closed=None, checkpoint=None, restore=None, budget=None):
+        agenda = Agenda()
+        open = deque([SearchNode(w_memory.initial_state)])
         current_node = w_memory.initial_state
-        closed = {w_memory.initial_state}
+        compact = closed is not None
+        if not compact:
+            closed = set()
+        closed.add(w_memory.initial_state)
         visited_cnt = 0
-
-        rules = analyzer.bind_rules(w_memory.rules, current_node)
+        networks = {}
+        expanding = None
+        if restore is not None:
+            nodes = _unflatten_nodes(restore['nodes'])
+            open = deque(nodes[i] for i in restore['open'])
+            closed = restore['closed']
+            visited_cnt = restore['visited_cnt']
+        if checkpoint is not None:
+            checkpoint.track(lambda: _frontier_snapshot(open, closed, visited_cnt, expanding))
 
         while open:
             if visited_cnt != 0 and visited_cnt % 100 == 0:
                 print "Search in progress, visited nodes counter: %s" % visited_cnt
-            prev_node = current_node
-            current_node, path = open.popleft()
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save()
+            if budget is not None and budget.expired(visited_cnt):
+                break
+            node = open.popleft()
+            current_node = node.state
             if current_node == w_memory.goal:
-                return current_node, path, visited_cnt
+                return current_node, node.path(), visited_cnt
             visited_cnt += 1
-            if len(path) >= max_depth:
+            if node.depth >= max_depth:
                 continue
 
-            if current_node.get_facts_names() != prev_node.get_facts_names():
-                rules = analyzer.bind_rules(w_memory.rules, current_node)
-
-            for rule in rules:
-                rule = analyzer.evaluate_values(rule, current_node)
-                if rule.antecedent(current_node):
-                    agenda.push(rule)
+            expanding = node
+            network, node.conflict_set = self._match(w_memory, networks, node)
+            for rule in network.activations(current_node, node.conflict_set):
+                agenda.push(rule)
             while not agenda.is_empty():
                 rule_to_fire = agenda.pop()
                 new_node = rule_to_fire.consequent(current_node)
                 if new_node not in closed:
-                    open.append( (new_node, path+[rule_to_fire]) )
+                    open.append(SearchNode(new_node, node, rule_to_fire))
                     closed.add(new_node)
+            expanding = None
+            if compact:
+                node.state = None
 
         return current_node, None, visited_cnt
 
-    def depth_first_search(self, w_memory, max_depth):
+    def external_breadth_first_search(self, w_memory, max_depth, memory_budget=None, scratch_dir=None, budget=None):
+        return external.external_breadth_first_search(self, w_memory, max_depth, memory_budget, scratch_dir, budget)
+
+    def depth_first_search(self, w_memory, max_depth, closed=None, budget=None):
         agenda = Agenda()
-        open = [(w_memory.initial_state, [])]
+        open = [SearchNode(w_memory.initial_state)]
         current_node = w_memory.initial_state
-        closed = {w_memory.initial_state}
+        compact = closed is not None
+        if not compact:
+            closed = set()
+        closed.add(w_memory.initial_state)
         visited_cnt = 0
-
-        rules = analyzer.bind_rules(w_memory.rules, current_node)
+        networks = {}
 
         while open:
             if visited_cnt != 0 and visited_cnt % 100 == 0:
                 print "Search in progress, visited nodes counter: %s" % visited_cnt
-            prev_node = current_node
-            current_node, path = open.pop()
+            if budget is not None and budget.expired(visited_cnt):
+                break
+            node = open.pop()
+            current_node = node.state
             if current_node == w_memory.goal:
-                return current_node, path, visited_cnt
+                return current_node, node.path(), visited_cnt
             visited_cnt += 1
-            if len(path) > max_depth-1:
+            if node.depth > max_depth-1:
                 continue
 
-            if current_node.get_facts_names() != prev_node.get_facts_names():
-                rules = analyzer.bind_rules(w_memory.rules, current_node)
-
-            for rule in rules:
-                rule = analyzer.evaluate_values(rule, current_node)
-                if rule.antecedent(current_node):
-                    agenda.push(rule)
+            network, node.conflict_set = self._match(w_memory, networks, node)
+            for rule in network.activations(current_node, node.conflict_set):
+                agenda.push(rule)
             while not agenda.is_empty():
                 rule_to_fire = agenda.pop()
                 new_node = rule_to_fire.consequent(current_node)
                 if new_node not in closed:
-                    open.append( (new_node, path+[rule_to_fire]) )
+                    open.append(SearchNode(new_node, node, rule_to_fire))
                     closed.add(new_node)
+            if compact:
+                node.state = None
 
         return current_node, None, visited_cnt
 
-    def a_star_search(self, w_memory, max_depth, h_fun=None, h_attrs=None):
+    def a_star_search(self, w_memory, max_depth, h_fun=None, h_attrs=None, closed=None,
+                      checkpoint=None, restore=None, budget=None):
+        return self._informed_search(w_memory, max_depth, h_fun, h_attrs, lambda node: node.g + node.h,
+                                     closed, checkpoint, restore, budget)
+
+    def weighted_a_star_search(self, w_memory, max_depth, h_fun=None, h_attrs=None, weight=DEFAULT_WEIGHT,
+                               closed=None, checkpoint=None, restore=None, budget=None):
+        return self._informed_search(w_memory, max_depth, h_fun, h_attrs, lambda node: node.g + weight*node.h,
+                                     closed, checkpoint, restore, budget, weight)
+
+    def best_first_search(self, w_memory, max_depth, h_fun=None, h_attrs=None, closed=None,
+                          checkpoint=None, restore=None, budget=None):
+        return self._informed_search(w_memory, max_depth, h_fun, h_attrs, lambda node: node.h,
+                                     closed, checkpoint, restore, budget)
+
+    def _informed_search(self, w_memory, max_depth, h_fun, h_attrs, priority, closed=None,
+                         checkpoint=None, restore=None, budget=None, weight=1):
         agenda = Agenda()
-        if h_attrs:
-            priority = h_fun(self, w_memory.initial_state, w_memory.goal, h_attrs)
-        else:
-            priority = h_fun(self, w_memory.initial_state, w_memory.goal)
+        h = self.make_heuristic(w_memory, h_fun, h_attrs)
 
-        open = [(priority, (w_memory.initial_state, []))]
+        root = SearchNode(w_memory.initial_state, h=h(w_memory.initial_state))
+        open = self._new_open_list(h, root, weight)
         current_node = w_memory.initial_state
-        closed = {w_memory.initial_state}
         visited_cnt = 0
-
-        rules = analyzer.bind_rules(w_memory.rules, current_node)
+        networks = {}
+        expanding = None
+        if restore is not None:
+            nodes = _unflatten_nodes(restore['nodes'])
+            open.restore([nodes[i] for i in restore['known']],
+                         [(nodes[i], node_priority) for i, node_priority in restore['open']])
+            closed = restore['closed']
+            visited_cnt = restore['visited_cnt']
+        else:
+            open.push(root, priority(root))
+        if checkpoint is not None:
+            checkpoint.track(lambda: _open_list_snapshot(open, closed, visited_cnt, expanding, priority))
 
         while open:
             if visited_cnt != 0 and visited_cnt % 100 == 0:
                 print "Search in progress, visited nodes counter: %s" % visited_cnt
-            prev_node = current_node
-            current_node, path = heapq.heappop(open)[-1]
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save()
+            if budget is not None and budget.expired(visited_cnt):
+                break
+            node = open.pop()
+            current_node = node.state
             if current_node == w_memory.goal:
-                return current_node, path, visited_cnt
+                return current_node, node.path(), visited_cnt
+            if closed is not None:
+                open.forget(current_node)
+                if current_node in closed:
+                    continue
             visited_cnt += 1
-            if len(path) >= max_depth:
-                continue
+            if node.depth < max_depth:
+                expanding = node
+                for rule_to_fire, new_node in self._expand(w_memory, networks, agenda, node):
+                    if closed is not None and new_node in closed:
+                        continue
+                    known = open.get(new_node)
+                    if known is None:
+                        child = SearchNode(new_node, node, rule_to_fire,
+                                           h.update(node.state, node.h, rule_to_fire, new_node))
+                    elif known.g > node.g + 1:
+                        child = SearchNode(new_node, node, rule_to_fire, known.h)
+                    else:
+                        continue
+                    open.push(child, priority(child))
+                expanding = None
+            if closed is not None:
+                closed.add(current_node)
+                node.state = None
 
-            if current_node.get_facts_names() != prev_node.get_facts_names():
-                rules = analyzer.bind_rules(w_memory.rules, current_node)
+        return current_node, None, visited_cnt
 
-            for rule in rules:
-                rule = analyzer.evaluate_values(rule, current_node)
-                if rule.antecedent(current_node):
-                    agenda.push(rule)
-            while not agenda.is_empty():
-                rule_to_fire = agenda.pop()
-                new_node = rule_to_fire.consequent(current_node)
-                if new_node not in closed:
-                    closed.add(new_node)
-                    if h_attrs:
-                        priority = len(path) + h_fun(self, current_node, w_memory.goal, h_attrs)
-                    else:
-                        priority = len(path) + h_fun(self, current_node, w_memory.goal)
-                    heapq.heappush(open, (priority, (new_node, path+[rule_to_fire])))
+    def beam_search(self, w_memory, max_depth, h_fun=None, h_attrs=None, width=BEAM_WIDTH, budget=None):
+        agenda = Agenda()
+        h = self.make_heuristic(w_memory, h_fun, h_attrs)
+        layer = [SearchNode(w_memory.initial_state, h=h(w_memory.initial_state))]
+        closed = {w_memory.initial_state}
+        current_node = w_memory.initial_state
+        visited_cnt = 0
+        networks = {}
+
+        while layer:
+            candidates = {}
+            for node in layer:
+                if visited_cnt != 0 and visited_cnt % 100 == 0:
+                    print "Search in progress, visited nodes counter: %s" % visited_cnt
+                if budget is not None and budget.expired(visited_cnt):
+                    return current_node, None, visited_cnt
+                current_node = node.state
+                if current_node == w_memory.goal:
+                    return current_node, node.path(), visited_cnt
+                visited_cnt += 1
+                if node.depth >= max_depth:
+                    continue
+
+                for rule_to_fire, new_node in self._expand(w_memory, networks, agenda, node):
+                    if new_node not in closed and new_node not in candidates:
+                        candidates[new_node] = SearchNode(new_node, node, rule_to_fire,
+                                                          h.update(node.state, node.h, rule_to_fire, new_node))
+            layer = heapq.nsmallest(width, candidates.itervalues(), key=lambda node: node.h)
+            closed.update(node.state for node in layer)
 
         return current_node, None, visited_cnt
 
-    def best_first_search(self, w_memory, max_depth, h_fun=None, h_attrs=None):
+    def anytime_weighted_a_star_search(self, w_memory, max_depth, h_fun=None, h_attrs=None,
+                                       weight=DEFAULT_WEIGHT, budget=None):
         agenda = Agenda()
-        if h_attrs:
-            priority = h_fun(self, w_memory.initial_state, w_memory.goal, h_attrs)
-        else:
-            priority = h_fun(self, w_memory.initial_state, w_memory.goal)
+        h = self.make_heuristic(w_memory, h_fun, h_attrs)
+        priority = lambda node: node.g + weight*node.h
 
-        open = [(priority, (w_memory.initial_state, []))]
+        root = SearchNode(w_memory.initial_state, h=h(w_memory.initial_state))
+        open = self._new_open_list(h, root, weight)
+        open.push(root, priority(root))
+        incumbent = None
         current_node = w_memory.initial_state
-        closed = {w_memory.initial_state}
         visited_cnt = 0
-
-        rules = analyzer.bind_rules(w_memory.rules, current_node)
+        networks = {}
 
         while open:
             if visited_cnt != 0 and visited_cnt % 100 == 0:
                 print "Search in progress, visited nodes counter: %s" % visited_cnt
-            prev_node = current_node
-            current_node, path = heapq.heappop(open)[-1]
+            if budget is not None and budget.expired(visited_cnt):
+                break
+            node = open.pop()
+            if incumbent is not None and node.g + node.h >= incumbent.g:
+                continue
+            current_node = node.state
             if current_node == w_memory.goal:
-                return current_node, path, visited_cnt
+                incumbent = node
+                print "Solution found: cost %s, visited nodes counter: %s" % (node.g, visited_cnt)
+                continue
             visited_cnt += 1
-            if len(path) >= max_depth:
+            if node.depth >= max_depth:
                 continue
 
-            if current_node.get_facts_names() != prev_node.get_facts_names():
-                rules = analyzer.bind_rules(w_memory.rules, current_node)
-
-            for rule in rules:
-                rule = analyzer.evaluate_values(rule, current_node)
-                if rule.antecedent(current_node):
-                    agenda.push(rule)
-            while not agenda.is_empty():
-                rule_to_fire = agenda.pop()
-                new_node = rule_to_fire.consequent(current_node)
-                if new_node not in closed:
-                    closed.add(new_node)
-                    if h_attrs:
-                        priority = h_fun(self, current_node, w_memory.goal, h_attrs)
-                    else:
-                        priority = h_fun(self, current_node, w_memory.goal)
-                    heapq.heappush(open, (priority, (new_node, path+[rule_to_fire])))
+            for rule_to_fire, new_node in self._expand(w_memory, networks, agenda, node):
+                known = open.get(new_node)
+                if known is None:
+                    child = SearchNode(new_node, node, rule_to_fire,
+                                       h.update(node.state, node.h, rule_to_fire, new_node))
+                elif known.g > node.g + 1:
+                    child = SearchNode(new_node, node, rule_to_fire, known.h)
+                else:
+                    continue
+                if incumbent is None or child.g + child.h < incumbent.g:
+                    open.push(child, priority(child))
+
+        bounds = [node.g + node.h for node, node_priority in open.entries()]
+        if incumbent is not None:
+            bounds.append(incumbent.g)
+        if budget is not None and bounds:
+            budget.record(incumbent.g if incumbent is not None else None, min(bounds))
+        if incumbent is None:
+            return current_node, None, visited_cnt
+        return incumbent.state, incumbent.path(), visited_cnt
+
+    def _new_open_list(self, h, root, weight=1):
+        if self.open_list is not None:
+            return self.open_list()
+        return openlist.new_open_list(h.integral and openlist.is_integral(root.h) and openlist.is_integral(weight))
+
+    def iterative_deepening_search(self, w_memory, max_depth, budget=None):
+        return self._iterative_deepening(w_memory, max_depth, heuristic.Heuristic(), budget)
+
+    def ida_star_search(self, w_memory, max_depth, h_fun=None, h_attrs=None, budget=None):
+        return self._iterative_deepening(w_memory, max_depth, self.make_heuristic(w_memory, h_fun, h_attrs), budget)
+
+    def _iterative_deepening(self, w_memory, max_depth, h, budget=None):
+        agenda = Agenda()
+        networks = {}
+        root = SearchNode(w_memory.initial_state, h=h(w_memory.initial_state))
+        bound = root.h
+        visited_cnt = 0
+        iteration = 0
+
+        while bound is not None:
+            iteration += 1
+            goal_node, iteration_cnt, bound = self._bounded_depth_first(w_memory, networks, agenda, root,
+                                                                        bound, max_depth, h, budget, visited_cnt)
+            visited_cnt += iteration_cnt
+            print "Iteration %s: visited nodes %s (total %s)" % (iteration, iteration_cnt, visited_cnt)
+            if goal_node:
+                return goal_node.state, goal_node.path(), visited_cnt
+
+        return w_memory.initial_state, None, visited_cnt
+
+    def _bounded_depth_first(self, w_memory, networks, agenda, root, bound, max_depth, h, budget=None,
+                             previous_cnt=0):
+        stack = [(root, None)]
+        on_path = {root.state}
+        next_bound = None
+        visited_cnt = 0
 
-        return current_node, None, visited_cnt
+        while stack:
+            node, successors = stack[-1]
+            if successors is None:
+                if node.state == w_memory.goal:
+                    return node, visited_cnt, None
+                if budget is not None and budget.expired(previous_cnt + visited_cnt):
+                    return None, visited_cnt, None
+                visited_cnt += 1
+                if visited_cnt % 100 == 0:
+                    print "Search in progress, visited nodes counter: %s" % visited_cnt
+                if node.depth >= max_depth:
+                    stack.pop()
+                    on_path.discard(node.state)
+                    continue
+                successors = iter(self._expand(w_memory, networks, agenda, node))
+                stack[-1] = (node, successors)
+
+            for rule, new_node in successors:
+                if new_node in on_path:
+                    continue
+                child = SearchNode(new_node, node, rule, h.update(node.state, node.h, rule, new_node))
+                f = child.g + child.h
+                if f > bound:
+                    if next_bound is None or f < next_bound:
+                        next_bound = f
+                    continue
+                stack.append((child, None))
+                on_path.add(new_node)
+                break
+            else:
+                stack.pop()
+                on_path.discard(node.state)
+
+        return None, visited_cnt, next_bound
+
+    def backward_chaining_search(self, w_memory, max_depth, budget=None):
+        return backward.backward_chaining_search(self, w_memory, max_depth, budget)
+
+    def _expand(self, w_memory, networks, agenda, node):
+        network, node.conflict_set = self._match(w_memory, networks, node)
+        for rule in network.activations(node.state, node.conflict_set):
+            agenda.push(rule)
+        successors = []
+        while not agenda.is_empty():
+            rule = agenda.pop()
+            successors.append((rule, rule.consequent(node.state)))
+        return successors
+
+    def _match(self, w_memory, networks, node):
+        facts_names = node.state.get_facts_names()
+        try:
+            network = networks[facts_names]
+        except KeyError:
+            network = w_memory.network(node.state, self.compiled)
+            networks[facts_names] = network
+        if node.parent is None or node.parent.conflict_set is None:
+            return network, network.match(node.state)
+        return network, network.rematch(node.state, node.parent.conflict_set, node.rule)
+
+    def make_heuristic(self, w_memory, h_fun, h_attrs=None):
+        if h_fun is None:
+            return heuristic.Heuristic()
+        if h_fun == Engine.h_hamming_distance:
+            return heuristic.HammingDistance(w_memory.goal)
+        if h_fun == Engine.h_manhattan_distance:
+            return heuristic.ManhattanDistance(w_memory.goal, h_attrs)
+        if h_fun == Engine.h_linear_conflict:
+            return heuristic.LinearConflict(w_memory.goal, h_attrs)
+        return heuristic.FunctionHeuristic(self, h_fun, h_attrs, w_memory.goal, h_fun == Engine.h_pattern_database)
 
     def h_hamming_distance(self, node, goal):
-        distance = 0
-        for fact in node:
-            if fact != goal[fact.name]:
-                distance += 1
-        return distance
+        return heuristic.HammingDistance(goal)(node)
+
+    def h_pattern_database(self, node, goal, h_attrs):
+        return h_attrs(node)
 
     def h_manhattan_distance(self, node, goal, h_attrs):
-        value, x, y = h_attrs
-        distance = 0
-        for fact in node:
-            for goal_fact in goal:
-                if fact[value] == goal_fact[value]:
-                    distance = distance + abs(fact[x]-goal_fact[x]) + abs(fact[y]-goal_fact[y])
-        return distance
+        return heuristic.ManhattanDistance(goal, h_attrs)(node)
 
     def h_linear_conflict(self, node, goal, h_attrs):
-        value, x, y = h_attrs
-        conflicts = 0
-        rows = {}
-        for fact in node:
-            for goal_fact in goal:
-                if fact[value] == goal_fact[value]:
-                    if fact[x] == goal_fact[x] and fact[y] != goal_fact[y]:
-                        try:
-                            row = rows[fact[x]]
-                        except KeyError:
-                            row = {}
-                            rows[fact[x]] = row
-                        offset = abs(fact[y]-goal_fact[y])
-                        try:
-                            row[offset] += 1
-                        except KeyError:
-                            row[offset] = 1
-        for i in rows:
-            row = rows[i]
-            for offset in row:
-                if row[offset] == 2:
-                    conflicts += 1
-        return self.h_manhattan_distance(node, goal, h_attrs) + conflicts*2
\ No newline at end of file
+        return heuristic.LinearConflict(goal, h_attrs)(node)
+
+
+WEIGHTED_SEARCHES = (Engine.weighted_a_star_search, Engine.anytime_weighted_a_star_search)
+
+
+def _flatten_nodes(nodes):
+    table = []
+    index = {}
+    for node in nodes:
+        chain = []
+        while node is not None and id(node) not in index:
+            chain.append(node)
+            node = node.parent
+        for chained in reversed(chain):
+            parent = index[id(chained.parent)] if chained.parent is not None else -1
+            index[id(chained)] = len(table)
+            table.append((chained.state, parent, chained.rule, chained.h))
+    return table, index
+
+
+def _unflatten_nodes(table):
+    nodes = []
+    for state, parent, rule, h in table:
+        nodes.append(SearchNode(state, nodes[parent] if parent >= 0 else None, rule, h))
+    return nodes
+
+
+def _frontier_snapshot(open, closed, visited_cnt, expanding=None):
+    nodes = list(open)
+    if expanding is not None:
+        nodes.insert(0, expanding)
+        visited_cnt -= 1
+    table, index = _flatten_nodes(nodes)
+    return {'nodes': table,
+            'open': [index[id(node)] for node in nodes],
+            'closed': closed,
+            'visited_cnt': visited_cnt}
+
+
+def _open_list_snapshot(open, closed, visited_cnt, expanding=None, priority_of=None):
+    known = open.known()
+    entries = open.entries()
+    if expanding is not None:
+        known.append(expanding)
+        entries.append((expanding, priority_of(expanding)))
+        visited_cnt -= 1
+    table, index = _flatten_nodes(known + [node for node, priority in entries])
+    return {'nodes': table,
+            'known': [index[id(node)] for node in known],
+            'open': [(index[id(node)], priority) for node, priority in entries],
+            'closed': closed,
+            'visited_cnt': visited_cnt}
+
+
+def _final_checkpoint(checkpointer):
+    if checkpointer is None or not checkpointer.tracking():
+        return
+    try:
+        checkpointer.save()
+    except checkpoint.CheckpointError as error:
+        print error
+
+
+def _print_outcome(w_memory, arrival_state, rules_applied, visited_cnt, time_elapsed_str):
+    if rules_applied:
+        penetrance = len(rules_applied)/visited_cnt
+        print "Initial state:\n%s\n" % w_memory.initial_state
+        print "Rule applied:\n\n%s\n" % '\n\n'.join(map(str, rules_applied))
+        print "Arrival state:\n%s" % arrival_state
+        print "\nSUCCESS\nPath length: %s\nPenetrance: %s\nVisited nodes count: %s\nTime elapsed: %s" % \
+                (len(rules_applied), str(penetrance), str(visited_cnt), time_elapsed_str)
+    else:
+        print "Initial state:\n%s\n" % w_memory.initial_state
+        print "Arrival state:\n%s" % arrival_state
+        print "\nFAILURE\nVisited nodes count: %s\nTime elapsed: %s" % (visited_cnt, time_elapsed_str)
+
+
+def _strategy_name(strategy):
+    search_fun, max_depth, h_fun, h_attrs = strategy
+    if h_fun:
+        return "%s (%s, max depth %s)" % (search_fun.__name__, h_fun.__name__, max_depth)
+    return "%s (max depth %s)" % (search_fun.__name__, max_depth)
+
+
+def _elapsed_str(start_time):
+    sec_elapsed = int(time.time()-start_time)
+    if sec_elapsed > 60:
+        min_elapsed = sec_elapsed//60
+        sec_elapsed %= 60
+        return "%s minutes, %s seconds" % (min_elapsed, sec_elapsed)
+    return "%s seconds" % sec_elapsed
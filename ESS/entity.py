@@ -2,14 +2,42 @@ import copy
 import re
 
 ARITHMETIC_OP_REX = re.compile(r'[\\+*-/]')
+ZOBRIST_MASK = (1 << 64) - 1
+ZOBRIST_CACHE_SIZE = 1 << 20
+SYMBOL_TABLE_SIZE = 1 << 16
+_zobrist_keys = {}
+
+
+def zobrist_key(*item):
+    try:
+        return _zobrist_keys[item]
+    except KeyError:
+        h = mix64(hash(item))
+        if len(_zobrist_keys) >= ZOBRIST_CACHE_SIZE:
+            _zobrist_keys.clear()
+        _zobrist_keys[item] = h
+        return h
+
+
+def clear_caches():
+    _zobrist_keys.clear()
+    SYMBOLS.clear()
+
+
+def mix64(h):
+    h &= ZOBRIST_MASK
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & ZOBRIST_MASK
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & ZOBRIST_MASK
+    return h ^ (h >> 31)
 
 
 class Rule(object):
 
-    def __init__(self, name, antecedent, consequent):
+    def __init__(self, name, antecedent, consequent, salience=0):
         self.name = name
         self.antecedent = antecedent
         self.consequent = consequent
+        self.salience = salience
 
     def __str__(self):
         return "[Rule: %s]\nAntecedent:\n%s\nConsequent:\n%s" % (self.name, self.antecedent, self.consequent)
@@ -26,12 +54,12 @@ class Rule(object):
     def __deepcopy__(self, memo):
         new_antecedent = copy.deepcopy(self.antecedent, memo)
         new_consequent = copy.deepcopy(self.consequent, memo)
-        new_rule = Rule(self.name, new_antecedent, new_consequent)
+        new_rule = Rule(self.name, new_antecedent, new_consequent, self.salience)
         memo[id(self)] = new_rule
         return new_rule
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Rule(self.name, self.antecedent, self.consequent, self.salience)
 
     def is_binded(self):
         return self.antecedent.is_binded() and self.consequent.is_binded()
@@ -77,7 +105,7 @@ class Antecedent(object):
         return new_antecedent
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Antecedent(list(self.disjunctions))
 
     def is_binded(self):
         for disjunction in self.disjunctions:
@@ -124,7 +152,7 @@ class Disjunction(object):
         return new_disjunction
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Disjunction(list(self.conditions))
 
     def is_binded(self):
         for condition in self.conditions:
@@ -151,6 +179,7 @@ class Consequent(object):
         new_facts = facts.copy()
         for conclusion in self.conclusions:
             conclusion(new_facts)
+        new_facts.freeze()
         return new_facts
 
     def __hash__(self):
@@ -168,7 +197,7 @@ class Consequent(object):
         return new_consequent
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Consequent(list(self.conclusions))
 
     def is_binded(self):
         for conclusion in self.conclusions:
@@ -185,10 +214,12 @@ class Consequent(object):
 
 class Conclusion(object):
 
+    __slots__ = ('action', 'fact_name', 'arg_list')
+
     def __init__(self, action, fact_name, *arg_list):
         self.action = action
-        self.fact_name = fact_name
-        self.arg_list = list(arg_list)
+        self.fact_name = SYMBOLS.symbol(fact_name)
+        self.arg_list = [SYMBOLS.symbol(arg_list[0])] + list(arg_list[1:]) if arg_list else []
 
     def __str__(self):
         action_name = re.sub('actn_', '', self.action.func_name)
@@ -218,7 +249,7 @@ class Conclusion(object):
         return new_conclusion
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Conclusion(self.action, self.fact_name, *self.arg_list)
 
     def is_binded(self):
         if len(self.arg_list) == 2:
@@ -238,10 +269,12 @@ class Conclusion(object):
 
 class Condition(object):
 
+    __slots__ = ('predicate', 'fact_name', 'test_attr', 'value')
+
     def __init__(self, predicate, fact_name, test_attr, value):
         self.predicate = predicate
-        self.fact_name = fact_name
-        self.test_attr = test_attr
+        self.fact_name = SYMBOLS.symbol(fact_name)
+        self.test_attr = SYMBOLS.symbol(test_attr)
         self.value = value
 
     def __str__(self):
@@ -267,7 +300,7 @@ class Condition(object):
         return new_condition
 
     def copy(self):
-        return copy.deepcopy(self)
+        return Condition(self.predicate, self.fact_name, self.test_attr, self.value)
 
     def is_binded(self):
         if isinstance(self.value, str) and self.value.startswith('?'):
@@ -283,37 +316,140 @@ class Condition(object):
 
 class Fact(object):
 
+    __slots__ = ('name', '_schema', '_values', '_hash')
+
     def __init__(self, name):
-        self.name = name
-        self._attrs = {}
+        self.name = SYMBOLS.symbol(name)
+        self._schema = SYMBOLS.schema(())
+        self._values = ()
+        self._hash = zobrist_key(self.name)
 
     def __getitem__(self, attr):
-        return self._attrs.get(attr, None)
+        try:
+            return self._values[self._schema.index[attr]]
+        except KeyError:
+            return None
 
     def __setitem__(self, attr, value):
-        self._attrs[attr] = value
+        try:
+            i = self._schema.index[attr]
+        except KeyError:
+            self._schema = self._schema.extend(attr)
+            self._values += (value,)
+        else:
+            self._hash ^= zobrist_key(self.name, attr, self._values[i])
+            self._values = self._values[:i] + (value,) + self._values[i+1:]
+        self._hash ^= zobrist_key(self.name, attr, value)
 
     def __delitem__(self, attr):
-        del self._attrs[attr]
+        i = self._schema.index[attr]
+        self._hash ^= zobrist_key(self.name, attr, self._values[i])
+        self._schema = self._schema.reduce(attr)
+        self._values = self._values[:i] + self._values[i+1:]
 
     def __contains__(self, attr):
-        return attr in self._attrs
+        return attr in self._schema.index
+
+    def items(self):
+        return zip(self._schema.names, self._values)
 
     def __str__(self):
-        return self.name + str(self._attrs)
+        return self.name + str(dict(self.items()))
 
     def __hash__(self):
-        return hash( (self.name, frozenset(self._attrs.items())) )
+        return self._hash
 
     def __eq__(self, other):
-        name_check = self.name == other.name
-        return name_check and self._attrs == other._attrs
+        if self.name != other.name:
+            return False
+        if self._schema is other._schema:
+            return self._values == other._values
+        return dict(self.items()) == dict(other.items())
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        return self.name, self._schema.names, self._values, self._hash
+
+    def __setstate__(self, state):
+        name, names, self._values, self._hash = state
+        self.name = SYMBOLS.symbol(name)
+        self._schema = SYMBOLS.schema(names)
+
     def __deepcopy__(self, memo):
-        new_fact = Fact(self.name)
-        new_fact._attrs = self._attrs.copy()
+        new_fact = self.copy()
         memo[id(self)] = new_fact
-        return new_fact
\ No newline at end of file
+        return new_fact
+
+    def copy(self):
+        new_fact = Fact.__new__(Fact)
+        new_fact.name = self.name
+        new_fact._schema = self._schema
+        new_fact._values = self._values
+        new_fact._hash = self._hash
+        return new_fact
+
+
+class Schema(object):
+
+    __slots__ = ('names', 'index', 'frozen', '_extensions')
+
+    def __init__(self, names):
+        self.names = names
+        self.index = dict((name, i) for i, name in enumerate(names))
+        self.frozen = frozenset(names)
+        self._extensions = {}
+
+    def extend(self, name):
+        try:
+            return self._extensions[name]
+        except KeyError:
+            schema = SYMBOLS.schema(self.names + (name,))
+            self._extensions[name] = schema
+            return schema
+
+    def reduce(self, name):
+        i = self.index[name]
+        return SYMBOLS.schema(self.names[:i] + self.names[i+1:])
+
+
+class SymbolTable(object):
+
+    def __init__(self, capacity=SYMBOL_TABLE_SIZE):
+        self.capacity = capacity
+        self._symbols = {}
+        self._schemas = {}
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def symbol(self, name):
+        if not isinstance(name, basestring):
+            return name
+        try:
+            return self._symbols[name]
+        except KeyError:
+            name = intern(name) if isinstance(name, str) else name
+            if len(self._symbols) >= self.capacity:
+                self._symbols.clear()
+            self._symbols[name] = name
+            return name
+
+    def schema(self, names):
+        try:
+            return self._schemas[names]
+        except KeyError:
+            names = tuple(self.symbol(name) for name in names)
+            schema = Schema(names)
+            if len(self._schemas) >= self.capacity:
+                self._schemas.clear()
+            self._schemas[names] = schema
+            return schema
+
+    def clear(self):
+        self._symbols.clear()
+        self._schemas.clear()
+
+
+SYMBOLS = SymbolTable()
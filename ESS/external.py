@@ -0,0 +1,210 @@
+import heapq
+import marshal
+import os
+import shutil
+import tempfile
+from ESS import container
+from ESS import entity
+
+MEMORY_BUDGET = 64 << 20
+RECORD_OVERHEAD = 128
+MERGE_FANIN = 64
+
+
+class ExternalSearchError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+def external_breadth_first_search(engine, w_memory, max_depth, memory_budget=None, scratch_dir=None, budget=None):
+    try:
+        directory = tempfile.mkdtemp(prefix='ess-bfs-', dir=scratch_dir)
+    except OSError as error:
+        raise ExternalSearchError("Cannot create scratch directory: %s" % error)
+    try:
+        search = _ExternalSearch(engine, w_memory, max_depth, memory_budget or MEMORY_BUDGET, directory, budget)
+        return search.run()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class _ExternalSearch(object):
+
+    def __init__(self, engine, w_memory, max_depth, memory_budget, directory, budget=None):
+        self.engine = engine
+        self.w_memory = w_memory
+        self.max_depth = max_depth
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.budget = budget
+        self.layers = []
+        self.networks = {}
+        self.visited_cnt = 0
+        self._runs_cnt = 0
+
+    def run(self):
+        state = self.w_memory.initial_state
+        self.layers.append(self._path('layer-0'))
+        write_records(self.layers[0], [(encode(state), -1)])
+
+        while True:
+            depth = len(self.layers) - 1
+            runs = []
+            buffer = []
+            buffered = 0
+            for index, (blob, parent) in enumerate(read_records(self.layers[depth])):
+                state = decode(blob)
+                if state == self.w_memory.goal:
+                    return state, self._rebuild_path(depth, index), self.visited_cnt
+                if self.budget is not None and self.budget.expired(self.visited_cnt):
+                    return state, None, self.visited_cnt
+                self.visited_cnt += 1
+                if self.visited_cnt % 100 == 0:
+                    print "Search in progress, visited nodes counter: %s" % self.visited_cnt
+                if depth >= self.max_depth:
+                    continue
+                for rule, new_state in self._successors(state):
+                    new_blob = encode(new_state)
+                    buffer.append((new_blob, index))
+                    buffered += len(new_blob) + RECORD_OVERHEAD
+                if buffered >= self.memory_budget:
+                    runs.append(self._write_run(buffer))
+                    buffer = []
+                    buffered = 0
+            if buffer:
+                runs.append(self._write_run(buffer))
+            if not runs:
+                return state, None, self.visited_cnt
+
+            layer = self._path('layer-%s' % (depth+1))
+            count = self._merge_layer(runs, layer)
+            print "Layer %s: %s new states" % (depth+1, count)
+            if not count:
+                os.remove(layer)
+                return state, None, self.visited_cnt
+            self.layers.append(layer)
+
+    def _successors(self, state):
+        facts_names = state.get_facts_names()
+        try:
+            network = self.networks[facts_names]
+        except KeyError:
+            network = self.w_memory.network(state, self.engine.compiled)
+            self.networks[facts_names] = network
+        return network.successors(state)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_run(self, buffer):
+        buffer.sort()
+        self._runs_cnt += 1
+        run = self._path('run-%s' % self._runs_cnt)
+        write_records(run, unique(buffer))
+        return run
+
+    def _merge_layer(self, runs, layer):
+        while len(runs) > MERGE_FANIN:
+            merged = []
+            for i in xrange(0, len(runs), MERGE_FANIN):
+                group = runs[i:i+MERGE_FANIN]
+                self._runs_cnt += 1
+                run = self._path('run-%s' % self._runs_cnt)
+                write_records(run, unique(heapq.merge(*[read_records(path) for path in group])))
+                for path in group:
+                    os.remove(path)
+                merged.append(run)
+            runs = merged
+
+        previous = [read_records(path) for path in self.layers]
+        heads = [next(records, None) for records in previous]
+        count = 0
+        with open(layer, 'wb') as out:
+            for blob, parent in unique(heapq.merge(*[read_records(path) for path in runs])):
+                duplicate = False
+                for i, records in enumerate(previous):
+                    head = heads[i]
+                    while head is not None and head[0] < blob:
+                        head = next(records, None)
+                    heads[i] = head
+                    if head is not None and head[0] == blob:
+                        duplicate = True
+                if not duplicate:
+                    marshal.dump((blob, parent), out, 0)
+                    count += 1
+        for path in runs:
+            os.remove(path)
+        return count
+
+    def _rebuild_path(self, depth, index):
+        states = []
+        for layer in reversed(self.layers[:depth+1]):
+            blob, index = record_at(layer, index)
+            states.append(decode(blob))
+        states.reverse()
+
+        rules = []
+        for state, next_state in zip(states, states[1:]):
+            for rule, new_state in self._successors(state):
+                if new_state == next_state:
+                    rules.append(rule)
+                    break
+            else:
+                raise ExternalSearchError("Broken parent record at depth %s" % len(rules))
+        return rules
+
+
+def encode(state):
+    facts = ((fact.name, tuple(sorted((attr, _number(value)) for attr, value in fact.items()))) for fact in state)
+    return marshal.dumps(tuple(sorted(facts)), 0)
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() or isinstance(value, long):
+        return int(value)
+    return value
+
+
+def decode(blob):
+    state = container.FactContainer()
+    for name, items in marshal.loads(blob):
+        fact = entity.Fact(name)
+        for attr, value in items:
+            fact[attr] = value
+        state.add(fact)
+    state.freeze()
+    return state
+
+
+def unique(records):
+    last = None
+    for blob, parent in records:
+        if blob != last:
+            last = blob
+            yield blob, parent
+
+
+def write_records(path, records):
+    with open(path, 'wb') as out:
+        for record in records:
+            marshal.dump(record, out, 0)
+
+
+def read_records(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield marshal.load(f)
+            except EOFError:
+                return
+
+
+def record_at(path, index):
+    for i, record in enumerate(read_records(path)):
+        if i == index:
+            return record
+    raise ExternalSearchError("Missing record %s in %s" % (index, os.path.basename(path)))
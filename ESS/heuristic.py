@@ -0,0 +1,129 @@
+from ESS import operation
+from ESS import openlist
+
+STRUCTURAL_ACTIONS = (operation.actn_assert, operation.actn_retract)
+
+
+class Heuristic(object):
+
+    integral = True
+
+    def __call__(self, state):
+        return 0
+
+    def update(self, parent, parent_h, rule, state):
+        return self(state)
+
+
+class FunctionHeuristic(Heuristic):
+
+    def __init__(self, engine, h_fun, h_attrs, goal, integral=False):
+        self.engine = engine
+        self.h_fun = h_fun
+        self.h_attrs = h_attrs
+        self.goal = goal
+        self.integral = integral
+
+    def __call__(self, state):
+        if self.h_attrs:
+            return self.h_fun(self.engine, state, self.goal, self.h_attrs)
+        return self.h_fun(self.engine, state, self.goal)
+
+
+class _FactwiseHeuristic(Heuristic):
+
+    def __call__(self, state):
+        h = 0
+        for fact in state:
+            h += self._term(fact)
+        return h
+
+    def update(self, parent, parent_h, rule, state):
+        changed = _changed_facts(rule)
+        if changed is None:
+            return self(state)
+        h = parent_h
+        for fact_name in changed:
+            h += self._term(state[fact_name]) - self._term(parent[fact_name])
+        return h
+
+
+class HammingDistance(_FactwiseHeuristic):
+
+    def __init__(self, goal):
+        self.goal = goal
+
+    def _term(self, fact):
+        if fact != self.goal[fact.name]:
+            return 1
+        return 0
+
+
+class ManhattanDistance(_FactwiseHeuristic):
+
+    def __init__(self, goal, h_attrs):
+        self.value, self.x, self.y = h_attrs
+        self.goal_index = goal_index(goal, h_attrs)
+        self.integral = all(openlist.is_integral(coordinate) for positions in self.goal_index.itervalues()
+                            for position in positions for coordinate in position)
+
+    def _term(self, fact):
+        distance = 0
+        for goal_x, goal_y in self.goal_index.get(fact[self.value], ()):
+            distance += abs(fact[self.x]-goal_x) + abs(fact[self.y]-goal_y)
+        return distance
+
+
+class LinearConflict(ManhattanDistance):
+
+    def __call__(self, state):
+        return ManhattanDistance.__call__(self, state) + self._conflicts(state)*2
+
+    def update(self, parent, parent_h, rule, state):
+        if _changed_facts(rule) is None:
+            return self(state)
+        manhattan = parent_h - self._conflicts(parent)*2
+        manhattan = ManhattanDistance.update(self, parent, manhattan, rule, state)
+        return manhattan + self._conflicts(state)*2
+
+    def _conflicts(self, state):
+        rows = {}
+        for fact in state:
+            for goal_x, goal_y in self.goal_index.get(fact[self.value], ()):
+                if fact[self.x] == goal_x and fact[self.y] != goal_y:
+                    try:
+                        row = rows[goal_x]
+                    except KeyError:
+                        row = {}
+                        rows[goal_x] = row
+                    offset = abs(fact[self.y]-goal_y)
+                    try:
+                        row[offset] += 1
+                    except KeyError:
+                        row[offset] = 1
+        conflicts = 0
+        for row in rows.itervalues():
+            for count in row.itervalues():
+                if count == 2:
+                    conflicts += 1
+        return conflicts
+
+
+def goal_index(goal, h_attrs):
+    value, x, y = h_attrs
+    index = {}
+    for goal_fact in goal:
+        try:
+            index[goal_fact[value]].append((goal_fact[x], goal_fact[y]))
+        except KeyError:
+            index[goal_fact[value]] = [(goal_fact[x], goal_fact[y])]
+    return index
+
+
+def _changed_facts(rule):
+    changed = set()
+    for conclusion in rule.consequent.conclusions:
+        if conclusion.action in STRUCTURAL_ACTIONS:
+            return None
+        changed.add(conclusion.fact_name)
+    return changed
@@ -0,0 +1,109 @@
+from __future__ import division
+import argparse
+import threading
+import time
+from collections import Counter
+from ESS.client import DEFAULT_ADDRESS, Client, ClientError
+
+PERCENTILES = (50, 90, 99)
+
+
+class LoadGenerator(object):
+
+    def __init__(self, address, kb, strategy, clients=1, requests=100, timeout=None):
+        self.address = address
+        self.kb = kb
+        self.strategy = strategy
+        self.clients = clients
+        self.requests = requests
+        self.timeout = timeout
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._remaining = requests
+
+    def run(self):
+        threads = [threading.Thread(target=self._client) for _ in xrange(self.clients)]
+        start_time = time.time()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+        return time.time() - start_time
+
+    def report(self, elapsed):
+        l = ["Requests: %s in %.3f seconds, %s clients" % (len(self.latencies), elapsed, self.clients),
+             "Throughput: %.2f requests/second" % (len(self.latencies) / elapsed if elapsed else 0)]
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            l.append("Latency: mean %.4f, %s, max %.4f seconds" %
+                     (sum(latencies) / len(latencies),
+                      ', '.join("p%s %.4f" % (p, percentile(latencies, p)) for p in PERCENTILES),
+                      latencies[-1]))
+        for status, count in sorted(self.statuses.iteritems()):
+            l.append("Status %s: %s" % (status, count))
+        for error, count in sorted(self.errors.iteritems()):
+            l.append("Error %s: %s" % (error, count))
+        return '\n'.join(l)
+
+    def _client(self):
+        try:
+            client = Client(self.address)
+        except ClientError as error:
+            with self._lock:
+                self.errors[str(error)] += 1
+            return
+        fields = {'kb': self.kb, 'strategy': self.strategy}
+        if self.timeout is not None:
+            fields['timeout'] = self.timeout
+        try:
+            while self._take():
+                start_time = time.time()
+                try:
+                    response = client.request('run', **fields)
+                except ClientError as error:
+                    with self._lock:
+                        self.errors[str(error)] += 1
+                    return
+                latency = time.time() - start_time
+                with self._lock:
+                    self.latencies.append(latency)
+                    self.statuses[response.get('status', 'rejected')] += 1
+                    if 'error' in response:
+                        self.errors[response['error']] += 1
+        finally:
+            client.close()
+
+    def _take(self):
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+            prog='loadgen.py',
+            description="Send run requests to an ESS server from concurrent clients and report latency.")
+    arg_parser.add_argument('kb', metavar='KB', help="name of a knowledge base loaded by the server")
+    arg_parser.add_argument('strategy', metavar='STRATEGY',
+                            help="SEARCH[:HEURISTIC[:ATTRS[:PATTERN]]][:MAX_DEPTH], as in run_Portfolio")
+    arg_parser.add_argument('--address', default=DEFAULT_ADDRESS, help="HOST:PORT or the path of a Unix socket")
+    arg_parser.add_argument('--clients', type=int, default=4, help="concurrent connections (default 4)")
+    arg_parser.add_argument('--requests', type=int, default=100, help="total run requests (default 100)")
+    arg_parser.add_argument('--timeout', type=float, metavar='SECONDS', help="time limit of each search")
+    args = arg_parser.parse_args(argv)
+    if args.clients < 1 or args.requests < 1:
+        arg_parser.error("clients and requests must be positive integers")
+
+    generator = LoadGenerator(args.address, args.kb, args.strategy, args.clients, args.requests, args.timeout)
+    print generator.report(generator.run())
+    return 0 if not generator.errors else 1
@@ -0,0 +1,149 @@
+import heapq
+import itertools
+
+
+class OpenListError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+class EmptyOpenListError(OpenListError):
+    def __str__(self):
+        return 'pop from empty open list'
+
+
+class OpenList(object):
+
+    def __init__(self):
+        self._best = {}
+
+    def __len__(self):
+        self._discard_stale()
+        return self._len()
+
+    def get(self, state):
+        return self._best.get(state, None)
+
+    def forget(self, state):
+        self._best.pop(state, None)
+
+    def known(self):
+        return self._best.values()
+
+    def entries(self):
+        return [(node, priority) for node, priority in self._entries() if self._best.get(node.state, None) is node]
+
+    def restore(self, known, entries):
+        self._best = dict((node.state, node) for node in known)
+        for node, priority in entries:
+            self._best[node.state] = node
+            self._push(node, priority)
+
+    def push(self, node, priority):
+        best = self._best.get(node.state, None)
+        if best is not None and best.g <= node.g:
+            return False
+        self._best[node.state] = node
+        self._push(node, priority)
+        return True
+
+    def pop(self):
+        self._discard_stale()
+        if not self._len():
+            raise EmptyOpenListError()
+        return self._pop()
+
+    def _discard_stale(self):
+        while self._len():
+            node = self._peek()
+            if self._best.get(node.state, None) is node:
+                return
+            self._pop()
+
+
+class BucketQueue(OpenList):
+
+    def __init__(self):
+        OpenList.__init__(self)
+        self._buckets = []
+        self._min = 0
+        self._size = 0
+
+    def _len(self):
+        return self._size
+
+    def _push(self, node, priority):
+        if not isinstance(priority, (int, long)) or priority < 0:
+            raise ValueError(priority)
+        while len(self._buckets) <= priority:
+            self._buckets.append({})
+        bucket = self._buckets[priority]
+        try:
+            bucket[node.h].append(node)
+        except KeyError:
+            bucket[node.h] = [node]
+        if not self._size or priority < self._min:
+            self._min = priority
+        self._size += 1
+
+    def _top(self):
+        while not self._buckets[self._min]:
+            self._min += 1
+        bucket = self._buckets[self._min]
+        return bucket, min(bucket)
+
+    def _entries(self):
+        for priority, bucket in enumerate(self._buckets):
+            for stack in bucket.itervalues():
+                for node in stack:
+                    yield node, priority
+
+    def _peek(self):
+        bucket, h = self._top()
+        return bucket[h][-1]
+
+    def _pop(self):
+        bucket, h = self._top()
+        stack = bucket[h]
+        node = stack.pop()
+        if not stack:
+            del bucket[h]
+        self._size -= 1
+        return node
+
+
+class HeapQueue(OpenList):
+
+    def __init__(self):
+        OpenList.__init__(self)
+        self._heap = []
+        self._counter = itertools.count()
+
+    def _len(self):
+        return len(self._heap)
+
+    def _push(self, node, priority):
+        heapq.heappush(self._heap, (priority, node.h, -next(self._counter), node))
+
+    def _entries(self):
+        for entry in self._heap:
+            yield entry[-1], entry[0]
+
+    def _peek(self):
+        return self._heap[0][-1]
+
+    def _pop(self):
+        return heapq.heappop(self._heap)[-1]
+
+
+def new_open_list(integral):
+    if integral:
+        return BucketQueue()
+    return HeapQueue()
+
+
+def is_integral(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
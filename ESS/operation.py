@@ -58,19 +58,16 @@ def actn_retract(facts, fact_name):
     facts.remove(fact_name)
 
 def actn_add(facts, fact_name, attr, value):
-    fact = facts[fact_name]
-    if attr in fact:
+    if attr in facts[fact_name]:
         raise AttrError(str(attr))
-    fact[attr] = value
+    facts.set_attribute(fact_name, attr, value)
 
 def actn_update(facts, fact_name, attr, value):
-    fact = facts[fact_name]
-    if attr not in fact:
+    if attr not in facts[fact_name]:
         raise AttrError(str(attr))
-    fact[attr] = value
+    facts.set_attribute(fact_name, attr, value)
 
 def actn_remove(facts, fact_name, attr):
-    fact = facts[fact_name]
-    if attr not in fact:
+    if attr not in facts[fact_name]:
         raise AttrError(str(attr))
-    del fact[attr]
\ No newline at end of file
+    facts.del_attribute(fact_name, attr)
\ No newline at end of file
@@ -0,0 +1,229 @@
+import multiprocessing
+import Queue
+import time
+import traceback
+from ESS import openlist
+
+FLUSH_INTERVAL = 32
+POLL_INTERVAL = 0.01
+PROGRESS_INTERVAL = 1.0
+
+
+class ParallelSearchError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class _WorkerNode(object):
+
+    __slots__ = ('state', 'g', 'h', 'parent', 'rule')
+
+    def __init__(self, state, g, h, parent, rule):
+        self.state = state
+        self.g = g
+        self.h = h
+        self.parent = parent
+        self.rule = rule
+
+
+def hda_star_search(engine, w_memory, max_depth, workers, h_fun=None, h_attrs=None, budget=None):
+    h = engine.make_heuristic(w_memory, h_fun, h_attrs)
+    root_h = h(w_memory.initial_state)
+    open_list_cls = engine.open_list or type(openlist.new_open_list(h.integral and openlist.is_integral(root_h)))
+    inboxes = [multiprocessing.Queue() for _ in xrange(workers)]
+    results = multiprocessing.Queue()
+    sent = multiprocessing.Array('l', workers+1)
+    received = multiprocessing.Array('l', workers)
+    idle = multiprocessing.Array('b', [1]*workers)
+    expanded = multiprocessing.Array('l', workers)
+    incumbent = multiprocessing.Array('l', [-1, -1, -1])
+
+    processes = []
+    for worker_id in xrange(workers):
+        process = multiprocessing.Process(target=_worker,
+                                          args=(engine, worker_id, w_memory, max_depth, h, open_list_cls,
+                                                inboxes, results, sent, received, idle, expanded, incumbent))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    try:
+        sent[workers] += 1
+        inboxes[owner(w_memory.initial_state, workers)].put(('nodes', [(w_memory.initial_state, 0, root_h, None, None)]))
+        _wait_termination(processes, results, sent, received, idle, expanded, budget)
+        visited_cnt = sum(expanded[:])
+
+        goal_cost, worker_id, index = incumbent[:]
+        if goal_cost < 0:
+            return w_memory.initial_state, None, visited_cnt
+        rules = []
+        arrival_state = None
+        while index is not None:
+            inboxes[worker_id].put(('trace', index))
+            state, parent, rule = _get_result(processes, results)
+            if arrival_state is None:
+                arrival_state = state
+            if parent is None:
+                break
+            rules.append(rule)
+            worker_id, index = parent
+        rules.reverse()
+        return arrival_state, rules, visited_cnt
+    finally:
+        for inbox in inboxes:
+            inbox.put(('stop',))
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+
+def owner(state, workers):
+    return hash(state) % workers
+
+
+def _wait_termination(processes, results, sent, received, idle, expanded, budget=None):
+    last_snapshot = None
+    last_progress = time.time()
+    while True:
+        if budget is not None and budget.expired(sum(expanded)):
+            return
+        try:
+            message = results.get(True, POLL_INTERVAL)
+        except Queue.Empty:
+            pass
+        else:
+            if message[0] == 'error':
+                raise ParallelSearchError(message[1])
+        for process in processes:
+            if not process.is_alive():
+                raise ParallelSearchError('worker %s died' % process.name)
+
+        if time.time() - last_progress >= PROGRESS_INTERVAL:
+            print "Search in progress, visited nodes counter: %s" % sum(expanded[:])
+            last_progress = time.time()
+
+        snapshot = (all(idle[:]), sum(received[:]), sum(sent[:]))
+        if snapshot[0] and snapshot[1] == snapshot[2]:
+            if snapshot == last_snapshot:
+                return
+            last_snapshot = snapshot
+        else:
+            last_snapshot = None
+
+
+def _get_result(processes, results):
+    while True:
+        try:
+            message = results.get(True, POLL_INTERVAL)
+        except Queue.Empty:
+            for process in processes:
+                if not process.is_alive():
+                    raise ParallelSearchError('worker %s died' % process.name)
+            continue
+        if message[0] == 'error':
+            raise ParallelSearchError(message[1])
+        return message[1:]
+
+
+def _worker(engine, worker_id, w_memory, max_depth, h, open_list_cls,
+            inboxes, results, sent, received, idle, expanded, incumbent):
+    try:
+        _work(engine, worker_id, w_memory, max_depth, h, open_list_cls,
+              inboxes, results, sent, received, idle, expanded, incumbent)
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
+def _work(engine, worker_id, w_memory, max_depth, h, open_list_cls,
+          inboxes, results, sent, received, idle, expanded, incumbent):
+    workers = len(inboxes)
+    inbox = inboxes[worker_id]
+    open = open_list_cls()
+    table = []
+    networks = {}
+    outboxes = [[] for _ in xrange(workers)]
+    expansions = 0
+
+    def receive(state, g, state_h, parent, rule):
+        known = open.get(state)
+        if known is None:
+            node = _WorkerNode(state, g, state_h, parent, rule)
+        elif known.g > g:
+            node = _WorkerNode(state, g, known.h, parent, rule)
+        else:
+            return
+        open.push(node, node.g + node.h)
+
+    def flush():
+        for destination, outbox in enumerate(outboxes):
+            if outbox:
+                sent[worker_id] += 1
+                inboxes[destination].put(('nodes', outbox))
+                outboxes[destination] = []
+
+    while True:
+        try:
+            if open:
+                message = inbox.get_nowait()
+            else:
+                message = inbox.get(True, POLL_INTERVAL)
+        except Queue.Empty:
+            message = None
+
+        if message is not None:
+            if message[0] == 'stop':
+                return
+            if message[0] == 'trace':
+                results.put(('trace',) + table[message[1]])
+                continue
+            idle[worker_id] = 0
+            received[worker_id] += 1
+            for state, g, state_h, parent, rule in message[1]:
+                receive(state, g, state_h, parent, rule)
+            continue
+
+        if not open:
+            flush()
+            idle[worker_id] = 1
+            continue
+
+        node = open.pop()
+        bound = incumbent[0]
+        if bound >= 0 and node.g + node.h >= bound:
+            continue
+        index = len(table)
+        table.append((node.state, node.parent, node.rule))
+        if node.state == w_memory.goal:
+            with incumbent.get_lock():
+                if incumbent[0] < 0 or node.g < incumbent[0]:
+                    incumbent[0], incumbent[1], incumbent[2] = node.g, worker_id, index
+            continue
+        expanded[worker_id] += 1
+        if node.g >= max_depth:
+            continue
+
+        for rule, new_state in _successors(w_memory, networks, node.state, engine.compiled):
+            destination = owner(new_state, workers)
+            new_h = h.update(node.state, node.h, rule, new_state)
+            if destination == worker_id:
+                receive(new_state, node.g+1, new_h, (worker_id, index), rule)
+            else:
+                outboxes[destination].append((new_state, node.g+1, new_h, (worker_id, index), rule))
+        expansions += 1
+        if expansions % FLUSH_INTERVAL == 0:
+            flush()
+
+
+def _successors(w_memory, networks, state, compiled):
+    facts_names = state.get_facts_names()
+    try:
+        network = networks[facts_names]
+    except KeyError:
+        network = w_memory.network(state, compiled)
+        networks[facts_names] = network
+    return network.successors(state)
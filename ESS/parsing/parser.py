@@ -14,8 +14,10 @@ def cast_trial(slice):
         return True
     if slice.capitalize() == 'False':
         return False
-    if slice.isdigit():
+    try:
         return int(slice)
+    except ValueError:
+        pass
     try:
         return float(slice)
     except ValueError:
@@ -117,6 +119,7 @@ class Parser(object):
                     if not current_rule_name:
                         raise UnnamedRuleError(line)
                     antecedent = entity.Antecedent()
+                    salience = 0
                     continue
                 if line == 'then':
                     raise UnexpectedAntecedentEndError(line)
@@ -131,6 +134,12 @@ class Parser(object):
                     self._status = self.CONSEQUENT
                     consequent = entity.Consequent()
                     continue
+                if line.startswith('salience=') and not antecedent.disjunctions:
+                    try:
+                        salience = int(line.split('=', 1)[1])
+                    except ValueError:
+                        raise RuleSyntaxError(line)
+                    continue
                 antecedent.disjunctions.append(self._parse_disjunction(line))
                 continue
 
@@ -138,7 +147,7 @@ class Parser(object):
                 if line == 'endRule':
                     if not consequent.conclusions:
                         raise EmptyConsequentError(line)
-                    rule = entity.Rule(current_rule_name, antecedent, consequent)
+                    rule = entity.Rule(current_rule_name, antecedent, consequent, salience)
                     rules.add(rule)
                     self._status = self.UNKNOWN
                     continue
@@ -190,6 +199,8 @@ class Parser(object):
         if len(arg_list) != len(fun_arg_list):
             raise BadArgumentsError(line)
         fact_name = arg_list.pop(0)
+        if len(arg_list) == 2:
+            arg_list[1] = cast_trial(arg_list[1])
         return entity.Conclusion(action, fact_name, *arg_list)
 
     def _parse_disjunction(self, line):
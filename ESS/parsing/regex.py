@@ -14,8 +14,8 @@ def _get_fun_name_list():
                  if function[0].startswith('actn') or function[0].startswith('pred')]
 
 
-CONDITION_CHECK = re.compile(r'(%s)\([?\w_]+,[\w_]+,(NIL|"[^"]*"|[\d.]+|(\?[\w_.]+->[\*+-/\w_.]+))+\)' %
+CONDITION_CHECK = re.compile(r'(%s)\([?\w_]+,[\w_]+,(NIL|"[^"]*"|-?[\d.]+|(\?[\w_.]+->[\*+-/\w_.]+))+\)' %
                                  '|'.join(_get_predicates_names()))
-ACTION_CHECK = re.compile(r'(%s)\([?\w_]+(,[\w_]+(,(NIL|"[^"]*"|[\d.]+|(\?[\w_.]+->[\*+-/\w_.]+)))?)?\)' %
+ACTION_CHECK = re.compile(r'(%s)\([?\w_]+(,[\w_]+(,(NIL|"[^"]*"|-?[\d.]+|(\?[\w_.]+->[\*+-/\w_.]+)))?)?\)' %
                               '|'.join(_get_actions_names()))
 STRING_CHECK = re.compile(r'"[^"]*"')
\ No newline at end of file
@@ -0,0 +1,204 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+from collections import deque
+from ESS.parsing import parser
+
+CACHE_DIRECTORY = '.patterndb'
+MAGIC = 'ESSPDB1\n'
+UNKNOWN = 255
+PLACEHOLDER = '*'
+
+
+class PatternDatabaseError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class PatternDatabase(object):
+
+    def __init__(self, value_attr, x_attr, y_attr, pattern, positions, table, offset=0):
+        self.value_attr = value_attr
+        self.x_attr = x_attr
+        self.y_attr = y_attr
+        self.pattern = pattern
+        self.positions = positions
+        self._pattern_index = dict((value, i) for i, value in enumerate(pattern))
+        self._position_index = dict((position, i) for i, position in enumerate(positions))
+        self._table = table
+        self._offset = offset
+
+    def __call__(self, state):
+        rank = self.rank(state)
+        if rank is None:
+            return 0
+        distance = self._table[self._offset + rank]
+        if isinstance(distance, str):
+            distance = ord(distance)
+        if distance == UNKNOWN:
+            return 0
+        return distance
+
+    def rank(self, state):
+        placement = [None] * len(self.pattern)
+        for fact in state:
+            i = self._pattern_index.get(fact[self.value_attr], None)
+            if i is not None:
+                placement[i] = self._position_index[(fact[self.x_attr], fact[self.y_attr])]
+        rank = 0
+        for position in reversed(placement):
+            if position is None:
+                return None
+            rank = rank * len(self.positions) + position
+        return rank
+
+    def abstract(self, state, kept=()):
+        abstract_state = state.copy()
+        for fact in state:
+            if fact[self.x_attr] is None or fact[self.y_attr] is None:
+                continue
+            value = fact[self.value_attr]
+            if value not in self._pattern_index and value not in kept:
+                abstract_state.set_attribute(fact.name, self.value_attr, PLACEHOLDER)
+        abstract_state.freeze()
+        return abstract_state
+
+
+def load(w_memory, h_attrs, directory=None, compiled=True, budget=None):
+    value_attr, x_attr, y_attr, pattern = h_attrs
+    positions = _positions(w_memory.goal, x_attr, y_attr)
+    if directory is None:
+        print "Building pattern database for pattern %s in memory..." % ', '.join(map(str, pattern))
+        return build(w_memory, value_attr, x_attr, y_attr, pattern, positions, compiled, budget)
+    filepath = os.path.join(directory, '%s.pdb' % kb_hash(w_memory, h_attrs))
+    if os.path.exists(filepath):
+        print "Pattern database loaded from %s" % filepath
+        return _map(filepath, value_attr, x_attr, y_attr, pattern, positions)
+
+    print "Building pattern database for pattern %s..." % ', '.join(map(str, pattern))
+    pdb = build(w_memory, value_attr, x_attr, y_attr, pattern, positions, compiled, budget)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp_filepath = filepath + '.tmp'
+    with open(tmp_filepath, 'wb') as f:
+        f.write(MAGIC)
+        f.write(json.dumps({'pattern': pattern, 'positions': positions}) + '\n')
+        pdb._table.tofile(f)
+    os.rename(tmp_filepath, filepath)
+    print "Pattern database saved to %s" % filepath
+    return _map(filepath, value_attr, x_attr, y_attr, pattern, positions)
+
+
+def build(w_memory, value_attr, x_attr, y_attr, pattern, positions, compiled=True, budget=None):
+    pdb = PatternDatabase(value_attr, x_attr, y_attr, pattern, positions,
+                          array.array('B', [UNKNOWN]) * (len(positions) ** len(pattern)))
+    start = pdb.abstract(w_memory.goal, rule_values(w_memory.rules, value_attr))
+    if pdb.rank(start) is None:
+        raise PatternDatabaseError("Every pattern value must appear in the goal")
+    states = [start]
+    ranks = [pdb.rank(start)]
+    index = {start: 0}
+    predecessors = [[]]
+    networks = {}
+
+    for i, state in enumerate(states):
+        if budget is not None and budget.expired(i):
+            raise PatternDatabaseError("Pattern database build stopped: %s" % budget.exhausted)
+        facts_names = state.get_facts_names()
+        try:
+            network = networks[facts_names]
+        except KeyError:
+            network = w_memory.network(state, compiled)
+            networks[facts_names] = network
+        for rule, new_state in network.successors(state):
+            new_rank = pdb.rank(new_state)
+            if new_rank is None:
+                continue
+            try:
+                j = index[new_state]
+            except KeyError:
+                j = len(states)
+                index[new_state] = j
+                states.append(new_state)
+                ranks.append(new_rank)
+                predecessors.append([])
+            predecessors[j].append(i)
+    if not predecessors[0]:
+        raise PatternDatabaseError("No rule leads to the abstract goal of pattern %s" %
+                                   ', '.join(map(str, pattern)))
+
+    distances = [None] * len(states)
+    distances[0] = 0
+    pdb._table[ranks[0]] = 0
+    open = deque([0])
+    while open:
+        i = open.popleft()
+        distance = distances[i] + 1
+        for predecessor in predecessors[i]:
+            if distances[predecessor] is None:
+                distances[predecessor] = distance
+                if pdb._table[ranks[predecessor]] == UNKNOWN:
+                    pdb._table[ranks[predecessor]] = min(distance, UNKNOWN-1)
+                open.append(predecessor)
+    return pdb
+
+
+def rule_values(rules, value_attr):
+    values = set()
+    for rule in rules:
+        for disjunction in rule.antecedent.disjunctions:
+            for condition in disjunction.conditions:
+                if condition.test_attr == value_attr and _is_literal(condition.value):
+                    values.add(condition.value)
+        for conclusion in rule.consequent.conclusions:
+            if len(conclusion.arg_list) == 2 and conclusion.arg_list[0] == value_attr and \
+                    _is_literal(conclusion.arg_list[1]):
+                values.add(conclusion.arg_list[1])
+    return values
+
+
+def cache_directory(kb_path):
+    return os.path.join(os.path.dirname(os.path.abspath(kb_path)), CACHE_DIRECTORY)
+
+
+def kb_hash(w_memory, h_attrs):
+    digest = hashlib.sha1(MAGIC)
+    for rule in sorted(str(rule) for rule in w_memory.rules):
+        digest.update(rule)
+    for fact in sorted(str(fact) for fact in w_memory.goal):
+        digest.update(fact)
+    digest.update(repr(h_attrs))
+    return digest.hexdigest()
+
+
+def parse_pattern(pattern):
+    return tuple(parser.cast_trial(value) for value in pattern.split(',') if value)
+
+
+def _is_literal(value):
+    return not isinstance(value, str) or ('?' not in value and '->' not in value)
+
+
+def _positions(goal, x_attr, y_attr):
+    positions = set()
+    for fact in goal:
+        if fact[x_attr] is not None and fact[y_attr] is not None:
+            positions.add((fact[x_attr], fact[y_attr]))
+    if not positions:
+        raise PatternDatabaseError("Goal facts have no '%s'/'%s' attributes" % (x_attr, y_attr))
+    return sorted(positions)
+
+
+def _map(filepath, value_attr, x_attr, y_attr, pattern, positions):
+    with open(filepath, 'rb') as f:
+        table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if table.read(len(MAGIC)) != MAGIC:
+        raise PatternDatabaseError("%s is not a pattern database file" % filepath)
+    table.readline()
+    return PatternDatabase(value_attr, x_attr, y_attr, pattern, positions, table, table.tell())
@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import Queue
+import sys
+import time
+import traceback
+from ESS import budget
+
+POLL_INTERVAL = 0.01
+CANCEL_GRACE = 2.0
+
+
+class PortfolioError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class Outcome(object):
+
+    __slots__ = ('status', 'arrival_state', 'rules', 'visited_cnt', 'elapsed')
+
+    def __init__(self, status, arrival_state=None, rules=None, visited_cnt=0, elapsed=0.0):
+        self.status = status
+        self.arrival_state = arrival_state
+        self.rules = rules
+        self.visited_cnt = visited_cnt
+        self.elapsed = elapsed
+
+
+class _RacerBudget(budget.Budget):
+
+    def __init__(self, deadline, memory_limit, stop, counters, index):
+        budget.Budget.__init__(self, deadline, memory_limit)
+        self._stop = stop
+        self._counters = counters
+        self._index = index
+
+    def expired(self, visited_cnt=None):
+        if visited_cnt is not None:
+            self._counters[self._index] = visited_cnt
+        if self._stop.value and not self.exhausted:
+            self.exhausted = 'cancelled'
+        return budget.Budget.expired(self, visited_cnt)
+
+
+def race(engine, w_memory, strategies, deadline=None, memory_limit=None, best=False):
+    if not strategies:
+        raise PortfolioError("Empty portfolio")
+    stop = multiprocessing.Value('b', 0)
+    counters = multiprocessing.Array('l', len(strategies), lock=False)
+    results = multiprocessing.Queue()
+    start_time = time.time()
+    deadline_time = start_time + deadline if deadline is not None else None
+
+    processes = []
+    for index, strategy in enumerate(strategies):
+        process = multiprocessing.Process(target=_racer,
+                                          args=(engine, index, w_memory, strategy, deadline_time, memory_limit,
+                                                stop, counters, results))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    outcomes = [None] * len(strategies)
+    winner = None
+    stop_time = None
+    try:
+        while any(outcome is None for outcome in outcomes):
+            now = time.time()
+            if stop_time is None and deadline_time is not None and now >= deadline_time:
+                stop.value = 1
+                stop_time = now
+            if stop_time is not None and now - stop_time >= CANCEL_GRACE:
+                break
+            try:
+                message = results.get(True, POLL_INTERVAL)
+            except Queue.Empty:
+                for index, process in enumerate(processes):
+                    if outcomes[index] is None and not process.is_alive():
+                        outcomes[index] = Outcome('error: racer died', visited_cnt=counters[index],
+                                                  elapsed=now-start_time)
+                continue
+
+            index, outcome = message
+            outcomes[index] = outcome
+            if outcome.rules is not None and (winner is None or best and
+                                              len(outcome.rules) < len(outcomes[winner].rules)):
+                winner = index
+                if not best and stop_time is None:
+                    stop.value = 1
+                    stop_time = time.time()
+    finally:
+        stop.value = 1
+        for process in processes:
+            process.join(CANCEL_GRACE)
+            if process.is_alive():
+                process.terminate()
+
+    elapsed = time.time() - start_time
+    for index, outcome in enumerate(outcomes):
+        if outcome is None:
+            outcomes[index] = Outcome('cancelled', visited_cnt=counters[index], elapsed=elapsed)
+    return winner, outcomes
+
+
+def _racer(engine, index, w_memory, strategy, deadline_time, memory_limit, stop, counters, results):
+    sys.stdout = open(os.devnull, 'w')
+    start_time = time.time()
+    try:
+        search_fun, max_depth, h_fun, h_attrs = strategy
+        deadline = max(deadline_time - start_time, 0) if deadline_time is not None else None
+        racer_budget = _RacerBudget(deadline, memory_limit, stop, counters, index)
+        if h_fun:
+            arrival_state, rules, visited_cnt = \
+                    search_fun(engine, w_memory, max_depth, h_fun, h_attrs, budget=racer_budget)
+        else:
+            arrival_state, rules, visited_cnt = search_fun(engine, w_memory, max_depth, budget=racer_budget)
+    except Exception:
+        results.put((index, Outcome('error: %s' % traceback.format_exc().strip().splitlines()[-1],
+                                    visited_cnt=counters[index], elapsed=time.time()-start_time)))
+        return
+    if rules is not None:
+        status = 'solved'
+    elif racer_budget.exhausted:
+        status = racer_budget.exhausted
+    else:
+        status = 'failed'
+    results.put((index, Outcome(status, arrival_state, rules, visited_cnt, time.time()-start_time)))
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from ESS import operation
+from ESS import analyzer
+from ESS import compiler
+
+STRUCTURAL_ACTIONS = (operation.actn_assert, operation.actn_retract)
+GROUNDING_CACHE_SIZE = 64
+
+
+class ReteNetwork(object):
+
+    def __init__(self, rules, compiled=True):
+        self.rules = list(rules)
+        if compiled:
+            self._executables = [compiler.CompiledRule(rule) for rule in self.rules]
+        else:
+            self._executables = [compiler.InterpretedRule(rule) for rule in self.rules]
+        self._alpha = {}
+        self._readers = {}
+        for i, rule in enumerate(self.rules):
+            for key in _antecedent_reads(rule):
+                try:
+                    self._alpha[key].add(i)
+                except KeyError:
+                    self._alpha[key] = {i}
+            for fact_name in _rule_reads(rule):
+                try:
+                    self._readers[fact_name].add(i)
+                except KeyError:
+                    self._readers[fact_name] = {i}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def match(self, facts):
+        return frozenset(i for i in xrange(len(self.rules)) if self._test(i, facts))
+
+    def rematch(self, facts, conflict_set, fired):
+        affected = set()
+        for conclusion in fired.consequent.conclusions:
+            if conclusion.action in STRUCTURAL_ACTIONS:
+                return self.match(facts)
+            affected.update(self._alpha.get((conclusion.fact_name, conclusion.arg_list[0]), ()))
+        if not affected:
+            return conflict_set
+        kept = conflict_set.difference(affected)
+        return kept.union(i for i in affected if self._test(i, facts))
+
+    def readers(self, fact_names):
+        indices = set()
+        for fact_name in fact_names:
+            indices.update(self._readers.get(fact_name, ()))
+        return indices
+
+    def activation(self, i, facts):
+        return self._executables[i].instantiate(facts)
+
+    def activations(self, facts, conflict_set):
+        return [self._executables[i].instantiate(facts) for i in sorted(conflict_set)]
+
+    def successors(self, facts, conflict_set=None):
+        if conflict_set is None:
+            conflict_set = self.match(facts)
+        consequents = set()
+        successors = []
+        for rule in self.activations(facts, conflict_set):
+            if rule.consequent not in consequents:
+                consequents.add(rule.consequent)
+                successors.append((rule, rule.consequent(facts)))
+        return successors
+
+    def _test(self, i, facts):
+        return self._executables[i].match(facts)
+
+
+def _antecedent_reads(rule):
+    reads = set()
+    for disjunction in rule.antecedent.disjunctions:
+        for condition in disjunction.conditions:
+            reads.add((condition.fact_name, condition.test_attr))
+            if isinstance(condition.value, str):
+                for operand in analyzer.ARITHMETIC_OP_REX.split(condition.value):
+                    if '->' in operand:
+                        fact_name, attr = operand.split('->', 1)
+                        reads.add((fact_name, attr))
+    return reads
+
+
+class GroundingCache(object):
+
+    def __init__(self, capacity=GROUNDING_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._stamp = None
+        self._written = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "Grounding cache: %s entries, %s hits, %s misses" % (len(self), self.hits, self.misses)
+
+    def rules(self, w_memory, facts):
+        return self._entry(w_memory, facts)[0]
+
+    def network(self, w_memory, facts, compiled=True):
+        networks = self._entry(w_memory, facts)[1]
+        try:
+            return networks[compiled]
+        except KeyError:
+            network = ReteNetwork(self.rules(w_memory, facts), compiled)
+            networks[compiled] = network
+            return network
+
+    def clear(self):
+        self._entries.clear()
+        self._stamp = None
+        self._written = None
+
+    def _entry(self, w_memory, facts):
+        stamp = (id(w_memory.rules), w_memory.rules.version, hash(w_memory.initial_state))
+        if stamp != self._stamp:
+            self._entries.clear()
+            self._stamp = stamp
+            self._written = None if analyzer.retracts_facts(w_memory.rules) else \
+                    analyzer.written_attributes(w_memory.rules)
+        key = facts.get_facts_names()
+        if self._written is not None:
+            key = (key, analyzer.static_signature(facts, self._written))
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            entry = (tuple(analyzer.bind_rules(w_memory.rules, facts)), {})
+            if len(self._entries) >= self.capacity:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+        self._entries[key] = entry
+        return entry
+
+
+def antecedent_facts(rule):
+    fact_names = []
+    for disjunction in rule.antecedent.disjunctions:
+        for condition in disjunction.conditions:
+            if condition.fact_name not in fact_names:
+                fact_names.append(condition.fact_name)
+    return fact_names
+
+
+def _rule_reads(rule):
+    reads = set(fact_name for fact_name, _ in _antecedent_reads(rule))
+    for conclusion in rule.consequent.conclusions:
+        if len(conclusion.arg_list) == 2 and isinstance(conclusion.arg_list[1], str):
+            for operand in analyzer.ARITHMETIC_OP_REX.split(conclusion.arg_list[1]):
+                if '->' in operand:
+                    reads.add(operand.split('->', 1)[0])
+    return reads
@@ -0,0 +1,531 @@
+import argparse
+import cPickle
+import itertools
+import json
+import multiprocessing
+import os
+import Queue
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from ESS.parsing.parser import Parser, ParserSyntaxError
+from ESS.engine import WorkingMemory, Engine
+from ESS.shell import Shell, CommandError
+from ESS.client import DEFAULT_ADDRESS, ClientError, parse_address
+from ESS import budget
+from ESS import patterndb
+
+DEFAULT_TIMEOUT = 60
+MAX_PENDING = 1024
+WORKER_CACHE_SIZE = 16
+WATCH_INTERVAL = 0.5
+DEADLINE_GRACE = 1
+CLOSE_TIMEOUT = 5
+
+_worker = None
+
+
+class ServerError(Exception):
+    def __init__(self, cause=''):
+        Exception.__init__(self)
+        self.cause = cause
+
+    def __str__(self):
+        return self.cause
+
+
+class KnowledgeBase(object):
+
+    def __init__(self, name, facts, rules, goal, versions):
+        self.name = name
+        self.w_memory = WorkingMemory(facts, rules, goal)
+        self.version = next(versions)
+        self.lock = threading.Lock()
+        self._versions = versions
+        self._blob = None
+
+    def describe(self):
+        with self.lock:
+            return {'name': self.name,
+                    'version': self.version,
+                    'facts': len(self.w_memory.initial_state.get_facts_names()),
+                    'rules': len(self.w_memory.rules),
+                    'goal': bool(self.w_memory.goal)}
+
+    def snapshot(self):
+        with self.lock:
+            if self._blob is None:
+                w_memory = self.w_memory
+                self._blob = cPickle.dumps((w_memory.initial_state, w_memory.rules, w_memory.goal),
+                                           cPickle.HIGHEST_PROTOCOL)
+            return self.version, self._blob
+
+    def assert_text(self, text):
+        facts, rules, goal = parse_kb(text)
+        with self.lock:
+            self.w_memory.initial_state.update(facts)
+            if rules:
+                self.w_memory.rules.update(rules)
+            if goal:
+                self.w_memory.goal.update(goal)
+            return self._changed()
+
+    def retract(self, fact_names, rule_names):
+        fact_names = set(fact_names)
+        rule_names = set(rule_names)
+        with self.lock:
+            missing = fact_names - self.w_memory.initial_state.get_facts_names()
+            missing |= rule_names - set(rule.name for rule in self.w_memory.rules)
+            if missing:
+                raise ServerError("%s not found" % ', '.join(sorted(missing)))
+            if not fact_names and not rule_names:
+                return self.version
+            for fact_name in fact_names:
+                self.w_memory.initial_state.remove(fact_name)
+            for rule_name in rule_names:
+                self.w_memory.rules.remove(rule_name)
+            return self._changed()
+
+    def _changed(self):
+        self.version = next(self._versions)
+        self._blob = None
+        return self.version
+
+
+class QueryServer(object):
+
+    def __init__(self, workers=1, compiled=True, timeout=DEFAULT_TIMEOUT, kb_dir=None, pattern_db_dir=None):
+        self.timeout = timeout
+        self.kb_dir = kb_dir
+        self.kbs = {}
+        self._kbs_lock = threading.Lock()
+        self._versions = itertools.count()
+        self._cancels = multiprocessing.Array('b', MAX_PENDING, lock=False)
+        self._owners = multiprocessing.Array('l', MAX_PENDING, lock=False)
+        self._free_slots = range(MAX_PENDING)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._pool = multiprocessing.Pool(workers, _init_worker,
+                                          (compiled, self._cancels, self._owners, pattern_db_dir))
+        self._server = None
+        self._stopped = threading.Event()
+        self._watcher = threading.Thread(target=self._watch)
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def load(self, name, text):
+        facts, rules, goal = parse_kb(text)
+        if not facts and not rules:
+            raise ServerError("No facts or rules in knowledge base %s" % name)
+        with self._kbs_lock:
+            kb = self.kbs[name] = KnowledgeBase(name, facts, rules, goal, self._versions)
+        return kb.version
+
+    def serve_forever(self, address=DEFAULT_ADDRESS):
+        family, target = parse_address(address)
+        if isinstance(target, tuple):
+            self._server = _ThreadingTCPServer(target, _RequestHandler)
+        else:
+            if os.path.exists(target):
+                os.remove(target)
+            self._server = _ThreadingUnixServer(target, _RequestHandler)
+        self._server.query_server = self
+        print "ESS server listening on %s with %s knowledge bases" % (address, len(self.kbs))
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if not isinstance(target, tuple) and os.path.exists(target):
+                os.remove(target)
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+        self._pool.terminate()
+        self._pool.join()
+
+    def dispatch(self, connection, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            connection.send({'id': None, 'ok': False, 'error': "Malformed request"})
+            return
+        if not isinstance(request, dict):
+            connection.send({'id': None, 'ok': False, 'error': "Request must be a JSON object"})
+            return
+        handler = getattr(self, '_op_%s' % request.get('op'), None)
+        try:
+            if handler is None:
+                raise ServerError("Unknown operation %s" % request.get('op'))
+            response = handler(connection, request)
+        except ServerError as error:
+            response = {'ok': False, 'error': str(error)}
+        except Exception:
+            response = {'ok': False, 'error': traceback.format_exc().strip().splitlines()[-1]}
+        if response is not None:
+            response['id'] = request.get('id')
+            response.setdefault('ok', True)
+            connection.send(response)
+
+    def cancel_all(self, connection):
+        with self._pending_lock:
+            for search in self._pending.itervalues():
+                if search.connection is connection:
+                    self._cancels[search.slot] = 1
+
+    def _op_list(self, connection, request):
+        with self._kbs_lock:
+            kbs = sorted(self.kbs.values(), key=lambda kb: kb.name)
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {'kbs': [kb.describe() for kb in kbs], 'pending': pending}
+
+    def _op_load(self, connection, request):
+        name = _field(request, 'kb', basestring)
+        if 'path' not in request:
+            return {'kb': name, 'version': self.load(name, _field(request, 'text', basestring))}
+        filepath = _field(request, 'path', basestring)
+        text = self._read_kb(filepath)
+        try:
+            return {'kb': name, 'version': self.load(name, text)}
+        except ServerError:
+            raise ServerError("%s is not a valid knowledge base" % filepath)
+
+    def _op_assert(self, connection, request):
+        kb = self._kb(request)
+        return {'kb': kb.name, 'version': kb.assert_text(_field(request, 'text', basestring))}
+
+    def _op_retract(self, connection, request):
+        kb = self._kb(request)
+        fact_names = _field(request, 'facts', list, [])
+        rule_names = _field(request, 'rules', list, [])
+        return {'kb': kb.name, 'version': kb.retract(fact_names, rule_names)}
+
+    def _op_run(self, connection, request):
+        kb = self._kb(request)
+        strategy = _field(request, 'strategy', basestring)
+        try:
+            Shell().parse_strategy(strategy)
+        except CommandError as error:
+            raise ServerError("Wrong strategy %s: %s" % (strategy, error))
+        timeout = _field(request, 'timeout', (int, float), self.timeout)
+        if timeout <= 0:
+            raise ServerError("Timeout must be positive")
+        version, blob = kb.snapshot()
+        deadline_time = time.time() + timeout
+        with self._pending_lock:
+            if (connection, request.get('id')) in self._pending:
+                raise ServerError("Request %s is already running" % request.get('id'))
+            if not self._free_slots:
+                raise ServerError("Server busy, too many pending searches")
+            search = _PendingSearch(connection, request.get('id'), self._free_slots.pop(), kb.name, version,
+                                    deadline_time)
+            self._cancels[search.slot] = 0
+            self._owners[search.slot] = 0
+            self._pending[search.key] = search
+
+        self._pool.apply_async(_run, ((search.slot, kb.name, version, blob, strategy, deadline_time),),
+                               callback=lambda result: self._finish(search, result))
+        return None
+
+    def _op_cancel(self, connection, request):
+        target = request.get('target')
+        with self._pending_lock:
+            search = self._pending.get((connection, target))
+            if search is not None:
+                self._cancels[search.slot] = 1
+        return {'target': target, 'cancelled': search is not None}
+
+    def _finish(self, search, result):
+        with self._pending_lock:
+            if self._pending.get(search.key) is not search:
+                return
+            del self._pending[search.key]
+            self._owners[search.slot] = 0
+            self._free_slots.append(search.slot)
+        result.update(id=search.request_id, ok=result['status'] != 'error', kb=search.kb, version=search.version)
+        search.connection.send(result)
+
+    def _watch(self):
+        while not self._stopped.wait(WATCH_INTERVAL):
+            now = time.time()
+            with self._pending_lock:
+                lost = [search for search in self._pending.itervalues()
+                        if self._owners[search.slot] and not _alive(self._owners[search.slot])]
+                late = [search for search in self._pending.itervalues()
+                        if search not in lost and now > search.deadline_time + DEADLINE_GRACE]
+                for search in late:
+                    self._cancels[search.slot] = 1
+            for search in lost:
+                self._finish(search, {'status': 'error', 'error': "Search worker died"})
+            for search in late:
+                self._finish(search, {'status': 'error', 'error': "Search timed out"})
+
+    def _read_kb(self, filepath):
+        if self.kb_dir is None:
+            raise ServerError("Loading files is disabled, the server has no knowledge base directory")
+        root = os.path.realpath(self.kb_dir)
+        realpath = os.path.realpath(os.path.join(root, filepath))
+        if not realpath.startswith(root + os.sep):
+            raise ServerError("%s is outside the knowledge base directory" % filepath)
+        try:
+            with open(realpath) as f:
+                return f.read()
+        except IOError as error:
+            raise ServerError("Cannot read %s: %s" % (filepath, error.strerror))
+
+    def _kb(self, request):
+        name = _field(request, 'kb', basestring)
+        with self._kbs_lock:
+            try:
+                return self.kbs[name]
+            except KeyError:
+                raise ServerError("Unknown knowledge base %s" % name)
+
+
+class _PendingSearch(object):
+
+    def __init__(self, connection, request_id, slot, kb, version, deadline_time):
+        self.connection = connection
+        self.request_id = request_id
+        self.slot = slot
+        self.kb = kb
+        self.version = version
+        self.deadline_time = deadline_time
+
+    @property
+    def key(self):
+        return self.connection, self.request_id
+
+
+class _Connection(object):
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._queue = Queue.Queue()
+        self.closed = False
+        self._writer = threading.Thread(target=self._write)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def send(self, response):
+        if not self.closed:
+            self._queue.put(json.dumps(response, sort_keys=True) + '\n')
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        self.closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            try:
+                self._wfile.write(data)
+                self._wfile.flush()
+            except (IOError, OSError):
+                self.closed = True
+                return
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        query_server = self.server.query_server
+        connection = _Connection(self.wfile)
+        try:
+            for line in iter(self.rfile.readline, ''):
+                if line.strip():
+                    query_server.dispatch(connection, line)
+        except (IOError, OSError):
+            pass
+        finally:
+            query_server.cancel_all(connection)
+            connection.close()
+
+
+class _ThreadingTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(SocketServer, 'UnixStreamServer'):
+    class _ThreadingUnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+        daemon_threads = True
+
+
+class _RequestBudget(budget.Budget):
+
+    def __init__(self, deadline, cancels, slot):
+        budget.Budget.__init__(self, deadline)
+        self._cancels = cancels
+        self._slot = slot
+
+    def expired(self, visited_cnt=None):
+        if self._cancels[self._slot] and not self.exhausted:
+            self.exhausted = 'cancelled'
+        return budget.Budget.expired(self, visited_cnt)
+
+
+class _Worker(object):
+
+    def __init__(self, compiled, cancels, owners, pattern_db_dir=None):
+        self.engine = Engine(compiled, pattern_db_dir=pattern_db_dir)
+        self.cancels = cancels
+        self.owners = owners
+        self._kbs = OrderedDict()
+        self._strategies = {}
+
+    def run(self, slot, name, version, blob, strategy, deadline_time):
+        start_time = time.time()
+        self.owners[slot] = os.getpid()
+        result = {'strategy': strategy}
+        try:
+            search_budget = _RequestBudget(max(deadline_time - start_time, 0), self.cancels, slot)
+            if search_budget.expired():
+                result.update(status=search_budget.exhausted, visited_nodes=0)
+            else:
+                search_fun, max_depth, h_fun, h_attrs = self._strategy(strategy)
+                w_memory = self._working_memory(name, version, blob)
+                if h_fun == Engine.h_pattern_database:
+                    h_attrs = patterndb.load(w_memory, h_attrs, self.engine.pattern_db_dir, self.engine.compiled,
+                                             search_budget)
+                if h_fun:
+                    arrival_state, rules, visited_cnt = search_fun(self.engine, w_memory, max_depth, h_fun, h_attrs,
+                                                                   budget=search_budget)
+                else:
+                    arrival_state, rules, visited_cnt = search_fun(self.engine, w_memory, max_depth,
+                                                                   budget=search_budget)
+                if rules is not None:
+                    result.update(status='solved', path_length=len(rules), path=[rule.name for rule in rules])
+                else:
+                    result.update(status=search_budget.exhausted or 'failed')
+                result['visited_nodes'] = visited_cnt
+        except patterndb.PatternDatabaseError as error:
+            if search_budget.exhausted:
+                result.update(status=search_budget.exhausted, visited_nodes=0)
+            else:
+                result.update(status='error', error=str(error))
+        except Exception as error:
+            result.update(status='error', error="%s: %s" % (type(error).__name__, error))
+        result['wall_time'] = round(time.time() - start_time, 6)
+        return result
+
+    def _strategy(self, strategy):
+        try:
+            return self._strategies[strategy]
+        except KeyError:
+            self._strategies[strategy] = Shell().parse_strategy(strategy)
+            return self._strategies[strategy]
+
+    def _working_memory(self, name, version, blob):
+        try:
+            w_memory = self._kbs.pop((name, version))
+        except KeyError:
+            w_memory = WorkingMemory(*cPickle.loads(blob))
+            if len(self._kbs) >= WORKER_CACHE_SIZE:
+                self._kbs.popitem(last=False)
+        self._kbs[(name, version)] = w_memory
+        return w_memory
+
+
+def _init_worker(compiled, cancels, owners, pattern_db_dir):
+    global _worker
+    sys.stdout = open(os.devnull, 'w')
+    _worker = _Worker(compiled, cancels, owners, pattern_db_dir)
+
+
+def _run(task):
+    return _worker.run(*task)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _field(request, key, types, default=None):
+    try:
+        value = request[key]
+    except KeyError:
+        if default is not None:
+            return default
+        raise ServerError("Missing field %s" % key)
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise ServerError("Wrong field %s" % key)
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    return _encode(value)
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def parse_kb(text):
+    try:
+        return Parser().load_from_text(text)
+    except ParserSyntaxError as error:
+        raise ServerError("Syntax error: %s" % error)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+            prog='server.py',
+            description="Serve knowledge bases over JSON lines, keeping them parsed and compiled in memory.")
+    arg_parser.add_argument('kbs', metavar='[NAME=]KB', nargs='*',
+                            help="knowledge base file to preload, named after the file unless NAME is given")
+    arg_parser.add_argument('--listen', metavar='ADDRESS', default=DEFAULT_ADDRESS,
+                            help="HOST:PORT or the path of a Unix socket (default %s)" % DEFAULT_ADDRESS)
+    arg_parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    arg_parser.add_argument('--timeout', type=float, metavar='SECONDS', default=DEFAULT_TIMEOUT,
+                            help="default time limit of each search (default %s)" % DEFAULT_TIMEOUT)
+    arg_parser.add_argument('--interpreted', action='store_true', help="do not compile the rules")
+    arg_parser.add_argument('--kb-dir', metavar='DIR',
+                            help="directory of the files clients may load by path (default: loading by path is off)")
+    arg_parser.add_argument('--pattern-db', metavar='DIR',
+                            help="directory of the PATTERNDB tables (default: built in memory for each request)")
+    args = arg_parser.parse_args(argv)
+    if args.workers < 1:
+        arg_parser.error("workers must be a positive integer")
+    if args.timeout <= 0:
+        arg_parser.error("timeout must be positive")
+    try:
+        parse_address(args.listen)
+    except ClientError as error:
+        arg_parser.error(str(error))
+    if args.kb_dir is not None and not os.path.isdir(args.kb_dir):
+        arg_parser.error("knowledge base directory %s does not exist" % args.kb_dir)
+
+    query_server = QueryServer(args.workers, not args.interpreted, args.timeout, args.kb_dir, args.pattern_db)
+    try:
+        for kb in args.kbs:
+            name, sep, filepath = kb.rpartition('=')
+            if not sep:
+                name = os.path.splitext(os.path.basename(filepath))[0]
+            try:
+                with open(filepath) as f:
+                    query_server.load(name, f.read())
+            except IOError as error:
+                print >> sys.stderr, "Cannot read %s: %s" % (filepath, error)
+                return -1
+            except ServerError as error:
+                print >> sys.stderr, "%s: %s" % (filepath, error)
+                return -1
+        query_server.serve_forever(args.listen)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        query_server.shutdown()
+    return 0
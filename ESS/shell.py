@@ -1,12 +1,27 @@
 import inspect
+import re
 from os import path
 import time
 from ESS.parsing.parser import Parser, ParserSyntaxError
-from ESS.engine import WorkingMemory, Engine, EngineError
+from ESS.engine import WorkingMemory, Engine, EngineError, CONFLICT_STRATEGIES
+from ESS import patterndb
+from ESS import closedset
+from ESS import entity
 from ESS.container import FactContainer, RuleContainer, GoalContainer, NotExistentItemError
 
 VERSION = "0.21 alpha"
 MAXDEPTH_DEFAULT = 1000
+OPTION_REX = re.compile(r'^(\w+)=(.+)$')
+PORTFOLIO_SEARCHES = { 'AStar': (Engine.a_star_search, True),
+                       'BestFirst': (Engine.best_first_search, True),
+                       'WAStar': (Engine.weighted_a_star_search, True),
+                       'Beam': (Engine.beam_search, True),
+                       'AWAStar': (Engine.anytime_weighted_a_star_search, True),
+                       'IDAStar': (Engine.ida_star_search, True),
+                       'BFS': (Engine.breadth_first_search, False),
+                       'DFS': (Engine.depth_first_search, False),
+                       'IDDFS': (Engine.iterative_deepening_search, False),
+                       'Backward': (Engine.backward_chaining_search, False) }
 
 
 class CommandError(Exception):
@@ -34,6 +49,7 @@ class Shell(object):
         self.engine = Engine()
         self.handlers = self._get_handlers()
         self.w_memory = None
+        self.pattern_db_dir = None
 
     def start(self):
         if not self.w_memory:
@@ -49,6 +65,7 @@ class Shell(object):
 
             splitted_input = input.split()
             command, params = splitted_input[0], splitted_input[1:]
+            params, options = self._split_options(params)
 
             callable = self.handlers.get('_handler_'+command, self._handler_unrecognized)
             compulsory_arg_n = \
@@ -57,7 +74,9 @@ class Shell(object):
                 if callable != self._handler_unrecognized and \
                         len(params) < compulsory_arg_n:
                     raise BadArgumentsError()
-                callable(*params)
+                if options and not inspect.getargspec(callable).keywords:
+                    raise BadArgumentsError('unexpected options: %s' % ', '.join(options))
+                callable(*params, **options)
             except (EOFError, KeyboardInterrupt):
                 self._handler_quit()
             except (NothingToDo, SyntaxError):
@@ -77,6 +96,17 @@ class Shell(object):
         except CommandError as e:
             print e
 
+    def _split_options(self, params):
+        positionals = []
+        options = {}
+        for param in params:
+            matched = OPTION_REX.match(param)
+            if matched:
+                options[matched.group(1)] = matched.group(2)
+            else:
+                positionals.append(param)
+        return positionals, options
+
     def _get_handlers(self):
         return dict(function for function in inspect.getmembers(self, inspect.ismethod)
                         if function[0].startswith('_handler'))
@@ -199,6 +229,7 @@ class Shell(object):
         if not self.w_memory.initial_state:
             raise NothingToDo()
         self.w_memory.initial_state.clear()
+        entity.clear_caches()
         print "Facts cleared"
 
     def _handler_clear_rules(self, *args):
@@ -208,100 +239,294 @@ class Shell(object):
         self.w_memory.rules.clear()
         print "Rules cleared"
 
-    def _handler_run_AStar(self, h_name, h_attrs=None, max_depth=None, *args):
-        """run_AStar {HAMMINGDISTANCE|(LINEARCONFLICT|MANHATTANDISTANCE) content,x,y} [MAX_DEPTH]
+    def _handler_run_AStar(self, h_name, *args, **options):
+        """run_AStar HEURISTIC [MAX_DEPTH] [workers=N] [closed=MODE [bits=N]] [checkpoint=FILE [every=SECONDS]] [BUDGET]
+        HEURISTIC is HAMMINGDISTANCE|(LINEARCONFLICT|MANHATTANDISTANCE) content,x,y|PATTERNDB content,x,y v1,v2,...
+        MODE is EXACT|FINGERPRINT64|FINGERPRINT128|BITSTATE, bits is log2 of the BITSTATE table size
+        checkpoint saves the search to FILE every SECONDS (default 300), see resume
+        BUDGET is deadline=SECONDS and/or max_memory=MB, accepted by every run_* search
         Example (gioco_otto): run_AStar MANHATTANDISTANCE contenuto,riga,colonna
         Example (gioco_otto): run_AStar LINEARCONFLICT contenuto,riga,colonna
-        Example (gioco_otto): run_AStar HAMMINGDISTANCE"""
+        Example (gioco_otto): run_AStar HAMMINGDISTANCE
+        Example (gioco_otto): run_AStar PATTERNDB contenuto,riga,colonna 1,2,3,8,NIL
+        Example (gioco_otto): run_AStar MANHATTANDISTANCE contenuto,riga,colonna workers=4
+        Example (gioco_otto): run_AStar MANHATTANDISTANCE contenuto,riga,colonna closed=FINGERPRINT64"""
         if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
             raise NothingToDo()
-        if not max_depth:
-            max_depth = MAXDEPTH_DEFAULT
-        else:
-            try:
-                max_depth = int(max_depth)
-            except ValueError:
-                raise CommandError("Max rules to apply must be an integer")
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options, parallel=True, closed=True, checkpoint=True)
+        self.engine.run(self.w_memory, Engine.a_star_search, max_depth, h_fun, h_attrs, **run_options)
+
+    def _handler_run_BestFirst(self, h_name, *args, **options):
+        """run_BestFirst HEURISTIC [MAX_DEPTH] [closed=MODE [bits=N]] [checkpoint=FILE [every=SECONDS]] [BUDGET]
+        (see run_AStar)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options, closed=True, checkpoint=True)
+        self.engine.run(self.w_memory, Engine.best_first_search, max_depth, h_fun, h_attrs, **run_options)
+
+    def _handler_run_WAStar(self, h_name, *args, **options):
+        """run_WAStar HEURISTIC [MAX_DEPTH] [weight=W] [closed=MODE [bits=N]] [checkpoint=FILE [every=SECONDS]] [BUDGET]
+        weighted A* on g + W*h (default W=2), solution cost is at most W times the optimum (see run_AStar)
+        Example (gioco_otto): run_WAStar MANHATTANDISTANCE contenuto,riga,colonna weight=1.5"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options, closed=True, checkpoint=True, weighted=True)
+        self.engine.run(self.w_memory, Engine.weighted_a_star_search, max_depth, h_fun, h_attrs, **run_options)
+
+    def _handler_run_Beam(self, h_name, *args, **options):
+        """run_Beam HEURISTIC [MAX_DEPTH] [width=K] [BUDGET] - keep only the K best states of each layer
+        (default K=100, see run_AStar)
+        Example (gioco_otto): run_Beam LINEARCONFLICT contenuto,riga,colonna width=50"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options, beam=True)
+        self.engine.run(self.w_memory, Engine.beam_search, max_depth, h_fun, h_attrs, **run_options)
+
+    def _handler_run_AWAStar(self, h_name, *args, **options):
+        """run_AWAStar HEURISTIC [MAX_DEPTH] [weight=W] [BUDGET] - anytime weighted A*, improves the solution
+        until the budget runs out; the reported cost bound assumes an admissible HEURISTIC (see run_AStar)
+        Example (gioco_otto): run_AWAStar MANHATTANDISTANCE contenuto,riga,colonna weight=3 deadline=10"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options, weighted=True)
+        self.engine.run(self.w_memory, Engine.anytime_weighted_a_star_search, max_depth, h_fun, h_attrs,
+                        **run_options)
+
+    def _handler_run_IDAStar(self, h_name, *args, **options):
+        """run_IDAStar HEURISTIC [MAX_DEPTH] [BUDGET] (see run_AStar)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        h_fun, h_attrs, args = self._parse_heuristic(h_name, args)
+        max_depth = self._parse_max_depth(*args[:1])
+        run_options = self._parse_run_options(options)
+        self.engine.run(self.w_memory, Engine.ida_star_search, max_depth, h_fun, h_attrs, **run_options)
 
-        if h_name == 'HAMMINGDISTANCE':
-            h_fun = Engine.h_hamming_distance
-            if h_attrs is not None:
-                raise BadArgumentsError()
-        elif h_name == 'MANHATTANDISTANCE':
-            h_fun = Engine.h_manhattan_distance
-        elif h_name == 'LINEARCONFLICT':
-            h_fun = Engine.h_linear_conflict
-        else:
-            raise BadArgumentsError('Unknown heuristic function')
+    def _handler_run_DFS(self, max_depth=None, *args, **options):
+        """run_DFS [MAX_DEPTH] [closed=MODE [bits=N]] [BUDGET] (see run_AStar)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        max_depth = self._parse_max_depth(max_depth)
+        run_options = self._parse_run_options(options, closed=True)
+        self.engine.run(self.w_memory, Engine.depth_first_search, max_depth, **run_options)
 
-        if h_name in ('MANHATTANDISTANCE', 'LINEARCONFLICT'):
-            try:
-                h_attrs = h_attrs.split(',')
-                if len(h_attrs) != 3:
-                    raise'LINEARCONFLICT'
-            except:
-                raise BadArgumentsError('Wrong heuristic attributes')
+    def _handler_run_BFS(self, max_depth=None, *args, **options):
+        """run_BFS [MAX_DEPTH] [workers=N] [closed=MODE [bits=N]] [checkpoint=FILE [every=SECONDS]] [BUDGET]
+        (see run_AStar)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        max_depth = self._parse_max_depth(max_depth)
+        run_options = self._parse_run_options(options, parallel=True, closed=True, checkpoint=True)
+        self.engine.run(self.w_memory, Engine.breadth_first_search, max_depth, **run_options)
 
-        self.engine.run(self.w_memory, Engine.a_star_search, max_depth, h_fun, h_attrs)
+    def _handler_run_ExternalBFS(self, max_depth=None, *args, **options):
+        """run_ExternalBFS [MAX_DEPTH] [memory=MB] [scratch=DIR] [BUDGET] - BFS keeping layers in files under DIR"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        max_depth = self._parse_max_depth(max_depth)
+        run_options = self._parse_run_options(options, external=True)
+        self.engine.run(self.w_memory, Engine.external_breadth_first_search, max_depth, **run_options)
+
+    def _handler_run_Portfolio(self, *args, **options):
+        """run_Portfolio STRATEGY [STRATEGY ...] [best=ON] [BUDGET] - race the strategies in separate processes,
+        keep the first solution (or with best=ON the shortest one found within the deadline) and cancel the rest
+        STRATEGY is SEARCH[:HEURISTIC[:ATTRS[:PATTERN]]][:MAX_DEPTH], SEARCH is the name of a run_* search
+        Example (gioco_otto): run_Portfolio BFS DFS:30 AStar:MANHATTANDISTANCE:contenuto,riga,colonna
+        Example (gioco_otto): run_Portfolio BestFirst:LINEARCONFLICT:contenuto,riga,colonna IDAStar:HAMMINGDISTANCE best=ON deadline=10"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        if not args:
+            raise BadArgumentsError('Missing strategies')
+        strategies = [self.parse_strategy(spec) for spec in args]
+        best = options.pop('best', 'OFF')
+        if best not in ('ON', 'OFF'):
+            raise BadArgumentsError('best must be ON or OFF')
+        run_options = self._parse_run_options(options)
+        self.engine.run_portfolio(self.w_memory, strategies, best=best == 'ON', **run_options)
+
+    def parse_strategy(self, spec):
+        tokens = spec.split(':')
+        try:
+            search_fun, informed = PORTFOLIO_SEARCHES[tokens[0]]
+        except KeyError:
+            raise BadArgumentsError('Unknown search %s' % tokens[0])
+        h_fun, h_attrs, args = None, None, tokens[1:]
+        if informed:
+            if not args:
+                raise BadArgumentsError('Missing heuristic function for %s' % tokens[0])
+            h_fun, h_attrs, args = self._parse_heuristic(args[0], args[1:])
+        if len(args) > 1:
+            raise BadArgumentsError('Wrong strategy %s' % spec)
+        return search_fun, self._parse_max_depth(*args), h_fun, h_attrs
+
+    def _handler_resume(self, filepath, *args, **options):
+        """resume FILE [checkpoint=FILE] [every=SECONDS] [BUDGET] - continue a search from a checkpoint of the loaded KB"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        run_options = self._parse_run_options(options, checkpoint=True)
+        self.engine.resume(self.w_memory, path.normpath(filepath), **run_options)
 
+    def _handler_run_IDDFS(self, max_depth=None, *args, **options):
+        """run_IDDFS [MAX_DEPTH] [BUDGET] (see run_AStar)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
+            raise NothingToDo()
+        max_depth = self._parse_max_depth(max_depth)
+        run_options = self._parse_run_options(options)
+        self.engine.run(self.w_memory, Engine.iterative_deepening_search, max_depth, **run_options)
 
-    def _handler_run_BestFirst(self, h_name, h_attrs=None, max_depth=None, *args):
-        """run_BestFirst {HAMMINGDISTANCE|(LINEARCONFLICT|MANHATTANDISTANCE) content,x,y} [MAX_DEPTH]"""
+    def _handler_run_Backward(self, max_depth=None, *args, **options):
+        """run_Backward [MAX_DEPTH] [BUDGET] - reach the goal attributes using only the rules that can affect them"""
         if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
             raise NothingToDo()
-        if not max_depth:
-            max_depth = MAXDEPTH_DEFAULT
-        else:
+        max_depth = self._parse_max_depth(max_depth)
+        run_options = self._parse_run_options(options)
+        self.engine.run(self.w_memory, Engine.backward_chaining_search, max_depth, **run_options)
+
+    def _handler_run_Forward(self, max_cycles=None, *args, **options):
+        """run_Forward [MAX_CYCLES] [strategy=LEX|MEA] [BUDGET] - fire rules until quiescence (or goal, if set)"""
+        if not self.w_memory.initial_state or not self.w_memory.rules:
+            raise NothingToDo()
+        if max_cycles is not None:
             try:
-                max_depth = int(max_depth)
+                max_cycles = int(max_cycles)
             except ValueError:
-                raise CommandError("Max rules to apply must be an integer")
+                raise CommandError("Max cycles must be an integer")
+        strategy = options.pop('strategy', 'LEX')
+        if strategy not in CONFLICT_STRATEGIES:
+            raise BadArgumentsError('Unknown conflict resolution strategy %s' % strategy)
+        run_options = self._parse_run_options(options)
+        self.engine.run_forward(self.w_memory, max_cycles, strategy, **run_options)
+
+    def _parse_max_depth(self, max_depth=None):
+        if not max_depth:
+            return MAXDEPTH_DEFAULT
+        try:
+            return int(max_depth)
+        except ValueError:
+            raise CommandError("Max rules to apply must be an integer")
+
+    def _parse_run_options(self, options, parallel=False, closed=False, external=False, checkpoint=False,
+                           weighted=False, beam=False):
+        run_options = {}
+        for key, value in options.iteritems():
+            if key == 'workers' and parallel:
+                try:
+                    run_options['workers'] = int(value)
+                except ValueError:
+                    raise CommandError("Workers must be an integer")
+                if run_options['workers'] < 1:
+                    raise CommandError("Workers must be a positive integer")
+            elif key == 'closed' and closed:
+                if value not in closedset.MODES:
+                    raise BadArgumentsError('Unknown closed set mode %s' % value)
+                run_options['closed'] = value
+            elif key == 'bits' and closed:
+                try:
+                    run_options['closed_bits'] = int(value)
+                except ValueError:
+                    raise CommandError("Bits must be an integer")
+                if run_options['closed_bits'] < 3:
+                    raise CommandError("Bits must be at least 3")
+            elif key == 'memory' and external:
+                try:
+                    run_options['memory_budget'] = int(value) << 20
+                except ValueError:
+                    raise CommandError("Memory must be an integer (MB)")
+                if run_options['memory_budget'] <= 0:
+                    raise CommandError("Memory must be a positive integer (MB)")
+            elif key == 'scratch' and external:
+                if not path.isdir(value):
+                    raise CommandError("Scratch directory %s does not exist" % value)
+                run_options['scratch_dir'] = value
+            elif key == 'checkpoint' and checkpoint:
+                run_options['checkpoint_file'] = path.normpath(value)
+            elif key == 'every' and checkpoint:
+                try:
+                    run_options['checkpoint_interval'] = float(value)
+                except ValueError:
+                    raise CommandError("Checkpoint interval must be a number of seconds")
+                if run_options['checkpoint_interval'] <= 0:
+                    raise CommandError("Checkpoint interval must be positive")
+            elif key == 'weight' and weighted:
+                try:
+                    run_options['weight'] = float(value)
+                except ValueError:
+                    raise CommandError("Weight must be a number")
+                if run_options['weight'] < 1:
+                    raise CommandError("Weight must be at least 1")
+            elif key == 'width' and beam:
+                try:
+                    run_options['width'] = int(value)
+                except ValueError:
+                    raise CommandError("Width must be an integer")
+                if run_options['width'] < 1:
+                    raise CommandError("Width must be a positive integer")
+            elif key == 'deadline':
+                try:
+                    run_options['deadline'] = float(value)
+                except ValueError:
+                    raise CommandError("Deadline must be a number of seconds")
+                if run_options['deadline'] <= 0:
+                    raise CommandError("Deadline must be positive")
+            elif key == 'max_memory':
+                try:
+                    run_options['memory_limit'] = int(value) << 20
+                except ValueError:
+                    raise CommandError("Max memory must be an integer (MB)")
+                if run_options['memory_limit'] <= 0:
+                    raise CommandError("Max memory must be a positive integer (MB)")
+            else:
+                raise BadArgumentsError('Unknown option %s' % key)
+        return run_options
 
+    def _parse_heuristic(self, h_name, args):
         if h_name == 'HAMMINGDISTANCE':
-            h_fun = Engine.h_hamming_distance
-            if h_attrs is not None:
-                raise BadArgumentsError()
-        elif h_name == 'MANHATTANDISTANCE':
+            return Engine.h_hamming_distance, None, args
+        if h_name == 'MANHATTANDISTANCE':
             h_fun = Engine.h_manhattan_distance
         elif h_name == 'LINEARCONFLICT':
             h_fun = Engine.h_linear_conflict
+        elif h_name == 'PATTERNDB':
+            h_fun = Engine.h_pattern_database
         else:
             raise BadArgumentsError('Unknown heuristic function')
 
-        if h_name in ('MANHATTANDISTANCE', 'LINEARCONFLICT'):
-            try:
-                h_attrs = h_attrs.split(',')
-                if len(h_attrs) != 3:
-                    raise'LINEARCONFLICT'
-            except:
-                raise BadArgumentsError('Wrong heuristic attributes')
-        self.engine.run(self.w_memory, Engine.best_first_search, max_depth, h_fun, h_attrs)
-
-    def _handler_run_DFS(self, max_depth=None, *args):
-        """run_DFS [MAX_DEPTH]"""
-        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
-            raise NothingToDo()
-        if not max_depth:
-            max_depth = MAXDEPTH_DEFAULT
+        if not args or len(args[0].split(',')) != 3:
+            raise BadArgumentsError('Wrong heuristic attributes')
+        h_attrs = args[0].split(',')
+        if h_name == 'PATTERNDB':
+            if len(args) < 2:
+                raise BadArgumentsError('Missing pattern values')
+            pattern = patterndb.parse_pattern(args[1])
+            if not pattern:
+                raise BadArgumentsError('Missing pattern values')
+            return h_fun, tuple(h_attrs) + (pattern,), args[2:]
+        return h_fun, h_attrs, args[1:]
+
+    def _handler_compile(self, mode, *args):
+        """compile {ON|OFF} - run rules as compiled closures (default) or through the interpreter"""
+        if mode == 'ON':
+            self.engine.compiled = True
+        elif mode == 'OFF':
+            self.engine.compiled = False
         else:
-            try:
-                max_depth = int(max_depth)
-            except ValueError:
-                raise CommandError("Max rules to apply must be an integer")
-        self.engine.run(self.w_memory, Engine.depth_first_search, max_depth)
+            raise BadArgumentsError()
+        print "Rule compilation %s" % mode
 
-    def _handler_run_BFS(self, max_depth=None, *args):
-        """run_BFS [MAX_DEPTH]"""
-        if not self.w_memory.initial_state or not self.w_memory.rules or not self.w_memory.goal:
-            raise NothingToDo()
-        if not max_depth:
-            max_depth = MAXDEPTH_DEFAULT
-        else:
-            try:
-                max_depth = int(max_depth)
-            except ValueError:
-                raise CommandError("Max rules to apply must be an integer")
-        self.engine.run(self.w_memory, Engine.breadth_first_search, max_depth)
+    def _handler_pattern_db(self, directory, *args):
+        """pattern_db DIRECTORY - save and reuse PATTERNDB tables in DIRECTORY (default: the .patterndb directory
+        beside the loaded knowledge base file, or memory only if the knowledge base was not loaded from a file)"""
+        self.pattern_db_dir = self.engine.pattern_db_dir = path.normpath(directory)
+        print "Pattern databases saved in %s" % self.pattern_db_dir
 
     def _handler_load(self, filepath, *args):
         """load FILEPATH - load the knowledge base (facts, rules, goal) from a file"""
@@ -313,6 +538,7 @@ class Shell(object):
             raise CommandError("File path given doesn't exist")
         facts, rules, goal = self.parser.load_from_text(file_content)
         self.w_memory = WorkingMemory(facts, rules, goal)
+        self.engine.pattern_db_dir = self.pattern_db_dir or patterndb.cache_directory(filepath)
         print "\nFile %s loaded succesfully\n" % filepath
 
     def _handler_def_goal(self, *args):
@@ -0,0 +1,7 @@
+import sys
+from ESS.loadgen import main
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
\ No newline at end of file
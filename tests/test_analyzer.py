@@ -0,0 +1,134 @@
+import itertools
+import unittest
+from ESS.entity import Fact
+from ESS import analyzer
+from ESS import compiler
+from tests.util import load_text, load_kb
+
+
+PREFIX_KB = '''
+beginFact: a
+tipo = "sorgente"
+v = 1
+endFact
+beginFact: b
+tipo = "destinazione"
+v = 0
+endFact
+
+beginRule: copia
+equal(?src, tipo, "sorgente")
+equal(?s, tipo, "destinazione")
+equal(?s, v, 0)
+then
+update(?s, v, ?src->v+1)
+endRule
+
+beginGoal:
+endGoal
+'''
+
+
+def reachable_states(w_memory, limit):
+    states = [w_memory.initial_state]
+    seen = set(states)
+    for state in states:
+        if len(states) >= limit:
+            break
+        for rule, new_state in w_memory.network(state).successors(state):
+            if new_state not in seen:
+                seen.add(new_state)
+                states.append(new_state)
+    return states
+
+
+def matches(rule, state):
+    try:
+        return compiler.InterpretedRule(rule).match(state)
+    except (analyzer.BindError, TypeError, KeyError):
+        return False
+
+
+def all_bindings(rule, facts):
+    variables = sorted(analyzer._variables(rule))
+    fact_names = [fact.name for fact in facts]
+    for values in itertools.product(fact_names, repeat=len(variables)):
+        yield analyzer._substitute(rule, dict(zip(variables, values)))
+
+
+class FactIndexTest(unittest.TestCase):
+
+    def test_lookup_follows_changes(self):
+        state = load_kb('gioco_otto_1').initial_state.copy()
+        fact = iter(state).next()
+        value = fact['contenuto']
+        self.assertIn(fact.name, state.lookup('contenuto', value))
+        state.set_attribute(fact.name, 'contenuto', 'changed')
+        self.assertNotIn(fact.name, state.lookup('contenuto', value))
+        self.assertEqual(state.lookup('contenuto', 'changed'), {fact.name})
+        extra = Fact('extra')
+        extra['colore'] = 'rosso'
+        state.add(extra)
+        self.assertEqual(state.lookup('colore', 'rosso'), {'extra'})
+        self.assertEqual(state.with_attribute('colore'), {'extra'})
+        state.remove('extra')
+        self.assertEqual(len(state.lookup('colore', 'rosso')), 0)
+        state.del_attribute(fact.name, 'contenuto')
+        self.assertNotIn(fact.name, state.with_attribute('contenuto'))
+
+    def test_copies_do_not_share_the_index(self):
+        state = load_kb('gioco_otto_1').initial_state
+        fact = iter(state).next()
+        state.lookup('riga', 1)
+        new_state = state.copy()
+        new_state.set_attribute(fact.name, 'riga', 99)
+        self.assertEqual(new_state.lookup('riga', 99), {fact.name})
+        self.assertEqual(len(state.lookup('riga', 99)), 0)
+
+
+class BindRulesTest(unittest.TestCase):
+
+    def test_bound_rule_counts(self):
+        for name, count in (('gioco_otto_1', 24), ('dischi_1', 36), ('missionari', 32)):
+            w_memory = load_kb(name)
+            self.assertEqual(len(analyzer.bind_rules(w_memory.rules, w_memory.initial_state)), count)
+
+    def test_no_matching_binding_is_lost(self):
+        for name in ('gioco_otto_1', 'dischi_1', 'missionari'):
+            w_memory = load_kb(name)
+            states = reachable_states(w_memory, 100)
+            bound = set(str(rule) for rule in analyzer.bind_rules(w_memory.rules, w_memory.initial_state))
+            for rule in w_memory.rules:
+                for grounded in all_bindings(rule, w_memory.initial_state):
+                    if any(matches(grounded, state) for state in states):
+                        self.assertIn(str(grounded), bound)
+
+    def test_static_conditions_prune_bindings(self):
+        w_memory = load_kb('diagnosi')
+        bound = analyzer.bind_rules(w_memory.rules, w_memory.initial_state)
+        self.assertEqual(len(bound), 5)
+        sensors = sorted(rule.consequent.conclusions[0].fact_name for rule in bound
+                         if rule.name == 'sensore_fuori_soglia')
+        self.assertEqual(sensors, ['sensore_1', 'sensore_3'])
+
+    def test_most_selective_variable_first(self):
+        w_memory = load_kb('dischi_1')
+        rule = iter(w_memory.rules).next()
+        static_attrs = analyzer.static_attributes(w_memory.rules, w_memory.initial_state)
+        var_name, fact_names = analyzer._most_selective(rule, w_memory.initial_state, static_attrs, {},
+                                                         analyzer._variables(rule))
+        for other in analyzer._variables(rule):
+            self.assertLessEqual(len(fact_names), len(analyzer._candidate_facts(other, rule, w_memory.initial_state,
+                                                                                static_attrs, {})))
+
+    def test_variables_are_substituted_as_whole_tokens(self):
+        w_memory = load_text(PREFIX_KB)
+        bound = list(analyzer.bind_rules(w_memory.rules, w_memory.initial_state))
+        self.assertEqual(len(bound), 1)
+        conclusion = bound[0].consequent.conclusions[0]
+        self.assertEqual(conclusion.fact_name, 'b')
+        self.assertEqual(conclusion.arg_list, ['v', 'a->v+1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine
+from ESS.budget import Budget
+from ESS import backward
+from tests.util import load_text, load_kb
+
+
+COUNTER_KB = '''
+beginFact: counter
+tipo = "contatore"
+v = 0
+endFact
+beginFact: noise
+v = 0
+endFact
+
+beginRule: increment
+equal(?c, tipo, "contatore")
+less_than(?c, v, 3)
+then
+update(?c, v, ?c->v+1)
+endRule
+
+beginRule: shake
+equal(noise, v, 0)
+then
+update(noise, v, 1)
+endRule
+
+beginGoal:
+beginFact: counter
+tipo = "contatore"
+v = 3
+endFact
+endGoal
+'''
+
+
+def replay(w_memory, rules):
+    state = w_memory.initial_state
+    for rule in rules:
+        state = rule.consequent(state)
+    return state
+
+
+class BackwardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_solves_examples(self):
+        for name, length in (('gioco_otto_0', 5), ('gioco_otto_1', 10), ('dischi_0', 2), ('dischi_1', 5),
+                             ('missionari', 11)):
+            w_memory = load_kb(name)
+            state, rules, visited_cnt = Engine().backward_chaining_search(w_memory, 30)
+            self.assertEqual(len(rules), length)
+            self.assertEqual(state, w_memory.goal)
+            self.assertEqual(replay(w_memory, rules), w_memory.goal)
+
+    def test_computed_conclusions_at_the_exact_depth(self):
+        w_memory = load_kb('dischi_0')
+        _, rules, _ = Engine().backward_chaining_search(w_memory, 1)
+        self.assertIsNone(rules)
+        _, rules, _ = Engine().backward_chaining_search(w_memory, 2)
+        self.assertEqual(replay(w_memory, rules), w_memory.goal)
+
+    def test_only_relevant_rules_are_expanded(self):
+        w_memory = load_text(COUNTER_KB)
+        prover = backward.Prover(w_memory)
+        self.assertEqual([prover.rules[i].name for i in prover._relevant], ['increment'])
+        state, rules, _ = Engine().backward_chaining_search(w_memory, 10)
+        self.assertEqual([rule.name for rule in rules], ['increment'] * 3)
+        self.assertEqual(replay(w_memory, rules)['noise']['v'], 0)
+
+    def test_interpreted(self):
+        w_memory = load_kb('gioco_otto_0')
+        _, rules, _ = Engine(False).backward_chaining_search(w_memory, 30)
+        self.assertEqual(len(rules), 5)
+
+    def test_max_depth_bounds_the_path(self):
+        _, rules, _ = Engine().backward_chaining_search(load_kb('gioco_otto_1'), 9)
+        self.assertIsNone(rules)
+        _, rules, _ = Engine().backward_chaining_search(load_kb('gioco_otto_1'), 10)
+        self.assertEqual(len(rules), 10)
+
+    def test_budget(self):
+        search_budget = Budget(0)
+        _, rules, _ = Engine().backward_chaining_search(load_kb('gioco_otto_1'), 30, budget=search_budget)
+        self.assertIsNone(rules)
+        self.assertEqual(search_budget.exhausted, 'time limit')
+
+
+if __name__ == '__main__':
+    unittest.main()
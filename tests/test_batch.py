@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from ESS import batch
+from ESS.batch import BatchWorker, BatchError
+from tests.util import KB_DIR, kb_path
+
+ASTAR = 'AStar:MANHATTANDISTANCE:contenuto,riga,colonna'
+
+BROKEN_KB = '''
+beginFact: casella_1
+riga = 1
+riga
+endFact
+'''
+
+
+class RecordingOutput(StringIO):
+
+    def __init__(self):
+        StringIO.__init__(self)
+        self.stdouts = []
+
+    def write(self, s):
+        self.stdouts.append(sys.stdout)
+        StringIO.write(self, s)
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, text):
+        filepath = os.path.join(self.directory, name)
+        with open(filepath, 'w') as f:
+            f.write(text)
+        return filepath
+
+    def solve_all(self, strategy, paths, **options):
+        out = StringIO()
+        solved = batch.solve_all(strategy, paths, out=out, **options)
+        return solved, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_malformed_kb_does_not_affect_the_next(self):
+        worker = BatchWorker(ASTAR)
+        broken = self.write('broken.txt', BROKEN_KB)
+        result = worker.solve((broken, broken, None))
+        self.assertEqual(result['status'], 'error')
+        result = worker.solve(('good', kb_path('gioco_otto_1'), None))
+        self.assertEqual(result['status'], 'solved')
+        self.assertEqual(result['path_length'], 10)
+
+    def test_solve_directory(self):
+        for name in ('gioco_otto_0', 'gioco_otto_1'):
+            shutil.copy(kb_path(name), self.directory)
+        self.write('broken.txt', BROKEN_KB)
+        for workers in (1, 2):
+            solved, results = self.solve_all(ASTAR, [self.directory], workers=workers)
+            self.assertEqual(solved, 2)
+            by_name = dict((os.path.basename(result['instance']), result) for result in results)
+            self.assertEqual(by_name['gioco_otto_0.txt']['path_length'], 5)
+            self.assertEqual(by_name['gioco_otto_1.txt']['path_length'], 10)
+            self.assertEqual(by_name['broken.txt']['status'], 'error')
+
+    def test_states(self):
+        with open(kb_path('gioco_otto_1')) as f:
+            facts = f.read().split('beginRule:')[0]
+        states = StringIO(facts + '\n' + batch.STATE_SEPARATOR + '\n' + BROKEN_KB)
+        solved, results = self.solve_all('BFS', [kb_path('gioco_otto_1')], states=states)
+        self.assertEqual(solved, 1)
+        self.assertEqual([result['status'] for result in results], ['solved', 'error'])
+        self.assertEqual(results[0]['instance'], kb_path('gioco_otto_1') + '#0')
+
+    def test_deadline(self):
+        solved, results = self.solve_all('BFS', [kb_path('gioco_otto_3')], deadline=0.1)
+        self.assertEqual(solved, 0)
+        self.assertEqual(results[0]['status'], 'time limit')
+
+    def test_single_worker_closes_its_null_output(self):
+        stdout = sys.stdout
+        out = RecordingOutput()
+        self.assertEqual(batch.solve_all(ASTAR, [kb_path('gioco_otto_0')], workers=1, out=out), 1)
+        self.assertIs(sys.stdout, stdout)
+        self.assertIsNot(out.stdouts[0], stdout)
+        self.assertTrue(out.stdouts[0].closed)
+
+    def test_errors(self):
+        self.assertRaises(BatchError, self.solve_all, 'Unknown', [KB_DIR])
+        self.assertRaises(BatchError, self.solve_all, 'BFS', [KB_DIR], states=StringIO(''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from ESS import budget
+from ESS.budget import Budget
+
+MB = 1 << 20
+
+
+def expire(search_budget):
+    return any(search_budget.expired() for _ in xrange(budget.MEMORY_CHECK_INTERVAL))
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_deadline(self):
+        self.assertFalse(Budget().expired())
+        self.assertFalse(Budget(60).expired())
+        search_budget = Budget(0)
+        self.assertTrue(search_budget.expired())
+        self.assertEqual(search_budget.exhausted, 'time limit')
+        self.assertTrue(search_budget)
+
+    def test_memory_is_measured_from_creation(self):
+        data = bytearray(200 * MB)
+        del data
+        search_budget = Budget(memory_limit=100 * MB)
+        self.assertFalse(expire(search_budget))
+        data = bytearray(150 * MB)
+        self.assertTrue(expire(search_budget))
+        self.assertEqual(search_budget.exhausted, 'memory limit')
+        del data
+
+    def test_memory_released_is_not_counted(self):
+        search_budget = Budget(memory_limit=100 * MB)
+        data = bytearray(150 * MB)
+        self.assertGreaterEqual(search_budget.used_memory(), 100 * MB)
+        del data
+        self.assertLess(search_budget.used_memory(), 100 * MB)
+        self.assertFalse(expire(search_budget))
+
+    def test_optimality(self):
+        search_budget = Budget()
+        self.assertFalse(search_budget)
+        search_budget.record(10, 8)
+        self.assertFalse(search_budget.proven())
+        self.assertIn("Suboptimality bound: 1.250", str(search_budget))
+        search_budget.record(10, 10)
+        self.assertTrue(search_budget.proven())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine, EngineError
+from ESS import checkpoint
+from tests.util import load_kb
+
+
+class InterruptedEngine(Engine):
+
+    def __init__(self, expansions):
+        Engine.__init__(self)
+        self.expansions = expansions
+
+    def _match(self, w_memory, networks, node):
+        self.expansions -= 1
+        if self.expansions < 0:
+            raise KeyboardInterrupt()
+        return Engine._match(self, w_memory, networks, node)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, 'search.ckpt')
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def output(self):
+        text = sys.stdout.getvalue()
+        sys.stdout.truncate(0)
+        return text
+
+    def path_length(self, text):
+        return int(re.search(r'Path length: (\d+)', text).group(1))
+
+    def resume(self, name):
+        Engine().resume(load_kb(name), self.filepath)
+        return self.path_length(self.output())
+
+    def test_checkpoint_on_budget_expiry(self):
+        Engine().run(load_kb('gioco_otto_2'), Engine.breadth_first_search, 100,
+                     checkpoint_file=self.filepath, deadline=0.2)
+        self.assertIn('FAILURE', self.output())
+        snapshot = checkpoint.load(self.filepath)
+        self.assertGreater(snapshot['search_state']['visited_cnt'], 0)
+        self.assertEqual(self.resume('gioco_otto_2'), 16)
+
+    def test_resume_interrupted_bfs(self):
+        engine = InterruptedEngine(200)
+        self.assertRaises(KeyboardInterrupt, engine.run, load_kb('gioco_otto_2'),
+                          Engine.breadth_first_search, 100, checkpoint_file=self.filepath)
+        snapshot = checkpoint.load(self.filepath)
+        self.assertEqual(snapshot['search_state']['visited_cnt'], 200)
+        self.assertEqual(self.resume('gioco_otto_2'), 16)
+
+    def test_resume_interrupted_a_star(self):
+        for closed in (None, 'EXACT'):
+            engine = InterruptedEngine(50)
+            self.assertRaises(KeyboardInterrupt, engine.run, load_kb('gioco_otto_3'), Engine.a_star_search, 100,
+                              Engine.h_hamming_distance, closed=closed, checkpoint_file=self.filepath)
+            self.assertEqual(checkpoint.load(self.filepath)['search_state']['visited_cnt'], 50)
+            self.assertEqual(self.resume('gioco_otto_3'), 18)
+
+    def test_no_checkpoint_when_solved(self):
+        Engine().run(load_kb('gioco_otto_0'), Engine.breadth_first_search, 100, checkpoint_file=self.filepath)
+        self.assertEqual(self.path_length(self.output()), 5)
+        self.assertFalse(os.path.exists(self.filepath))
+
+    def test_resume_other_kb(self):
+        Engine().run(load_kb('gioco_otto_2'), Engine.breadth_first_search, 100,
+                     checkpoint_file=self.filepath, deadline=0.1)
+        self.assertRaises(EngineError, Engine().resume, load_kb('gioco_otto_1'), self.filepath)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import sys
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine, EngineError
+from ESS import closedset
+from ESS.closedset import FingerprintTable, BitstateTable, ClosedSetError
+from tests.util import H_ATTRS, load_kb
+
+
+def reachable_states(w_memory, limit):
+    states = [w_memory.initial_state]
+    seen = set(states)
+    for state in states:
+        if len(states) >= limit:
+            break
+        for rule, new_state in w_memory.network(state).successors(state):
+            if new_state not in seen:
+                seen.add(new_state)
+                states.append(new_state)
+    return states
+
+
+class ClosedSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.states = reachable_states(load_kb('gioco_otto_3'), 2000)
+
+    def test_modes(self):
+        added, others = self.states[:1000], self.states[1000:]
+        for mode in closedset.MODES:
+            closed = closedset.new_closed_set(mode)
+            for state in added:
+                closed.add(state)
+                closed.add(state)
+            self.assertEqual(len(closed), len(added), mode)
+            self.assertTrue(all(state in closed for state in added), mode)
+            self.assertFalse(any(state in closed for state in others), mode)
+            self.assertLess(closed.collision_probability(), 1e-3)
+            self.assertIn('%s states' % len(added), str(closed))
+
+    def test_fingerprint_table_grows(self):
+        closed = FingerprintTable(128, capacity=4)
+        for state in self.states[:100]:
+            closed.add(state)
+        self.assertEqual(len(closed), 100)
+        self.assertTrue(all(state in closed for state in self.states[:100]))
+        self.assertGreaterEqual(closed.memory(), 100 * 16)
+
+    def test_bitstate_saturates(self):
+        closed = BitstateTable(bits=3, hashes=1)
+        for state in self.states:
+            closed.add(state)
+        self.assertLessEqual(len(closed), 8)
+        self.assertGreater(closed.collision_probability(), 0.5)
+
+    def test_bad_parameters(self):
+        self.assertRaises(ClosedSetError, closedset.new_closed_set, 'UNKNOWN')
+        self.assertRaises(ClosedSetError, FingerprintTable, 32)
+        self.assertRaises(ClosedSetError, BitstateTable, 2)
+
+
+class ClosedSetSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_searches_with_every_mode(self):
+        w_memory = load_kb('gioco_otto_1')
+        for mode in closedset.MODES:
+            _, rules, _ = self.engine.breadth_first_search(w_memory, 30, closed=closedset.new_closed_set(mode))
+            self.assertEqual(len(rules), 10, mode)
+            _, rules, _ = self.engine.a_star_search(w_memory, 30, Engine.h_manhattan_distance, H_ATTRS,
+                                                    closed=closedset.new_closed_set(mode))
+            self.assertEqual(len(rules), 10, mode)
+            _, rules, _ = self.engine.depth_first_search(load_kb('dischi_1'), 30,
+                                                         closed=closedset.new_closed_set(mode))
+            self.assertIsNotNone(rules, mode)
+
+    def test_modes_are_rejected_where_unsupported(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertRaises(EngineError, self.engine.run, w_memory, Engine.ida_star_search, 30,
+                          Engine.h_manhattan_distance, H_ATTRS, closed='FINGERPRINT64')
+        self.assertRaises(EngineError, self.engine.run, w_memory, Engine.breadth_first_search, 30,
+                          workers=2, closed='BITSTATE')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from ESS.engine import Engine
+from ESS.shell import Shell
+from ESS import compiler
+from tests.util import load_kb
+
+
+def reachable_states(w_memory, limit):
+    states = [w_memory.initial_state]
+    seen = set(states)
+    for state in states:
+        if len(states) >= limit:
+            break
+        for rule, new_state in w_memory.network(state).successors(state):
+            if new_state not in seen:
+                seen.add(new_state)
+                states.append(new_state)
+    return states
+
+
+class CompilerTest(unittest.TestCase):
+
+    def test_compiled_rules_agree_with_interpreted_rules(self):
+        for name in ('gioco_otto_1', 'dischi_1', 'missionari', 'diagnosi'):
+            w_memory = load_kb(name)
+            for state in reachable_states(w_memory, 50):
+                for rule in w_memory.grounded_rules(state):
+                    compiled = compiler.CompiledRule(rule)
+                    interpreted = compiler.InterpretedRule(rule)
+                    self.assertEqual(compiled.match(state), interpreted.match(state), rule.name)
+                    if compiled.match(state):
+                        self.assertEqual(compiled.instantiate(state).consequent(state),
+                                         interpreted.instantiate(state).consequent(state))
+
+    def test_arithmetic_conclusion(self):
+        w_memory = load_kb('diagnosi')
+        state = w_memory.initial_state
+        rules = [rule for rule in w_memory.grounded_rules(state) if rule.name == 'sensore_fuori_soglia']
+        compiled = [compiler.CompiledRule(rule) for rule in rules]
+        matching = [rule for rule in compiled if rule.match(state)]
+        self.assertEqual(len(matching), 2)
+        new_state = matching[0].instantiate(state).consequent(state)
+        self.assertEqual(dict((fact.name, fact) for fact in new_state)['allarme']['livello'], 1)
+
+    def test_searches_agree(self):
+        w_memory = load_kb('gioco_otto_1')
+        compiled = Engine(compiled=True).breadth_first_search(w_memory, 30)
+        interpreted = Engine(compiled=False).breadth_first_search(w_memory, 30)
+        self.assertEqual([rule.name for rule in compiled[1]], [rule.name for rule in interpreted[1]])
+        self.assertEqual(compiled[2], interpreted[2])
+
+    def test_shell_toggle(self):
+        shell = Shell()
+        shell._handler_compile('OFF')
+        self.assertFalse(shell.engine.compiled)
+        shell._handler_compile('ON')
+        self.assertTrue(shell.engine.compiled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from ESS.container import FactContainer, NotExistentItemError
+from ESS.entity import Fact
+from ESS import analyzer
+from tests.util import load_kb
+
+
+def successors(w_memory, state):
+    return w_memory.network(state).successors(state)
+
+
+def rehashed(state):
+    new_state = FactContainer()
+    for fact in state:
+        new_fact = Fact(fact.name)
+        for attr, value in fact.items():
+            new_fact[attr] = value
+        new_state.add(new_fact)
+    return new_state
+
+
+def fact_values(state):
+    return dict((fact.name, dict(fact.items())) for fact in state)
+
+
+class SharingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.w_memory = load_kb('gioco_otto_1')
+        self.state = self.w_memory.initial_state
+
+    def test_unchanged_facts_are_shared(self):
+        for rule, new_state in successors(self.w_memory, self.state):
+            changed = set(conclusion.fact_name for conclusion in rule.consequent.conclusions)
+            for fact in new_state:
+                if fact.name in changed:
+                    self.assertIsNot(fact, self.state[fact.name])
+                else:
+                    self.assertIs(fact, self.state[fact.name])
+
+    def test_parent_is_not_modified(self):
+        before = fact_values(self.state)
+        for rule, new_state in successors(self.w_memory, self.state):
+            self.assertNotEqual(new_state, self.state)
+            successors(self.w_memory, new_state)
+        self.assertEqual(fact_values(self.state), before)
+
+    def test_child_copies_are_independent(self):
+        child = self.state.copy()
+        fact_name = iter(self.state).next().name
+        child.set_attribute(fact_name, 'extra', 1)
+        self.assertIsNone(self.state[fact_name]['extra'])
+        self.assertEqual(child[fact_name]['extra'], 1)
+        grandchild = child.copy()
+        grandchild.set_attribute(fact_name, 'extra', 2)
+        self.assertEqual(child[fact_name]['extra'], 1)
+        self.assertEqual(grandchild[fact_name]['extra'], 2)
+
+
+class HashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.w_memory = load_kb('gioco_otto_1')
+        self.state = self.w_memory.initial_state
+
+    def test_incremental_hash_matches_a_fresh_one(self):
+        states = [self.state]
+        for state in list(states):
+            for rule, new_state in successors(self.w_memory, state):
+                states.append(new_state)
+                for rule, grandchild in successors(self.w_memory, new_state):
+                    states.append(grandchild)
+        for state in states:
+            self.assertEqual(hash(state), hash(rehashed(state)))
+            self.assertEqual(state, rehashed(state))
+
+    def test_equal_states_reached_by_different_paths(self):
+        rule, child = successors(self.w_memory, self.state)[0]
+        for rule, grandchild in successors(self.w_memory, child):
+            if grandchild == self.state:
+                self.assertEqual(hash(grandchild), hash(self.state))
+                break
+        else:
+            self.fail("No move undoes the first one")
+
+    def test_mutations_update_the_hash(self):
+        state = self.state.copy()
+        hash(state)
+        fact_name = iter(state).next().name
+        state.set_attribute(fact_name, 'extra', 1)
+        self.assertEqual(hash(state), hash(rehashed(state)))
+        state.del_attribute(fact_name, 'extra')
+        self.assertEqual(hash(state), hash(self.state))
+        fact = Fact('extra_fact')
+        fact['v'] = 1
+        state.add(fact)
+        self.assertEqual(hash(state), hash(rehashed(state)))
+        state.remove('extra_fact')
+        self.assertEqual(hash(state), hash(self.state))
+
+
+class CopyOnWriteTest(unittest.TestCase):
+
+    def test_fact_container_copy(self):
+        state = load_kb('gioco_otto_1').initial_state
+        names = set(fact.name for fact in state)
+        new_state = state.copy()
+        removed = iter(names).next()
+        new_state.remove(removed)
+        fact = Fact('extra_fact')
+        new_state.add(fact)
+        self.assertEqual(set(fact.name for fact in state), names)
+        self.assertEqual(set(fact.name for fact in new_state), names - {removed} | {'extra_fact'})
+        self.assertRaises(NotExistentItemError, state.__getitem__, 'extra_fact')
+
+    def test_rule_container_copy(self):
+        rules = load_kb('diagnosi').rules
+        names = sorted(rule.name for rule in rules)
+        new_rules = rules.copy()
+        new_rules.remove('guasto_singolo')
+        self.assertEqual(sorted(rule.name for rule in rules), names)
+        self.assertNotIn('guasto_singolo', [rule.name for rule in new_rules])
+        rules.remove('impianto_regolare')
+        self.assertIn('impianto_regolare', [rule.name for rule in new_rules])
+
+    def test_rule_container_keeps_insertion_order(self):
+        w_memory = load_kb('dischi_1')
+        names = [rule.name for rule in w_memory.rules]
+        self.assertEqual([rule.name for rule in load_kb('dischi_1').rules], names)
+        grounded = [str(rule) for rule in analyzer.bind_rules(w_memory.rules, w_memory.initial_state)]
+        self.assertEqual([str(rule) for rule in analyzer.bind_rules(w_memory.rules, w_memory.initial_state)],
+                         grounded)
+        copied = w_memory.rules.copy()
+        copied.remove(names[0])
+        self.assertEqual([rule.name for rule in copied], names[1:])
+
+    def test_rule_container_update_merges_names(self):
+        w_memory = load_kb('diagnosi')
+        rules = load_kb('gioco_otto_1').rules
+        rules.update(w_memory.rules)
+        rules.remove('guasto_singolo')
+        self.assertNotIn('guasto_singolo', [rule.name for rule in rules])
+        self.assertIn('guasto_singolo', [rule.name for rule in w_memory.rules])
+
+    def test_evaluate_values_does_not_modify_the_rule(self):
+        w_memory = load_kb('diagnosi')
+        state = w_memory.initial_state
+        for rule in w_memory.grounded_rules(state):
+            before = [list(conclusion.arg_list) for conclusion in rule.consequent.conclusions]
+            evaluated = analyzer.evaluate_values(rule, state)
+            self.assertEqual([conclusion.arg_list for conclusion in rule.consequent.conclusions], before)
+            if rule.is_evaluated():
+                self.assertIs(evaluated, rule)
+            else:
+                self.assertIsNot(evaluated, rule)
+                self.assertTrue(evaluated.is_evaluated())
+                self.assertEqual(evaluated.consequent.conclusions[1].arg_list, ['livello', 1])
+                self.assertIs(evaluated.consequent.conclusions[0], rule.consequent.conclusions[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import pickle
+import unittest
+from ESS import entity
+from ESS.entity import Fact, SymbolTable
+
+
+def make_fact(name, **attrs):
+    fact = Fact(name)
+    for attr, value in sorted(attrs.items()):
+        fact[attr] = value
+    return fact
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.size = entity.ZOBRIST_CACHE_SIZE
+
+    def tearDown(self):
+        entity.ZOBRIST_CACHE_SIZE = self.size
+
+    def test_zobrist_cache_is_bounded(self):
+        entity.ZOBRIST_CACHE_SIZE = 100
+        keys = [entity.zobrist_key('fact', 'attr', i) for i in xrange(1000)]
+        self.assertLessEqual(len(entity._zobrist_keys), 100)
+        self.assertEqual(keys, [entity.zobrist_key('fact', 'attr', i) for i in xrange(1000)])
+
+    def test_symbol_table_is_bounded(self):
+        symbols = SymbolTable(capacity=10)
+        for i in xrange(100):
+            symbols.symbol('name_%s' % i)
+            symbols.schema(('attr_%s' % i,))
+        self.assertLessEqual(len(symbols), 10)
+        self.assertEqual(symbols.schema(('a', 'b')).names, ('a', 'b'))
+        symbols.clear()
+        self.assertEqual(len(symbols), 0)
+
+    def test_facts_survive_a_clear(self):
+        before = make_fact('casella_1', riga=1, colonna=2, contenuto='NIL')
+        entity.clear_caches()
+        after = make_fact('casella_1', riga=1, colonna=2, contenuto='NIL')
+        self.assertIsNot(before._schema, after._schema)
+        self.assertEqual(before, after)
+        self.assertEqual(hash(before), hash(after))
+        after['riga'] = 2
+        self.assertNotEqual(before, after)
+
+
+class FactTest(unittest.TestCase):
+
+    def test_facts_with_the_same_attributes_share_a_schema(self):
+        first = make_fact('casella_1', riga=1, colonna=2, contenuto=3)
+        second = make_fact('casella_2', riga=2, colonna=1, contenuto=4)
+        self.assertIs(first._schema, second._schema)
+        self.assertIs(first.name, entity.SYMBOLS.symbol('casella_1'))
+        self.assertFalse(hasattr(first, '__dict__'))
+
+    def test_attributes(self):
+        fact = make_fact('casella_1', riga=1, colonna=2)
+        self.assertEqual(fact['riga'], 1)
+        self.assertIsNone(fact['contenuto'])
+        fact['riga'] = 3
+        self.assertEqual(dict(fact.items()), {'riga': 3, 'colonna': 2})
+        del fact['colonna']
+        self.assertNotIn('colonna', fact)
+        self.assertEqual(fact, make_fact('casella_1', riga=3))
+        self.assertEqual(hash(fact), hash(make_fact('casella_1', riga=3)))
+
+    def test_attribute_order_does_not_matter(self):
+        first = Fact('f')
+        first['a'] = 1
+        first['b'] = 2
+        second = Fact('f')
+        second['b'] = 2
+        second['a'] = 1
+        self.assertIsNot(first._schema, second._schema)
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+
+    def test_copy_is_independent(self):
+        fact = make_fact('casella_1', riga=1)
+        new_fact = fact.copy()
+        new_fact['riga'] = 2
+        self.assertEqual(fact['riga'], 1)
+        self.assertNotEqual(hash(fact), hash(new_fact))
+
+    def test_pickle(self):
+        fact = make_fact('casella_1', riga=1, colonna=2, contenuto='NIL')
+        loaded = pickle.loads(pickle.dumps(fact, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(loaded, fact)
+        self.assertEqual(hash(loaded), hash(fact))
+        self.assertIs(loaded._schema, fact._schema)
+
+
+if __name__ == '__main__':
+    unittest.main()
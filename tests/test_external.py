@@ -0,0 +1,81 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine
+from ESS.budget import Budget
+from ESS import external
+from tests.util import load_kb
+
+
+class ExternalSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.scratch_dir = tempfile.mkdtemp()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+        self.merge_fanin = external.MERGE_FANIN
+
+    def tearDown(self):
+        external.MERGE_FANIN = self.merge_fanin
+        sys.stdout = self.stdout
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    def search(self, w_memory, max_depth, **options):
+        return external.external_breadth_first_search(self.engine, w_memory, max_depth,
+                                                      scratch_dir=self.scratch_dir, **options)
+
+    def assertSolves(self, w_memory, result, length):
+        arrival_state, rules, visited_cnt = result
+        self.assertEqual(len(rules), length)
+        state = w_memory.initial_state
+        for rule in rules:
+            state = rule.consequent(state)
+        self.assertEqual(state, w_memory.goal)
+        self.assertEqual(arrival_state, w_memory.goal)
+
+    def test_same_result_as_breadth_first(self):
+        for name, length in (('gioco_otto_1', 10), ('dischi_1', 5)):
+            w_memory = load_kb(name)
+            self.assertSolves(w_memory, self.search(w_memory, 30), length)
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+    def test_small_memory_budget_merges_runs(self):
+        external.MERGE_FANIN = 2
+        w_memory = load_kb('gioco_otto_1')
+        self.assertSolves(w_memory, self.search(w_memory, 30, memory_budget=1), 10)
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+    def test_max_depth_and_budget(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertIsNone(self.search(w_memory, 9)[1])
+        search_budget = Budget(0)
+        self.assertIsNone(self.search(w_memory, 30, budget=search_budget)[1])
+        self.assertEqual(search_budget.exhausted, 'time limit')
+
+    def test_encoding(self):
+        state = load_kb('gioco_otto_1').initial_state
+        decoded = external.decode(external.encode(state))
+        self.assertEqual(decoded, state)
+        self.assertEqual(hash(decoded), hash(state))
+
+    def test_equal_numbers_encode_the_same(self):
+        state = load_kb('gioco_otto_1').initial_state
+        floats = state.copy()
+        for fact in state:
+            if isinstance(fact['riga'], int):
+                floats.set_attribute(fact.name, 'riga', float(fact['riga']))
+                floats.set_attribute(fact.name, 'colonna', long(fact['colonna']))
+        self.assertEqual(floats, state)
+        self.assertEqual(external.encode(floats), external.encode(state))
+        halves = state.copy()
+        fact = iter(state).next()
+        halves.set_attribute(fact.name, 'riga', fact['riga'] + 0.5)
+        self.assertNotEqual(external.encode(halves), external.encode(state))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import sys
+import time
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine
+from ESS.engine import Agenda
+from ESS.shell import Shell
+from ESS.budget import Budget
+from tests.util import read_kb, load_text
+
+
+TOGGLE_KB = '''
+beginFact: flag
+v = 0
+endFact
+
+beginRule: on
+equal(flag, v, 0)
+then
+update(flag, v, 1)
+endRule
+
+beginRule: off
+equal(flag, v, 1)
+then
+update(flag, v, 0)
+endRule
+
+beginGoal:
+endGoal
+'''
+
+
+def fact_value(state, fact_name, attr):
+    return dict((fact.name, fact) for fact in state)[fact_name][attr]
+
+
+class ForwardChainingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.w_memory = load_text(TOGGLE_KB)
+
+    def test_cycle_limit(self):
+        state, rules_fired = self.engine.forward_chain(self.w_memory, 7)
+        self.assertEqual([rule.name for rule in rules_fired], ['on', 'off'] * 3 + ['on'])
+
+    def test_negative_integer_literals(self):
+        w_memory = load_text(TOGGLE_KB.replace('v = 0', 'v = -1').replace('update(flag, v, 0)', 'update(flag, v, -1)')
+                             .replace('equal(flag, v, 0)', 'equal(flag, v, -1)'))
+        self.assertEqual(fact_value(w_memory.initial_state, 'flag', 'v'), -1)
+        self.assertIsInstance(fact_value(w_memory.initial_state, 'flag', 'v'), int)
+        rules = dict((rule.name, rule) for rule in w_memory.rules)
+        self.assertEqual(rules['on'].antecedent.disjunctions[0].conditions[0].value, -1)
+        value = rules['off'].consequent.conclusions[0].arg_list[1]
+        self.assertEqual((value, type(value)), (-1, int))
+        state, rules_fired = self.engine.forward_chain(w_memory, 2)
+        value = fact_value(state, 'flag', 'v')
+        self.assertEqual((value, type(value)), (-1, int))
+
+    def test_deadline_stops_forward_chaining(self):
+        start_time = time.time()
+        state, rules_fired = self.engine.forward_chain(self.w_memory, budget=Budget(0.2))
+        self.assertLess(time.time() - start_time, 5)
+        self.assertGreater(len(rules_fired), 0)
+
+    def test_run_forward_reports_the_budget(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.engine.run_forward(self.w_memory, deadline=0.2)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertIn('TIME LIMIT REACHED', output)
+
+    def test_shell_budget_options(self):
+        shell = Shell()
+        shell.w_memory = self.w_memory
+        calls = []
+        shell.engine.run_forward = lambda *args, **options: calls.append(options)
+        shell._handler_run_Forward(deadline='1.5', max_memory='64')
+        self.assertEqual(calls, [{'deadline': 1.5, 'memory_limit': 64 << 20}])
+
+
+class RecognizeActTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.w_memory = load_text(read_kb('diagnosi'))
+
+    def test_conclusion_literals_are_typed(self):
+        rules = dict((rule.name, rule) for rule in self.w_memory.rules)
+        self.assertEqual(rules['guasto_multiplo'].consequent.conclusions[0].arg_list, ['esito', 3])
+        self.assertEqual(rules['sensore_fuori_soglia'].consequent.conclusions[1].arg_list,
+                         ['livello', '?a->livello+1'])
+
+    def test_salience(self):
+        rules = dict((rule.name, rule) for rule in self.w_memory.rules)
+        self.assertEqual(rules['guasto_multiplo'].salience, 10)
+        self.assertEqual(rules['guasto_singolo'].salience, 0)
+
+    def test_lex(self):
+        state, rules_fired = self.engine.forward_chain(self.w_memory, strategy='LEX')
+        self.assertEqual([rule.name for rule in rules_fired],
+                         ['sensore_fuori_soglia', 'sensore_fuori_soglia', 'guasto_multiplo'])
+        self.assertEqual(fact_value(state, 'diagnosi', 'esito'), 3)
+        self.assertEqual(fact_value(state, 'allarme', 'livello'), 2)
+
+    def test_mea(self):
+        state, rules_fired = self.engine.forward_chain(self.w_memory, strategy='MEA')
+        self.assertEqual([rule.name for rule in rules_fired],
+                         ['sensore_fuori_soglia', 'guasto_singolo', 'sensore_fuori_soglia', 'guasto_multiplo'])
+        self.assertEqual(fact_value(state, 'diagnosi', 'esito'), 3)
+
+    def test_interpreted_rules_fire_the_same(self):
+        compiled = self.engine.forward_chain(self.w_memory)
+        interpreted = Engine(compiled=False).forward_chain(self.w_memory)
+        self.assertEqual(interpreted[0], compiled[0])
+        self.assertEqual([rule.name for rule in interpreted[1]], [rule.name for rule in compiled[1]])
+
+    def test_agenda(self):
+        rules = sorted(self.w_memory.rules, key=lambda rule: rule.name)
+        agenda = Agenda()
+        for rule in rules:
+            self.assertTrue(agenda.push(rule, (0,), rule.name))
+        self.assertFalse(agenda.push(rules[0], (0,), rules[0].name))
+        agenda.discard(rules[-1].name)
+        self.assertEqual(len(agenda), len(rules) - 1)
+        self.assertEqual([agenda.pop() for _ in xrange(len(rules) - 1)], rules[-2::-1])
+        self.assertTrue(agenda.is_empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from ESS.parsing.parser import Parser
+from ESS.engine import Engine
+from ESS import analyzer
+from tests.util import load_text, load_kb
+
+
+MARK_KB = '''
+beginFact: c1
+tipo = "a"
+v = 0
+endFact
+beginFact: c2
+tipo = "b"
+v = 0
+endFact
+
+beginRule: mark
+equal(?x, tipo, "a")
+equal(?x, v, 0)
+then
+update(?x, v, 1)
+endRule
+
+beginGoal:
+endGoal
+'''
+
+SWAPPED_FACTS = '''
+beginFact: c1
+tipo = "b"
+v = 0
+endFact
+beginFact: c2
+tipo = "a"
+v = 0
+endFact
+'''
+
+REASSERT_KB = '''
+beginFact: x
+a = 1
+endFact
+beginFact: flag
+v = 0
+endFact
+
+beginRule: reassert
+equal(x, a, 1)
+equal(flag, v, 0)
+then
+retract(x)
+assert(x)
+add(x, m, 1)
+update(flag, v, 1)
+endRule
+
+beginRule: finish
+not_equal(?y, a, 1)
+equal(?y, m, 1)
+then
+update(flag, v, 2)
+endRule
+
+beginGoal:
+beginFact: x
+m = 1
+endFact
+beginFact: flag
+v = 2
+endFact
+endGoal
+'''
+
+
+def rule_names(rules):
+    return sorted(rule.name for rule in rules)
+
+
+class GroundingTest(unittest.TestCase):
+
+    def test_static_values_are_part_of_the_key(self):
+        w_memory = load_text(MARK_KB)
+        parser = Parser()
+        swapped = parser.parse_facts(parser.purify(SWAPPED_FACTS.splitlines()))
+        self.assertEqual(swapped.get_facts_names(), w_memory.initial_state.get_facts_names())
+        first = w_memory.grounded_rules(w_memory.initial_state)
+        second = w_memory.grounded_rules(swapped)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(str(first[0]), str(second[0]))
+        self.assertEqual(w_memory.groundings.misses, 2)
+
+    def test_retracting_rules_disable_static_pruning(self):
+        w_memory = load_text(REASSERT_KB)
+        self.assertEqual(analyzer.static_attributes(w_memory.rules, w_memory.initial_state), set())
+        self.assertEqual(rule_names(w_memory.grounded_rules(w_memory.initial_state)),
+                         ['finish', 'finish', 'reassert'])
+        for compiled in (True, False):
+            _, rules, _ = Engine(compiled).breadth_first_search(load_text(REASSERT_KB), 10)
+            self.assertEqual([rule.name for rule in rules], ['reassert', 'finish'])
+
+    def test_example_still_solved(self):
+        w_memory = load_kb('gioco_otto_1')
+        _, rules, _ = Engine().breadth_first_search(w_memory, 10)
+        self.assertEqual(len(rules), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
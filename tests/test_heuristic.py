@@ -0,0 +1,84 @@
+import unittest
+from ESS.engine import Engine
+from ESS import heuristic
+from tests.util import H_ATTRS, load_kb
+
+
+def manhattan_distance(state, goal):
+    value, x, y = H_ATTRS
+    distance = 0
+    for fact in state:
+        for goal_fact in goal:
+            if fact[value] == goal_fact[value]:
+                distance += abs(fact[x]-goal_fact[x]) + abs(fact[y]-goal_fact[y])
+    return distance
+
+
+def linear_conflict(state, goal):
+    value, x, y = H_ATTRS
+    rows = {}
+    for fact in state:
+        for goal_fact in goal:
+            if fact[value] == goal_fact[value] and fact[x] == goal_fact[x] and fact[y] != goal_fact[y]:
+                row = rows.setdefault(fact[x], {})
+                offset = abs(fact[y]-goal_fact[y])
+                row[offset] = row.get(offset, 0) + 1
+    conflicts = sum(1 for row in rows.itervalues() for count in row.itervalues() if count == 2)
+    return manhattan_distance(state, goal) + conflicts*2
+
+
+def hamming_distance(state, goal):
+    return sum(1 for fact in state if fact != goal[fact.name])
+
+
+def edges(w_memory, limit):
+    states = [w_memory.initial_state]
+    seen = set(states)
+    for state in states:
+        if len(states) >= limit:
+            break
+        for rule, new_state in w_memory.network(state).successors(state):
+            yield state, rule, new_state
+            if new_state not in seen:
+                seen.add(new_state)
+                states.append(new_state)
+
+
+class HeuristicTest(unittest.TestCase):
+
+    def check(self, h, reference, name):
+        w_memory = load_kb(name)
+        self.assertEqual(h(w_memory.goal), 0)
+        for state, rule, new_state in edges(w_memory, 200):
+            self.assertEqual(h(state), reference(state, w_memory.goal))
+            self.assertEqual(h.update(state, h(state), rule, new_state), reference(new_state, w_memory.goal))
+
+    def test_manhattan_distance(self):
+        for name in ('gioco_otto_1', 'gioco_otto_3'):
+            h = Engine().make_heuristic(load_kb(name), Engine.h_manhattan_distance, H_ATTRS)
+            self.assertIsInstance(h, heuristic.ManhattanDistance)
+            self.check(h, manhattan_distance, name)
+
+    def test_linear_conflict(self):
+        for name in ('gioco_otto_1', 'gioco_otto_3'):
+            h = Engine().make_heuristic(load_kb(name), Engine.h_linear_conflict, H_ATTRS)
+            self.assertIsInstance(h, heuristic.LinearConflict)
+            self.check(h, linear_conflict, name)
+
+    def test_hamming_distance(self):
+        for name in ('gioco_otto_1', 'dischi_1'):
+            h = Engine().make_heuristic(load_kb(name), Engine.h_hamming_distance)
+            self.assertIsInstance(h, heuristic.HammingDistance)
+            self.check(h, hamming_distance, name)
+
+    def test_engine_functions(self):
+        w_memory = load_kb('gioco_otto_3')
+        state, goal = w_memory.initial_state, w_memory.goal
+        engine = Engine()
+        self.assertEqual(engine.h_manhattan_distance(state, goal, H_ATTRS), manhattan_distance(state, goal))
+        self.assertEqual(engine.h_linear_conflict(state, goal, H_ATTRS), linear_conflict(state, goal))
+        self.assertEqual(engine.h_hamming_distance(state, goal), hamming_distance(state, goal))
+
+
+if __name__ == '__main__':
+    unittest.main()
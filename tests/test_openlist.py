@@ -0,0 +1,108 @@
+import re
+import unittest
+from ESS.engine import Engine, SearchNode
+from ESS import openlist
+from ESS.openlist import BucketQueue, HeapQueue, EmptyOpenListError
+from tests.util import H_ATTRS, read_kb, load_text
+
+
+def half_misplaced(engine, state, goal):
+    misplaced = sum(1 for fact in state if fact != goal[fact.name])
+    if misplaced % 2:
+        return misplaced / 2.0
+    return misplaced // 2
+
+
+class RecordingEngine(Engine):
+
+    def _new_open_list(self, h, root, weight=1):
+        self.chosen = Engine._new_open_list(self, h, root, weight)
+        return self.chosen
+
+
+class OpenListTest(unittest.TestCase):
+
+    def solve(self, search, w_memory, *args, **options):
+        engine = RecordingEngine()
+        _, rules, _ = search(engine, w_memory, 100, *args, **options)
+        return type(engine.chosen), len(rules)
+
+    def test_new_open_list(self):
+        self.assertIsInstance(openlist.new_open_list(True), BucketQueue)
+        self.assertIsInstance(openlist.new_open_list(False), HeapQueue)
+        self.assertTrue(openlist.is_integral(3))
+        self.assertFalse(openlist.is_integral(3.0))
+        self.assertFalse(openlist.is_integral(True))
+
+    def test_integral_heuristics_use_buckets(self):
+        w_memory = load_text(read_kb('gioco_otto_1'))
+        self.assertEqual(self.solve(Engine.a_star_search, w_memory, Engine.h_manhattan_distance, H_ATTRS),
+                         (BucketQueue, 10))
+        self.assertEqual(self.solve(Engine.a_star_search, w_memory, Engine.h_hamming_distance),
+                         (BucketQueue, 10))
+
+    def test_float_weight_uses_heap(self):
+        w_memory = load_text(read_kb('gioco_otto_1'))
+        queue, _ = self.solve(Engine.weighted_a_star_search, w_memory, Engine.h_manhattan_distance, H_ATTRS,
+                              weight=1.5)
+        self.assertIs(queue, HeapQueue)
+
+    def test_float_coordinates_use_heap(self):
+        text = re.sub(r'(riga|colonna) = (\d)', r'\1 = \2.0', read_kb('gioco_otto_1'))
+        w_memory = load_text(text)
+        self.assertEqual(self.solve(Engine.a_star_search, w_memory, Engine.h_manhattan_distance, H_ATTRS),
+                         (HeapQueue, 10))
+
+    def test_custom_heuristic_with_integral_root(self):
+        w_memory = load_text(read_kb('gioco_otto_1'))
+        self.assertEqual(half_misplaced(Engine(), w_memory.initial_state, w_memory.goal), 2)
+        queue, length = self.solve(Engine.a_star_search, w_memory, half_misplaced)
+        self.assertIs(queue, HeapQueue)
+        self.assertEqual(length, 10)
+
+
+class QueueTest(unittest.TestCase):
+
+    def nodes(self, *specs):
+        nodes = []
+        for state, g, h in specs:
+            node = SearchNode(state, h=h)
+            node.g = g
+            nodes.append(node)
+        return nodes
+
+    def test_order(self):
+        for queue in (BucketQueue(), HeapQueue()):
+            a, b, c, d = self.nodes(('a', 0, 3), ('b', 1, 2), ('c', 2, 1), ('d', 0, 1))
+            for node in (a, b, c, d):
+                self.assertTrue(queue.push(node, node.g + node.h))
+            self.assertEqual(len(queue), 4)
+            self.assertEqual([queue.pop() for _ in xrange(4)], [d, c, b, a])
+            self.assertRaises(EmptyOpenListError, queue.pop)
+
+    def test_ties_break_on_the_latest_node(self):
+        for queue in (BucketQueue(), HeapQueue()):
+            nodes = self.nodes(*[(i, 0, 1) for i in xrange(5)])
+            for node in nodes:
+                queue.push(node, 1)
+            self.assertEqual([queue.pop() for _ in xrange(5)], nodes[::-1])
+
+    def test_worse_duplicates_are_ignored_and_better_ones_replace(self):
+        for queue in (BucketQueue(), HeapQueue()):
+            first, worse, better = self.nodes(('s', 3, 1), ('s', 4, 1), ('s', 1, 1))
+            self.assertTrue(queue.push(first, 4))
+            self.assertFalse(queue.push(worse, 5))
+            self.assertTrue(queue.push(better, 2))
+            self.assertIs(queue.get('s'), better)
+            self.assertEqual(queue.entries(), [(better, 2)])
+            self.assertIs(queue.pop(), better)
+            self.assertFalse(queue)
+
+    def test_bucket_queue_rejects_non_integral_priorities(self):
+        node, = self.nodes(('s', 0, 1))
+        self.assertRaises(ValueError, BucketQueue().push, node, 1.5)
+        self.assertRaises(ValueError, BucketQueue().push, node, -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
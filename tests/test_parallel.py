@@ -0,0 +1,62 @@
+import sys
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine, EngineError
+from ESS.budget import Budget
+from ESS import parallel
+from tests.util import H_ATTRS, load_kb
+
+
+class ParallelSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def assertSolves(self, w_memory, result, length):
+        arrival_state, rules, visited_cnt = result
+        self.assertEqual(len(rules), length)
+        state = w_memory.initial_state
+        for rule in rules:
+            state = rule.consequent(state)
+        self.assertEqual(state, w_memory.goal)
+        self.assertEqual(arrival_state, w_memory.goal)
+
+    def test_hda_star_is_optimal(self):
+        for name, length in (('gioco_otto_1', 10), ('gioco_otto_3', 18)):
+            w_memory = load_kb(name)
+            for workers in (1, 3):
+                result = parallel.hda_star_search(self.engine, w_memory, 30, workers,
+                                                  Engine.h_manhattan_distance, H_ATTRS)
+                self.assertSolves(w_memory, result, length)
+
+    def test_breadth_first(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertSolves(w_memory, parallel.hda_star_search(self.engine, w_memory, 30, 2), 10)
+
+    def test_unsolvable_within_max_depth(self):
+        w_memory = load_kb('gioco_otto_1')
+        arrival_state, rules, visited_cnt = parallel.hda_star_search(self.engine, w_memory, 9, 2,
+                                                                     Engine.h_manhattan_distance, H_ATTRS)
+        self.assertIsNone(rules)
+        self.assertGreater(visited_cnt, 0)
+
+    def test_budget(self):
+        w_memory = load_kb('gioco_otto_3')
+        search_budget = Budget(0)
+        arrival_state, rules, visited_cnt = parallel.hda_star_search(self.engine, w_memory, 30, 2,
+                                                                     budget=search_budget)
+        self.assertIsNone(rules)
+        self.assertEqual(search_budget.exhausted, 'time limit')
+
+    def test_only_for_a_star_and_breadth_first(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertRaises(EngineError, self.engine.run, w_memory, Engine.depth_first_search, 30, workers=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
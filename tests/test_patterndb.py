@@ -0,0 +1,116 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine
+from ESS.shell import Shell
+from ESS import batch
+from ESS import patterndb
+from tests.util import kb_path, read_kb, load_text, load_file, load_kb
+
+H_ATTRS = ('contenuto', 'riga', 'colonna', (1, 2, 3))
+BLANK_H_ATTRS = ('contenuto', 'riga', 'colonna', (1, 2, 3, 8, 'NIL'))
+PDB_ASTAR = 'AStar:PATTERNDB:contenuto,riga,colonna:1,2,3'
+
+
+class PatternDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.kb_path = os.path.join(self.directory, 'gioco_otto_3.txt')
+        shutil.copy(kb_path('gioco_otto_3'), self.kb_path)
+        self.home = os.environ.get('HOME')
+        os.environ['HOME'] = os.path.join(self.directory, 'home')
+
+    def tearDown(self):
+        if self.home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.home
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_without_directory_nothing_is_written(self):
+        w_memory = load_file(self.kb_path)
+        pdb = patterndb.load(w_memory, H_ATTRS)
+        self.assertEqual(pdb(w_memory.goal), 0)
+        self.assertEqual(pdb(w_memory.initial_state), 12)
+        self.assertEqual(os.listdir(self.directory), ['gioco_otto_3.txt'])
+
+    def test_saved_in_the_given_directory(self):
+        w_memory = load_file(self.kb_path)
+        pdb_dir = os.path.join(self.directory, 'pdb')
+        built = patterndb.load(w_memory, H_ATTRS, pdb_dir)
+        self.assertEqual(len(os.listdir(pdb_dir)), 1)
+        loaded = patterndb.load(w_memory, H_ATTRS, pdb_dir)
+        self.assertEqual(built(w_memory.initial_state), 12)
+        self.assertEqual(loaded(w_memory.initial_state), 12)
+
+    def test_cache_directory(self):
+        self.assertEqual(patterndb.cache_directory(self.kb_path),
+                         os.path.join(self.directory, patterndb.CACHE_DIRECTORY))
+
+    def test_shell_uses_the_kb_directory_unless_given_one(self):
+        shell = Shell()
+        self.assertIsNone(shell.engine.pattern_db_dir)
+        shell._handler_load(self.kb_path)
+        self.assertEqual(shell.engine.pattern_db_dir, patterndb.cache_directory(self.kb_path))
+        pdb_dir = os.path.join(self.directory, 'pdb')
+        shell._handler_pattern_db(pdb_dir)
+        shell._handler_load(self.kb_path)
+        self.assertEqual(shell.engine.pattern_db_dir, pdb_dir)
+
+    def test_batch(self):
+        out = StringIO()
+        self.assertEqual(batch.solve_all(PDB_ASTAR, [self.kb_path], out=out), 1)
+        self.assertEqual(len(os.listdir(patterndb.cache_directory(self.kb_path))), 1)
+        pdb_dir = os.path.join(self.directory, 'pdb')
+        self.assertEqual(batch.solve_all(PDB_ASTAR, [self.kb_path], out=out, pattern_db_dir=pdb_dir), 1)
+        self.assertEqual(len(os.listdir(pdb_dir)), 1)
+        self.assertFalse(os.path.exists(os.environ['HOME']))
+
+
+class HeuristicValueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_values(self):
+        for name, h in (('gioco_otto_1', 6), ('gioco_otto_3', 14)):
+            w_memory = load_kb(name)
+            pdb = patterndb.load(w_memory, BLANK_H_ATTRS)
+            self.assertEqual(pdb(w_memory.initial_state), h)
+            self.assertEqual(pdb(w_memory.goal), 0)
+
+    def test_blank_is_kept_when_the_pattern_omits_it(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertEqual(patterndb.rule_values(w_memory.rules, 'contenuto'), {'NIL'})
+        pdb = patterndb.load(w_memory, ('contenuto', 'riga', 'colonna', (4, 5, 6, 7)))
+        self.assertEqual(pdb(w_memory.initial_state), 10)
+        known = sum(1 for distance in pdb._table if distance != patterndb.UNKNOWN)
+        self.assertEqual(known, 9 * 8 * 7 * 6)
+
+    def test_a_star_paths_are_as_long_as_breadth_first(self):
+        engine = Engine()
+        for name in ('gioco_otto_1', 'gioco_otto_2'):
+            w_memory = load_kb(name)
+            pdb = patterndb.load(w_memory, H_ATTRS)
+            _, rules, _ = engine.a_star_search(w_memory, 30, Engine.h_pattern_database, pdb)
+            _, bfs_rules, _ = engine.breadth_first_search(w_memory, 30)
+            self.assertEqual(len(rules), len(bfs_rules))
+
+    def test_goal_without_predecessors(self):
+        text = read_kb('gioco_otto_1')
+        goal_start = text.index('beginGoal:')
+        text = text[:goal_start] + text[goal_start:].replace('contenuto = NIL', 'contenuto = 9')
+        w_memory = load_text(text)
+        self.assertRaises(patterndb.PatternDatabaseError, patterndb.load, w_memory, H_ATTRS)
+
+
+if __name__ == '__main__':
+    unittest.main()
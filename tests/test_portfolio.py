@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import time
+import unittest
+from ESS.engine import Engine
+from ESS.shell import Shell
+from ESS import portfolio
+from tests.util import load_kb
+
+
+def stalled_search(engine, w_memory, max_depth, budget=None):
+    budget.expired(1000)
+    while True:
+        time.sleep(1)
+
+
+def dying_search(engine, w_memory, max_depth, budget=None):
+    budget.expired(500)
+    os._exit(1)
+
+
+class PortfolioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.w_memory = load_kb('gioco_otto_1')
+        self.cancel_grace = portfolio.CANCEL_GRACE
+        portfolio.CANCEL_GRACE = 0.5
+
+    def tearDown(self):
+        portfolio.CANCEL_GRACE = self.cancel_grace
+
+    def strategies(self, *specs):
+        return [Shell().parse_strategy(spec) for spec in specs]
+
+    def test_winner(self):
+        strategies = self.strategies('BFS', 'AStar:MANHATTANDISTANCE:contenuto,riga,colonna')
+        winner, outcomes = portfolio.race(self.engine, self.w_memory, strategies)
+        self.assertIsNotNone(winner)
+        self.assertEqual(outcomes[winner].status, 'solved')
+        self.assertEqual(len(outcomes[winner].rules), 10)
+
+    def test_best(self):
+        strategies = self.strategies('DFS:30', 'AStar:MANHATTANDISTANCE:contenuto,riga,colonna')
+        winner, outcomes = portfolio.race(self.engine, self.w_memory, strategies, best=True)
+        self.assertEqual(len(outcomes[winner].rules), 10)
+
+    def test_unresponsive_racers_report_visited_nodes(self):
+        strategies = [(stalled_search, 10, None, None), (dying_search, 10, None, None)]
+        winner, outcomes = portfolio.race(self.engine, self.w_memory, strategies, deadline=0.2)
+        self.assertIsNone(winner)
+        self.assertEqual(outcomes[0].status, 'cancelled')
+        self.assertEqual(outcomes[0].visited_cnt, 1000)
+        self.assertEqual(outcomes[1].status, 'error: racer died')
+        self.assertEqual(outcomes[1].visited_cnt, 500)
+
+    def test_racer_budget_reports_visited_nodes(self):
+        stop = multiprocessing.Value('b', 0)
+        counters = multiprocessing.Array('l', 1, lock=False)
+        racer_budget = portfolio._RacerBudget(None, None, stop, counters, 0)
+        arrival_state, rules, visited_cnt = \
+            Engine.ida_star_search(self.engine, self.w_memory, 30, Engine.h_manhattan_distance,
+                                   ['contenuto', 'riga', 'colonna'], budget=racer_budget)
+        self.assertEqual(len(rules), 10)
+        self.assertEqual(counters[0], visited_cnt - 1)
+        stop.value = 1
+        self.assertTrue(racer_budget.expired(visited_cnt))
+        self.assertEqual(racer_budget.exhausted, 'cancelled')
+        self.assertEqual(counters[0], visited_cnt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import random
+import unittest
+from ESS.engine import Engine
+from ESS import entity
+from tests.util import load_kb
+
+WALK_LENGTH = 40
+
+
+class ReteNetworkTest(unittest.TestCase):
+
+    def walk(self, name, compiled=True):
+        w_memory = load_kb(name)
+        state = w_memory.initial_state
+        network = w_memory.network(state, compiled)
+        conflict_set = network.match(state)
+        rng = random.Random(name)
+        for _ in xrange(WALK_LENGTH):
+            yield network, state, conflict_set
+            successors = network.successors(state, conflict_set)
+            if not successors:
+                return
+            rule, state = rng.choice(successors)
+            new_network = w_memory.network(state, compiled)
+            if new_network is network:
+                conflict_set = network.rematch(state, conflict_set, rule)
+            else:
+                network = new_network
+                conflict_set = network.match(state)
+
+    def test_rematch_agrees_with_match(self):
+        for name in ('gioco_otto_1', 'dischi_1', 'missionari'):
+            for compiled in (True, False):
+                for network, state, conflict_set in self.walk(name, compiled):
+                    self.assertEqual(conflict_set, network.match(state))
+
+    def test_alpha_memory_only_touches_readers(self):
+        w_memory = load_kb('gioco_otto_1')
+        network = w_memory.network(w_memory.initial_state)
+        conflict_set = network.match(w_memory.initial_state)
+        rule, state = network.successors(w_memory.initial_state, conflict_set)[0]
+        affected = set()
+        for conclusion in rule.consequent.conclusions:
+            affected.update(network._alpha.get((conclusion.fact_name, conclusion.arg_list[0]), ()))
+        self.assertLess(len(affected), len(network))
+        self.assertEqual(network.rematch(state, conflict_set, rule), network.match(state))
+
+    def test_network_is_shared_between_states_with_the_same_facts(self):
+        w_memory = load_kb('gioco_otto_1')
+        network = w_memory.network(w_memory.initial_state)
+        for rule, state in network.successors(w_memory.initial_state):
+            self.assertIs(w_memory.network(state), network)
+
+    def test_searches_find_shortest_paths(self):
+        engine = Engine()
+        for name, length in (('gioco_otto_0', 5), ('gioco_otto_1', 10), ('dischi_1', 5)):
+            w_memory = load_kb(name)
+            state, rules, visited_cnt = engine.breadth_first_search(w_memory, 30)
+            self.assertEqual(len(rules), length)
+            self.assertEqual(state, w_memory.goal)
+            self.assertIsInstance(rules[0], entity.Rule)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import unittest
+from StringIO import StringIO
+from ESS.engine import Engine, EngineError, SearchNode
+from ESS.budget import Budget
+from tests.util import H_ATTRS, load_kb
+
+VISITED_SCRIPT = '''import os, sys
+from ESS.engine import Engine
+from tests.util import load_kb
+sys.stdout = open(os.devnull, 'w')
+visited_cnt = Engine().breadth_first_search(load_kb('dischi_1'), 40)[2]
+sys.stdout = sys.__stdout__
+print visited_cnt
+'''
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def assertSolves(self, w_memory, result, length=None):
+        arrival_state, rules, visited_cnt = result
+        self.assertIsNotNone(rules)
+        if length is not None:
+            self.assertEqual(len(rules), length)
+        state = w_memory.initial_state
+        for rule in rules:
+            state = rule.consequent(state)
+        self.assertEqual(state, w_memory.goal)
+        self.assertEqual(arrival_state, w_memory.goal)
+        self.assertGreater(visited_cnt, 0)
+
+    def test_search_node_path(self):
+        w_memory = load_kb('gioco_otto_0')
+        root = SearchNode(w_memory.initial_state)
+        rule, state = w_memory.network(root.state).successors(root.state)[0]
+        node = root
+        for _ in xrange(3):
+            node = SearchNode(rule.consequent(node.state), node, rule)
+        self.assertEqual(node.depth, 3)
+        self.assertEqual(node.g, 3)
+        self.assertEqual(node.path(), [rule] * 3)
+        self.assertEqual(root.path(), [])
+
+    def test_uninformed_searches(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertSolves(w_memory, self.engine.breadth_first_search(w_memory, 30), 10)
+        w_memory = load_kb('dischi_1')
+        self.assertSolves(w_memory, self.engine.depth_first_search(w_memory, 30))
+
+    def test_informed_searches(self):
+        for name, length in (('gioco_otto_1', 10), ('gioco_otto_3', 18)):
+            w_memory = load_kb(name)
+            self.assertSolves(w_memory, self.engine.a_star_search(w_memory, 30, Engine.h_manhattan_distance,
+                                                                  H_ATTRS), length)
+            self.assertSolves(w_memory, self.engine.best_first_search(w_memory, 100, Engine.h_manhattan_distance,
+                                                                      H_ATTRS))
+
+    def test_iterative_deepening(self):
+        for name, length in (('gioco_otto_0', 5), ('gioco_otto_1', 10), ('dischi_1', 5)):
+            w_memory = load_kb(name)
+            self.assertSolves(w_memory, self.engine.iterative_deepening_search(w_memory, 30), length)
+
+    def test_ida_star(self):
+        for name, length in (('gioco_otto_1', 10), ('gioco_otto_3', 18)):
+            w_memory = load_kb(name)
+            for h_fun in (Engine.h_manhattan_distance, Engine.h_linear_conflict):
+                self.assertSolves(w_memory, self.engine.ida_star_search(w_memory, 30, h_fun, H_ATTRS), length)
+
+    def test_iterative_deepening_respects_max_depth(self):
+        w_memory = load_kb('gioco_otto_1')
+        arrival_state, rules, visited_cnt = self.engine.iterative_deepening_search(w_memory, 9)
+        self.assertIsNone(rules)
+        arrival_state, rules, visited_cnt = self.engine.ida_star_search(w_memory, 9, Engine.h_manhattan_distance,
+                                                                        H_ATTRS)
+        self.assertIsNone(rules)
+
+    def test_weighted_a_star(self):
+        w_memory = load_kb('gioco_otto_3')
+        for weight in (1, 1.5, 3):
+            arrival_state, rules, visited_cnt = self.engine.weighted_a_star_search(
+                    w_memory, 60, Engine.h_manhattan_distance, H_ATTRS, weight)
+            self.assertSolves(w_memory, (arrival_state, rules, visited_cnt))
+            self.assertLessEqual(len(rules), 18 * weight)
+            if weight == 1:
+                self.assertEqual(len(rules), 18)
+
+    def test_beam(self):
+        w_memory = load_kb('gioco_otto_3')
+        self.assertSolves(w_memory, self.engine.beam_search(w_memory, 60, Engine.h_manhattan_distance, H_ATTRS,
+                                                            width=100))
+        arrival_state, rules, visited_cnt = self.engine.beam_search(w_memory, 60, Engine.h_manhattan_distance,
+                                                                    H_ATTRS, width=1)
+        self.assertLessEqual(visited_cnt, 61)
+
+    def test_anytime_weighted_a_star_improves_the_solution(self):
+        w_memory = load_kb('gioco_otto_2')
+        search_budget = Budget(60)
+        self.assertSolves(w_memory, self.engine.anytime_weighted_a_star_search(
+                w_memory, 60, Engine.h_manhattan_distance, H_ATTRS, 10, budget=search_budget), 16)
+        costs = [int(line.split()[3].rstrip(',')) for line in sys.stdout.getvalue().splitlines()
+                 if line.startswith('Solution found')]
+        self.assertGreater(len(costs), 1)
+        self.assertEqual(costs, sorted(costs, reverse=True))
+        self.assertEqual(search_budget.cost, 16)
+        self.assertTrue(search_budget.proven())
+
+    def test_anytime_weighted_a_star_reports_bounds_when_stopped(self):
+        w_memory = load_kb('gioco_otto_3')
+        search_budget = Budget(0)
+        self.engine.anytime_weighted_a_star_search(w_memory, 60, Engine.h_manhattan_distance, H_ATTRS, 3,
+                                                   budget=search_budget)
+        self.assertEqual(search_budget.exhausted, 'time limit')
+        self.assertIsNone(search_budget.cost)
+        self.assertLessEqual(search_budget.lower_bound, 18)
+
+    def test_weight_and_width_options(self):
+        w_memory = load_kb('gioco_otto_1')
+        self.assertRaises(EngineError, self.engine.run, w_memory, Engine.a_star_search, 30,
+                          Engine.h_manhattan_distance, H_ATTRS, weight=2)
+        self.assertRaises(EngineError, self.engine.run, w_memory, Engine.weighted_a_star_search, 30,
+                          Engine.h_manhattan_distance, H_ATTRS, width=2)
+
+    def test_max_depth(self):
+        w_memory = load_kb('gioco_otto_1')
+        arrival_state, rules, visited_cnt = self.engine.breadth_first_search(w_memory, 9)
+        self.assertIsNone(rules)
+
+    def test_searches_are_deterministic(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        counts = [int(subprocess.check_output([sys.executable, '-c', VISITED_SCRIPT], cwd=root))
+                  for _ in xrange(2)]
+        counts.append(self.engine.breadth_first_search(load_kb('dischi_1'), 40)[2])
+        self.assertEqual(counts, [counts[0]] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
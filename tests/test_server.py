@@ -0,0 +1,271 @@
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from ESS.client import Client, ClientError, parse_address, parse_field
+from ESS.loadgen import LoadGenerator, percentile
+from ESS import server
+from ESS.server import QueryServer
+from tests.util import kb_path, read_kb
+
+ASTAR = 'AStar:MANHATTANDISTANCE:contenuto,riga,colonna'
+
+
+def stuck_run(task):
+    time.sleep(30)
+
+
+class ServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.address = os.path.join(cls.directory, 'ess.sock')
+        cls.kb_dir = os.path.join(cls.directory, 'kbs')
+        os.mkdir(cls.kb_dir)
+        shutil.copy(kb_path('gioco_otto_0'), cls.kb_dir)
+        with open(os.path.join(cls.kb_dir, 'broken.txt'), 'w') as f:
+            f.write('beginFact: secret\nsecret line\nendFact\n')
+        cls.server = QueryServer(workers=1, kb_dir=cls.kb_dir)
+        cls.server.load('gioco_otto_1', read_kb('gioco_otto_1'))
+        cls.server.load('gioco_otto_3', read_kb('gioco_otto_3'))
+        cls.thread = threading.Thread(target=cls.server.serve_forever, args=(cls.address,))
+        cls.thread.daemon = True
+        cls.thread.start()
+        for _ in xrange(100):
+            try:
+                Client(cls.address).close()
+                break
+            except ClientError:
+                time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join(5)
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client(self.address)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_list(self):
+        response = self.client.request('list')
+        self.assertTrue(response['ok'])
+        names = [kb['name'] for kb in response['kbs']]
+        self.assertIn('gioco_otto_1', names)
+        self.assertIn('gioco_otto_3', names)
+
+    def test_run(self):
+        response = self.client.request('run', kb='gioco_otto_1', strategy=ASTAR)
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['status'], 'solved')
+        self.assertEqual(response['path_length'], 10)
+        self.assertEqual(len(response['path']), 10)
+
+    def test_errors(self):
+        self.assertFalse(self.client.request('run', kb='missing', strategy='BFS')['ok'])
+        self.assertFalse(self.client.request('run', kb='gioco_otto_1', strategy='Unknown')['ok'])
+        self.assertFalse(self.client.request('unknown')['ok'])
+
+    def test_reload_is_not_served_from_worker_cache(self):
+        first = self.client.request('load', kb='reloaded', text=read_kb('gioco_otto_1'))
+        self.assertEqual(self.client.request('run', kb='reloaded', strategy=ASTAR)['path_length'], 10)
+        second = self.client.request('load', kb='reloaded', text=read_kb('gioco_otto_0'))
+        self.assertGreater(second['version'], first['version'])
+        self.assertEqual(self.client.request('run', kb='reloaded', strategy=ASTAR)['path_length'], 5)
+
+    def test_assert_and_retract(self):
+        self.client.request('load', kb='edited', text=read_kb('gioco_otto_0'))
+        fact = 'beginFact: casella_1\nriga = 1\ncolonna = 1\ncontenuto = 2\nendFact\n'
+        retracted = self.client.request('retract', kb='edited', facts=['casella_1'])
+        self.assertTrue(retracted['ok'])
+        self.assertEqual(self.client.request('run', kb='edited', strategy='BFS:10')['status'], 'failed')
+        asserted = self.client.request('assert', kb='edited', text=fact)
+        self.assertGreater(asserted['version'], retracted['version'])
+        self.assertEqual(self.client.request('run', kb='edited', strategy='BFS:10')['path_length'], 5)
+
+    def test_retract_is_atomic(self):
+        loaded = self.client.request('load', kb='atomic', text=read_kb('gioco_otto_0'))
+        response = self.client.request('retract', kb='atomic', facts=['casella_1', 'missing'])
+        self.assertFalse(response['ok'])
+        self.assertIn('missing', response['error'])
+        kb = [kb for kb in self.client.request('list')['kbs'] if kb['name'] == 'atomic'][0]
+        self.assertEqual(kb['facts'], 9)
+        self.assertEqual(kb['version'], loaded['version'])
+        self.assertEqual(self.client.request('run', kb='atomic', strategy=ASTAR)['path_length'], 5)
+
+    def test_load_path(self):
+        response = self.client.request('load', kb='by_path', path='gioco_otto_0.txt')
+        self.assertTrue(response['ok'])
+        self.assertEqual(self.client.request('run', kb='by_path', strategy=ASTAR)['path_length'], 5)
+
+    def test_load_path_outside_kb_dir(self):
+        for filepath in ('/etc/passwd', '../ess.sock', kb_path('gioco_otto_1')):
+            response = self.client.request('load', kb='outside', path=filepath)
+            self.assertFalse(response['ok'])
+            self.assertIn('outside', response['error'])
+
+    def test_load_rejects_invalid_knowledge_bases(self):
+        response = self.client.request('load', kb='broken', path='broken.txt')
+        self.assertFalse(response['ok'])
+        self.assertNotIn('secret', response['error'])
+        self.assertFalse(self.client.request('load', kb='empty', text='# nothing here\n')['ok'])
+        names = [kb['name'] for kb in self.client.request('list')['kbs']]
+        self.assertNotIn('broken', names)
+        self.assertNotIn('empty', names)
+
+    def test_timeout(self):
+        response = self.client.request('run', kb='gioco_otto_3', strategy='BFS', timeout=0.2)
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['status'], 'time limit')
+
+    def test_pattern_database_build_respects_the_timeout(self):
+        start_time = time.time()
+        response = self.client.request('run', kb='gioco_otto_3', timeout=0.2,
+                                       strategy='AStar:PATTERNDB:contenuto,riga,colonna:1,2,3,4,5,6')
+        self.assertLess(time.time() - start_time, 5)
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['status'], 'time limit')
+        self.assertEqual(self.client.request('run', kb='gioco_otto_1', strategy=ASTAR)['path_length'], 10)
+
+    def test_cancel(self):
+        request_id = self.client.send('run', kb='gioco_otto_3', strategy='BFS', timeout=30)
+        time.sleep(0.2)
+        self.assertTrue(self.client.request('cancel', target=request_id)['cancelled'])
+        response = self.client.receive(request_id)
+        self.assertEqual(response['status'], 'cancelled')
+        self.assertFalse(self.client.request('cancel', target=request_id)['cancelled'])
+
+    def test_disconnect_cancels_searches(self):
+        other = Client(self.address)
+        other.send('run', kb='gioco_otto_3', strategy='BFS', timeout=30)
+        time.sleep(0.2)
+        other.close()
+        for _ in xrange(100):
+            if not self.client.request('list')['pending']:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.client.request('list')['pending'], 0)
+
+    def test_worker_death_is_reported(self):
+        request_id = self.client.send('run', kb='gioco_otto_3', strategy='BFS', timeout=30)
+        for _ in xrange(100):
+            pids = [pid for pid in self.server._owners if pid]
+            if pids:
+                break
+            time.sleep(0.05)
+        os.kill(pids[0], signal.SIGKILL)
+        response = self.client.receive(request_id)
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(self.client.request('run', kb='gioco_otto_1', strategy=ASTAR)['path_length'], 10)
+
+    def test_load_generator(self):
+        generator = LoadGenerator(self.address, 'gioco_otto_1', ASTAR, clients=3, requests=7)
+        report = generator.report(generator.run())
+        self.assertEqual(len(generator.latencies), 7)
+        self.assertEqual(dict(generator.statuses), {'solved': 7})
+        self.assertFalse(generator.errors)
+        self.assertIn('Requests: 7', report)
+        generator = LoadGenerator(self.address, 'missing', ASTAR, clients=2, requests=2)
+        generator.run()
+        self.assertEqual(dict(generator.statuses), {'rejected': 2})
+        self.assertEqual(sum(generator.errors.values()), 2)
+
+
+class StuckWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address = os.path.join(self.directory, 'ess.sock')
+        self.run_fun = server._run
+        server._run = stuck_run
+        self.server = QueryServer(workers=1)
+        self.server.load('gioco_otto_1', read_kb('gioco_otto_1'))
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(self.address,))
+        self.thread.daemon = True
+        self.thread.start()
+        for _ in xrange(100):
+            try:
+                self.client = Client(self.address)
+                break
+            except ClientError:
+                time.sleep(0.05)
+
+    def tearDown(self):
+        self.client.close()
+        server._run = self.run_fun
+        self.server.shutdown()
+        self.thread.join(5)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_stuck_search_is_answered_at_the_deadline(self):
+        start_time = time.time()
+        response = self.client.request('run', kb='gioco_otto_1', strategy=ASTAR, timeout=0.2)
+        self.assertLess(time.time() - start_time, 0.2 + server.DEADLINE_GRACE + 2 * server.WATCH_INTERVAL + 1)
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(response['error'], "Search timed out")
+        self.assertEqual(self.client.request('list')['pending'], 0)
+
+
+class ClientTest(unittest.TestCase):
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('localhost:7070'), (socket.AF_INET, ('localhost', 7070)))
+        self.assertEqual(parse_address('/tmp/ess.sock'), (socket.AF_UNIX, '/tmp/ess.sock'))
+        self.assertRaises(ClientError, parse_address, 'localhost:port')
+
+    def test_parse_field(self):
+        self.assertEqual(parse_field('3'), 3)
+        self.assertEqual(parse_field('["a", "b"]'), ['a', 'b'])
+        self.assertEqual(parse_field('gioco_otto_1'), 'gioco_otto_1')
+        self.assertEqual(parse_field('@' + kb_path('gioco_otto_1')), read_kb('gioco_otto_1'))
+
+    def test_connection_refused(self):
+        self.assertRaises(ClientError, Client, os.path.join(tempfile.gettempdir(), 'missing_ess.sock'))
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 99), 100)
+        self.assertEqual(percentile([7], 90), 7)
+
+
+class BlockingFile(object):
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.data = []
+
+    def write(self, data):
+        self.released.wait()
+        self.data.append(data)
+
+    def flush(self):
+        pass
+
+
+class ConnectionTest(unittest.TestCase):
+
+    def test_send_does_not_block_on_a_stalled_client(self):
+        wfile = BlockingFile()
+        connection = server._Connection(wfile)
+        start_time = time.time()
+        for i in xrange(10):
+            connection.send({'id': i})
+        self.assertLess(time.time() - start_time, 1)
+        wfile.released.set()
+        connection.close()
+        self.assertEqual(len(wfile.data), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
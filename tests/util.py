@@ -0,0 +1,28 @@
+import os
+from ESS.parsing.parser import Parser
+from ESS.engine import WorkingMemory
+
+KB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'kb_examples')
+H_ATTRS = ['contenuto', 'riga', 'colonna']
+
+
+def kb_path(name):
+    return os.path.join(KB_DIR, name + '.txt')
+
+
+def read_kb(name):
+    with open(kb_path(name)) as f:
+        return f.read()
+
+
+def load_text(text):
+    return WorkingMemory(*Parser().load_from_text(text))
+
+
+def load_file(filepath):
+    with open(filepath) as f:
+        return load_text(f.read())
+
+
+def load_kb(name):
+    return load_file(kb_path(name))